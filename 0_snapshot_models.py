@@ -0,0 +1,43 @@
+# 0_snapshot_models.py
+#
+# API'nin kullandığı modelleri bir kez indirip data/models altına safetensors
+# formatında kaydeder. Sonrasında api.py açılışta internete çıkmadan,
+# sadece bu yerel kopyalardan yükler (MODEL_LOCAL_ONLY=1, varsayılan).
+#
+# Ardından seçili hızlı çalışma zamanları (EMBEDDING_RUNTIME, CRISIS_RUNTIME;
+# api.py ile aynı varsayılanlar) ONNX'e aktarılır ve fp32 ile bir kez
+# karşılaştırılır. Sonuç modellerin yanına yazılır; api.py açılışta fp32
+# referans modelini yüklemeden bu sonucu kullanır.
+
+import os
+import time
+
+import model_store
+from crisis import check_parity as check_crisis_parity
+from query_encoder import check_parity as check_encoder_parity
+
+EMBEDDING_MODEL_NAME = 'paraphrase-multilingual-mpnet-base-v2'
+SENTIMENT_MODEL_ID = "savasy/bert-base-turkish-sentiment-cased"
+
+for name, snapshot in (
+    (EMBEDDING_MODEL_NAME, model_store.snapshot_sentence_transformer),
+    (SENTIMENT_MODEL_ID, model_store.snapshot_classifier),
+):
+    start = time.time()
+    print(f"📦 '{name}' indiriliyor ve safetensors olarak kaydediliyor...")
+    path = snapshot(name)
+    print(f"✅ {path} ({time.time() - start:.1f} sn)")
+
+for name, runtime, check in (
+    (EMBEDDING_MODEL_NAME, os.getenv("EMBEDDING_RUNTIME", "onnx"), check_encoder_parity),
+    (SENTIMENT_MODEL_ID, os.getenv("CRISIS_RUNTIME", "int8"), check_crisis_parity),
+):
+    if runtime == "fp32":
+        continue
+    start = time.time()
+    print(f"🔬 '{name}' ({runtime}) fp32 ile karşılaştırılıyor...")
+    verdict, _, _ = check(name, runtime)
+    result = ", ".join(f"{k}={v:.4f}" for k, v in verdict.items() if isinstance(v, float))
+    print(f"✅ {model_store.parity_path(name, runtime)}: {result} ({time.time() - start:.1f} sn)")
+
+print("Modeller hazır. api.py artık Hugging Face Hub'a bağlanmadan açılabilir.")
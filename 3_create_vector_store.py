@@ -1,95 +1,326 @@
 import os
 import json
+import hashlib
+import argparse
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
 import time
 
+from bulk_embedder import BulkEmbedder, DEFAULT_BATCH_SIZE, DEFAULT_SHARD_SIZE
+from chunk_store import iter_chunk_files, write_chunk_store
+from lexical_index import BM25Index
+from token_chunker import load_tokenizer, truncation_report, MODEL_MAX_SEQ_LENGTH
+import vector_index as vi
+
 # --- 1. AYARLAR VE SABİTLER ---
 
 # Okunacak chunk'ların ve kaydedilecek vektörlerin klasör yolları
 CHUNKS_DIR = "data/chunks"
 VECTOR_STORE_DIR = "data/vector_store"
+INDEX_FILE = os.path.join(VECTOR_STORE_DIR, vi.INDEX_FILE)
+
+# Hangi chunk'ın hangi FAISS id'sinde ve hangi içerikle (hash) indexlendiğini tutar.
+# Artımlı build bu dosyaya bakarak sadece yeni/değişen chunk'ları embed eder.
+MANIFEST_FILE = os.path.join(VECTOR_STORE_DIR, "manifest.json")
+
+# Tüm embedding'ler (satır = FAISS id'si). Index türü değiştiğinde ya da HNSW gibi
+# silme desteklemeyen index'lerde, yeniden embed etmeden index kurmak için kullanılır.
+EMBEDDINGS_FILE = os.path.join(VECTOR_STORE_DIR, "embeddings.npy")
+
+# Toplu embedding'in float16 ara parçaları; yarıda kalan build buradan devam eder.
+EMBED_SHARD_DIR = os.path.join(VECTOR_STORE_DIR, "embed_shards")
 
 # Kullanacağımız Embedding Modeli
 # Bu model çok dilli ve Türkçe için oldukça başarılı.
 MODEL_NAME = 'paraphrase-multilingual-mpnet-base-v2'
 
-# --- 2. GEREKLİ KLASÖRÜN OLUŞTURULMASI ---
-
-# Eğer vektör deposu klasörü yoksa, oluştur.
-if not os.path.exists(VECTOR_STORE_DIR):
-    os.makedirs(VECTOR_STORE_DIR)
-    print(f"Klasör oluşturuldu: {VECTOR_STORE_DIR}")
+parser = argparse.ArgumentParser(description="FAISS vektör deposunu oluşturur / günceller.")
+parser.add_argument("--full", action="store_true",
+                    help="Manifest'i yok say, tüm chunk'ları baştan embed et (id'ler sıkıştırılır).")
+parser.add_argument("--index-type", choices=vi.INDEX_TYPES, default=None,
+                    help="Index türü (varsayılan: mevcut index'in türü, yoksa flat).")
+parser.add_argument("--nlist", type=int, default=None, help="IVF küme sayısı (varsayılan: otomatik).")
+parser.add_argument("--nprobe", type=int, default=None, help="IVF aramada bakılacak küme sayısı.")
+parser.add_argument("--pq-m", type=int, default=None, help="IVF-PQ alt vektör sayısı.")
+parser.add_argument("--pq-nbits", type=int, default=None, help="IVF-PQ alt vektör başına bit.")
+parser.add_argument("--hnsw-m", type=int, default=None, help="HNSW komşu sayısı (M).")
+parser.add_argument("--ef-construction", type=int, default=None, help="HNSW kurulum derinliği.")
+parser.add_argument("--ef-search", type=int, default=None, help="HNSW arama derinliği.")
+parser.add_argument("--recall-k", type=int, default=5, help="Recall@k raporu için k.")
+parser.add_argument("--recall-queries", type=int, default=200, help="Recall ölçümünde kullanılacak sorgu sayısı.")
+parser.add_argument("--workers", type=int, default=max(1, min(4, (os.cpu_count() or 1) // 2)),
+                    help="Embedding için süreç sayısı (1: havuz açılmaz).")
+parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Embedding batch boyutu.")
+parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE,
+                    help="Diske ara kayıt olarak yazılan parça başına chunk sayısı.")
 
-# --- 3. EMBEDDING MODELİNİ YÜKLEME ---
+# Index'in yeniden kurulmasını gerektiren (eğitim) parametreleri ve sadece aramayı etkileyenler
+TRAIN_PARAMS = ("nlist", "pq_m", "pq_nbits", "hnsw_m", "ef_construction")
+SEARCH_PARAMS = ("nprobe", "ef_search")
 
-print(f"'{MODEL_NAME}' modeli yükleniyor...")
-# Bu satır, modeli Hugging Face'ten indirip belleğe yükler.
-# İlk çalıştırmada internet bağlantısı gerekir ve biraz uzun sürebilir.
-model = SentenceTransformer(MODEL_NAME)
-print("Model başarıyla yüklendi.")
+# --- 2. YARDIMCI FONKSİYONLAR ---
 
-# --- 4. CHUNK'LARI OKUMA VE VEKTÖRE DÖNÜŞTÜRME ---
+def content_hash(chunk):
+    h = hashlib.sha256()
+    h.update(chunk["source"].encode('utf-8'))
+    h.update(b"\0")
+    h.update(chunk["text"].encode('utf-8'))
+    return h.hexdigest()
 
-# Chunk metinlerini ve dosya yollarını saklamak için boş listeler
-all_texts = []
-chunk_file_paths = []
+def chunk_keys(chunks):
+    # Bazı kitaplarda aynı chunk_id birden fazla kez geçiyor; tekrarlara sıra eki veriyoruz.
+    seen = {}
+    keys = []
+    for c in chunks:
+        base = f"{c['source']}#{c['chunk_id']}"
+        n = seen.get(base, 0)
+        seen[base] = n + 1
+        keys.append(base if n == 0 else f"{base}#{n}")
+    return keys
 
-print(f"'{CHUNKS_DIR}' klasöründeki chunk'lar okunuyor...")
+def load_manifest():
+    for path in (MANIFEST_FILE, INDEX_FILE, EMBEDDINGS_FILE):
+        if not os.path.exists(path):
+            return None
+    with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
-# Chunk klasöründeki tüm dosyaları al ve sırala (sıralama önemli!)
-chunk_files = sorted(os.listdir(CHUNKS_DIR))
+def write_atomic_npy(array, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
 
-# Her bir json dosyası için işlem yap
-for filename in chunk_files:
-    if filename.endswith(".json"):
-        filepath = os.path.join(CHUNKS_DIR, filename)
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            all_texts.append(data[0]) 
-            chunk_file_paths.append(filepath)
+def chunks_by_id(chunks, keys, entries, next_id):
+    # Chunk store FAISS id'sine göre dizilir; boşalan id'ler boş satır olarak kalır.
+    by_id = [None] * next_id
+    for chunk, key in zip(chunks, keys):
+        by_id[entries[key]["id"]] = chunk
+    return by_id
 
-if not all_texts:
-    print("HATA: Chunk klasöründe işlenecek metin bulunamadı. Lütfen bir önceki adımı kontrol et.")
-else:
-    print(f"Toplam {len(all_texts)} adet chunk bulundu. Embedding işlemi başlıyor...")
+def build_lexical_index(by_id):
     start_time = time.time()
-    
-    # İşte sihirli an! Tüm metin listesini modele verip embedding'leri oluşturuyoruz.
-    # Bu işlem, chunk sayısına ve bilgisayarının CPU gücüne bağlı olarak zaman alabilir.
-    embeddings = model.encode(all_texts, show_progress_bar=True)
-    
-    end_time = time.time()
-    print(f"Embedding işlemi {end_time - start_time:.2f} saniyede tamamlandı.")
-
-    # --- 5. FAISS VERİTABANINI OLUŞTURMA VE KAYDETME ---
-    
-    # NumPy array'ine dönüştürmek FAISS için daha verimlidir.
-    embeddings_np = np.array(embeddings).astype('float32')
-
-    # Vektörlerin boyutunu (dimension) al (bu model için 768 olmalı)
-    d = embeddings_np.shape[1]
-
-    # FAISS index'ini oluşturuyoruz. IndexFlatL2 en temel ve güçlü index türlerinden biridir.
-    # Vektörler arasındaki 'Euclidean' mesafeyi kullanarak arama yapar.
-    index = faiss.IndexFlatL2(d)
-    
-    print("FAISS index'i oluşturuldu.")
-
-    # Tüm embedding'leri FAISS index'ine ekliyoruz.
-    index.add(embeddings_np)
-
-    print(f"Toplam {index.ntotal} vektör FAISS index'ine eklendi.")
-
-    # --- 6. OLUŞTURULAN VERİLERİ KAYDETME ---
-    
-    # FAISS index'ini diske kaydediyoruz.
-    faiss.write_index(index, os.path.join(VECTOR_STORE_DIR, "vector_store.index"))
-    
-    # Vektörlerin hangi chunk'a ait olduğunu bilmek için dosya yollarını da kaydediyoruz.
-    with open(os.path.join(VECTOR_STORE_DIR, "chunk_map.json"), 'w', encoding='utf-8') as f:
-        json.dump(chunk_file_paths, f)
-        
-    print("FAISS index'i ('vector_store.index') ve chunk haritası ('chunk_map.json') başarıyla kaydedildi.")
-    print("3. Adım başarıyla tamamlandı!")
\ No newline at end of file
+    lexical = BM25Index.build([c["text"] if c is not None else None for c in by_id])
+    size = lexical.save(VECTOR_STORE_DIR)
+    print(f"BM25 index'i {time.time() - start_time:.2f} saniyede kuruldu "
+          f"({len(lexical)} terim, {size / 1024:.0f} KB).")
+
+def write_atomic_json(obj, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+# --- 3. ANA AKIŞ ---
+# Embedding worker'ları (spawn) bu dosyayı yeniden import edebilir; build sadece
+# doğrudan çalıştırıldığında yapılır.
+
+def main():
+    args = parser.parse_args()
+
+    # --- 3.1 GEREKLİ KLASÖRÜN OLUŞTURULMASI ---
+
+    # Eğer vektör deposu klasörü yoksa, oluştur.
+    if not os.path.exists(VECTOR_STORE_DIR):
+        os.makedirs(VECTOR_STORE_DIR)
+        print(f"Klasör oluşturuldu: {VECTOR_STORE_DIR}")
+
+    # --- 4. CHUNK'LARI OKUMA VE DEĞİŞİKLİKLERİ BULMA ---
+
+    print(f"'{CHUNKS_DIR}' klasöründeki chunk'lar okunuyor...")
+
+    # Her kitap dosyasındaki TÜM chunk'ları sırayla alıyoruz.
+    all_chunks = list(iter_chunk_files(CHUNKS_DIR))
+    keys = chunk_keys(all_chunks)
+    hashes = [content_hash(c) for c in all_chunks]
+
+    manifest = None if args.full else load_manifest()
+    index = None
+    matrix = None
+    old_config = vi.load_config(VECTOR_STORE_DIR)
+
+    if manifest is not None:
+        if manifest.get("model") != MODEL_NAME:
+            print(f"Embedding modeli değişmiş ('{manifest.get('model')}' -> '{MODEL_NAME}'). Tam build yapılacak.")
+            manifest = None
+        else:
+            index = faiss.read_index(INDEX_FILE)
+            matrix = np.load(EMBEDDINGS_FILE)
+            # Yarım kalmış bir build'den sonra manifest ile index uyuşmayabilir
+            if (index.ntotal != len(manifest["chunks"]) or not isinstance(index, faiss.IndexIDMap2)
+                    or len(matrix) != manifest["next_id"]):
+                print("Manifest ile mevcut index uyuşmuyor. Tam build yapılacak.")
+                manifest = None
+                index = None
+                matrix = None
+
+    if manifest is None:
+        manifest = {"model": MODEL_NAME, "next_id": 0, "chunks": {}}
+
+    old_entries = manifest["chunks"]
+    new_entries = {}
+    to_embed = []       # (liste içindeki sıra, FAISS id'si)
+    stale_ids = []      # index'ten silinecek id'ler (silinen + değişen chunk'lar)
+    next_id = manifest["next_id"]
+
+    for i, (key, h) in enumerate(zip(keys, hashes)):
+        old = old_entries.get(key)
+        if old is not None and old["hash"] == h:
+            new_entries[key] = old
+            continue
+        if old is not None:
+            # İçerik değişti: aynı id'yi yeni vektörle yeniden kullan
+            faiss_id = old["id"]
+            stale_ids.append(faiss_id)
+        else:
+            faiss_id = next_id
+            next_id += 1
+        new_entries[key] = {"id": faiss_id, "hash": h}
+        to_embed.append((i, faiss_id))
+
+    deleted_keys = set(old_entries) - set(new_entries)
+    stale_ids.extend(old_entries[k]["id"] for k in deleted_keys)
+
+    print(f"Toplam {len(all_chunks)} chunk | yeni/değişen: {len(to_embed)} | silinen: {len(deleted_keys)}")
+
+    # --- 5. INDEX TÜRÜ VE PARAMETRELERİ ---
+
+    index_type = args.index_type or old_config.get("type", "flat")
+    requested = {
+        "nlist": args.nlist, "nprobe": args.nprobe, "pq_m": args.pq_m, "pq_nbits": args.pq_nbits,
+        "hnsw_m": args.hnsw_m, "ef_construction": args.ef_construction, "ef_search": args.ef_search,
+    }
+    requested = {k: v for k, v in requested.items() if v is not None}
+
+    # Aynı tür korunuyorsa kayıtlı parametrelerden devam et
+    params = dict(old_config.get("params", {})) if index_type == old_config.get("type") else {}
+    params.update(requested)
+
+    needs_rebuild = (
+        index is None
+        or index_type != old_config.get("type", "flat")
+        or any(k in requested and requested[k] != old_config.get("params", {}).get(k) for k in TRAIN_PARAMS)
+        or (stale_ids and index_type not in vi.REMOVABLE_TYPES)
+    )
+    search_changed = any(k in requested and requested[k] != old_config.get("params", {}).get(k) for k in SEARCH_PARAMS)
+
+    if not all_chunks:
+        print("HATA: Chunk klasöründe işlenecek metin bulunamadı. Lütfen bir önceki adımı kontrol et.")
+    elif not to_embed and not deleted_keys and not needs_rebuild and not search_changed:
+        print("Değişiklik yok, vektör deposu güncel.")
+        if not BM25Index.is_current(VECTOR_STORE_DIR):
+            # Eski depolarda BM25 index'i yok ya da eski terim normalizasyonuyla kurulmuş
+            build_lexical_index(chunks_by_id(all_chunks, keys, new_entries, next_id))
+    else:
+        # --- 6. EMBEDDING MODELİNİ YÜKLEME VE SADECE GEREKENLERİ EMBED ETME ---
+
+        if to_embed:
+            # Model max_seq_length'ten uzun girdileri keser; kesilen kısım hiç aranamaz.
+            # (Sayım için sadece tokenizer yüklenir; model worker süreçlerinde yüklenir.)
+            texts = [all_chunks[i]["text"] for i, _ in to_embed]
+            trunc = truncation_report(load_tokenizer(MODEL_NAME), texts, MODEL_MAX_SEQ_LENGTH)
+            print(f"✂️ Kesilen token: {trunc['truncated_tokens']} / {trunc['total_tokens']} "
+                  f"(%{trunc['truncated_ratio'] * 100:.1f}) | kesilen chunk: {trunc['truncated_chunks']} / {trunc['chunks']} "
+                  f"| en uzun chunk: {trunc['max_tokens']} token (sınır: {MODEL_MAX_SEQ_LENGTH})")
+            if trunc["truncated_chunks"]:
+                print("   Chunk'ları token moduyla yeniden oluşturun: python notebooks/process_pdfs.py --chunk-mode tokens")
+
+            # İlk çalıştırmada model Hugging Face'ten indirilir; internet bağlantısı gerekir.
+            print(f"'{MODEL_NAME}' ile {len(texts)} chunk embed ediliyor "
+                  f"({args.workers} süreç, batch {args.batch_size}, parça {args.shard_size})...")
+            embedder = BulkEmbedder(MODEL_NAME, EMBED_SHARD_DIR, workers=args.workers,
+                                    batch_size=args.batch_size, shard_size=args.shard_size)
+            start_time = time.time()
+            try:
+                # Parçalar yukarıda sayılan token uzunluklarına göre sıralanır
+                embeddings = embedder.encode(texts, lengths=trunc["counts"])
+            except KeyboardInterrupt:
+                print("\nDurduruldu. Biten parçalar kaydedildi; tekrar çalıştırınca kaldığı yerden devam eder.")
+                raise
+            end_time = time.time()
+            print(f"{len(to_embed)} chunk için embedding {end_time - start_time:.2f} saniyede tamamlandı.")
+            for line in embedder.report():
+                print(f"   {line}")
+
+            # NumPy array'ine dönüştürmek FAISS için daha verimlidir.
+            embeddings_np = np.array(embeddings).astype('float32')
+            ids_np = np.array([faiss_id for _, faiss_id in to_embed], dtype='int64')
+
+            # Embedding matrisini yeni id'lere göre büyüt ve değişen satırları güncelle
+            if matrix is None:
+                matrix = np.zeros((0, embeddings_np.shape[1]), dtype='float32')
+            if len(matrix) < next_id:
+                matrix = np.vstack([matrix, np.zeros((next_id - len(matrix), matrix.shape[1]), dtype='float32')])
+            matrix[ids_np] = embeddings_np
+
+        for k in deleted_keys:
+            matrix[old_entries[k]["id"]] = 0.0
+
+        live_ids = np.array(sorted(e["id"] for e in new_entries.values()), dtype='int64')
+        live_vectors = matrix[live_ids]
+
+        # --- 7. FAISS VERİTABANINI OLUŞTURMA / GÜNCELLEME ---
+
+        if needs_rebuild:
+            print(f"'{index_type}' index'i kuruluyor ({len(live_ids)} vektör)...")
+            index, params, build_seconds = vi.build_index(index_type, live_vectors, live_ids, params)
+            print(f"Index {build_seconds:.2f} saniyede kuruldu.")
+        else:
+            params = vi.resolve_params(index_type, len(live_ids), params)
+            if stale_ids:
+                removed = index.remove_ids(np.array(stale_ids, dtype='int64'))
+                print(f"{removed} eski vektör index'ten çıkarıldı.")
+            if to_embed:
+                index.add_with_ids(embeddings_np, ids_np)
+            vi.apply_search_params(index, vi.search_param_string(index_type, params))
+
+        print(f"Index'te toplam {index.ntotal} vektör var.")
+
+        # --- 8. RECALL@K RAPORU (Tam arama ile karşılaştırma) ---
+
+        exact_index = faiss.IndexIDMap2(faiss.IndexFlatL2(matrix.shape[1]))
+        exact_index.add_with_ids(live_vectors, live_ids)
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(live_vectors), size=min(args.recall_queries, len(live_vectors)), replace=False)
+        recall = vi.recall_at_k(index, exact_index, live_vectors[sample], args.recall_k)
+        print(f"📏 Recall@{recall['k']}: {recall['recall']:.4f} | "
+              f"Tam arama: {recall['exact_ms_per_query']:.3f} ms/sorgu | "
+              f"{index_type}: {recall['ann_ms_per_query']:.3f} ms/sorgu")
+
+        # --- 9. OLUŞTURULAN VERİLERİ KAYDETME ---
+
+        by_id = chunks_by_id(all_chunks, keys, new_entries, next_id)
+
+        config = {
+            "type": index_type,
+            "params": params,
+            "search": vi.search_param_string(index_type, params),
+            "dimension": int(matrix.shape[1]),
+            "ntotal": int(index.ntotal),
+            "recall": recall,
+        }
+
+        # Her dosya önce geçici olarak yazılıp os.replace ile yerine konur.
+        # Manifest en son yazılır; arada kesilirse bir sonraki çalıştırma tam build'e düşer.
+        write_atomic_npy(matrix, EMBEDDINGS_FILE)
+        index_bytes = vi.save_index(index, VECTOR_STORE_DIR, config)
+        write_chunk_store(by_id, VECTOR_STORE_DIR)
+        build_lexical_index(by_id)
+        write_atomic_json({"model": MODEL_NAME, "next_id": next_id, "chunks": new_entries}, MANIFEST_FILE)
+
+        # Build kaydedildi; ara embedding parçalarına artık gerek yok
+        if to_embed:
+            embedder.clear()
+
+        # Eski formatın kalıntısı varsa temizle
+        old_map = os.path.join(VECTOR_STORE_DIR, "chunk_map.json")
+        if os.path.exists(old_map):
+            os.remove(old_map)
+
+        print(f"Index boyutu: {index_bytes / 1024 / 1024:.2f} MB ({index_type}, {config['search'] or 'parametresiz arama'})")
+        print("FAISS index'i ('vector_store.index'), chunk store ve manifest başarıyla kaydedildi.")
+        print("3. Adım başarıyla tamamlandı!")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,33 @@
 # 4_test_semantic_search.py
 
-import json
 import os
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from chunk_store import ChunkStore
+from query_encoder import load_query_encoder
+import vector_index
 
 # --- 1. AYARLAR VE SABİTLER ---
 
 VECTOR_STORE_DIR = "data/vector_store"
 MODEL_NAME = 'paraphrase-multilingual-mpnet-base-v2'
 K = 5 # Arama sonucunda kaç tane en alakalı chunk'ı getirmek istediğimiz
+# Sorgu encoder'ının çalışma zamanı: "fp32", "int8", "onnx" ya da "onnx_int8" (api.py ile aynı)
+EMBEDDING_RUNTIME = os.getenv("EMBEDDING_RUNTIME", "onnx")
 
 # --- 2. GEREKLİ DOSYALARI VE MODELİ YÜKLEME ---
 
 print("Gerekli dosyalar ve model yükleniyor...")
 
-# FAISS index'ini yükle
-index = faiss.read_index(os.path.join(VECTOR_STORE_DIR, "vector_store.index"))
+# FAISS index'ini yükle (türü ve arama parametreleri index_config.json'dan gelir)
+index, index_config = vector_index.load_index(VECTOR_STORE_DIR)
+print(f"Index türü: {index_config.get('type')} ({index_config.get('search') or 'parametresiz arama'})")
 
-# Chunk haritasını yükle
-with open(os.path.join(VECTOR_STORE_DIR, "chunk_map.json"), 'r', encoding='utf-8') as f:
-    chunk_map = json.load(f)
+# Chunk store'u yükle (metinler mmap ile açılır, arama başına dosya okunmaz)
+chunk_store = ChunkStore(VECTOR_STORE_DIR)
 
-# Embedding modelini yükle
-model = SentenceTransformer(MODEL_NAME)
+# Embedding modelini yükle (fp32 dışındaki çalışma zamanları fp32 ile doğrulanır)
+model = load_query_encoder(MODEL_NAME, EMBEDDING_RUNTIME)
 
 print("Yükleme tamamlandı. Sistem aramaya hazır.")
 
@@ -50,20 +53,19 @@ def search(query: str, k: int = K):
     # 3. Sonuçları işle ve yazdır
     results = []
     for i, idx in enumerate(indices[0]):
-        # Bulunan index'e karşılık gelen dosya yolunu haritadan al
-        chunk_file = chunk_map[idx]
-        
-        # O chunk'ın metnini dosyadan oku
-        with open(chunk_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            text = data[0]['text']
+        if idx == -1:
+            continue
+
+        # Bulunan index'e karşılık gelen chunk'ı store'dan al
+        chunk = chunk_store.get(idx)
+        text = chunk['text']
 
         result = {
             "rank": i + 1,
             "index": int(idx),
             "distance": float(distances[0][i]),
             "text": text.strip(),
-            "source": chunk_file
+            "source": f"{chunk['source']} ({chunk['chunk_id']})"
         }
         results.append(result)
 
@@ -1,50 +1,100 @@
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
-import torch
+# 5_evaluate_crisis.py
+#
+# Kriz modülünü etiketli veri seti üzerinde değerlendirir (API ile aynı sözlük +
+# sınıflandırıcı, bkz. crisis.py). Cümleler tek tek değil, toplu sınıflandırılır:
+# sadece sözlükte eşleşen cümleler modele gider; liste uzunluğa göre sıralanıp
+# dinamik padding'li batch'lerle işlenir. Skorlar bir kez hesaplandığı için
+# farklı eşiklerin denenmesi modeli tekrar çalıştırmaz.
+#
+# Not: Depodaki data/crisis_eval.csv (~110 cümle) sadece duman testi içindir;
+# buradaki doğruluk, eşik taraması ve hız sayıları temsili değildir; model ya da
+# eşik seçimi için kullanılmamalıdır.
+# Gerçek değerlendirme için daha büyük etiketli bir seti --dataset ile verin.
+
+import os
+import time
+import argparse
+
+from sklearn.metrics import classification_report
+
+from crisis import (DEFAULT_BATCH_SIZE, EVAL_DATASET_PATH, LEXICON_PATH, REPRESENTATIVE_DATASET_SIZE,
+                    CrisisDetector, CrisisLexicon, load_classifier, load_labelled_dataset)
+
+SENTIMENT_MODEL_ID = "savasy/bert-base-turkish-sentiment-cased"
+
+parser = argparse.ArgumentParser(description="Kriz tespitini etiketli veri setinde değerlendirir.")
+parser.add_argument("--dataset", default=EVAL_DATASET_PATH, help="text,label sütunlu CSV (1 = kriz, 0 = normal).")
+parser.add_argument("--runtime", default=os.getenv("CRISIS_RUNTIME", "fp32"), help="Sınıflandırıcı çalışma zamanı.")
+parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+parser.add_argument("--threshold", type=float, default=0.70, help="Model negatiflik eşiği.")
+parser.add_argument("--sweep", type=float, nargs="*", default=[0.5, 0.6, 0.7, 0.8, 0.9, 0.95],
+                    help="Denenecek eşikler (model tekrar çalıştırılmaz).")
+parser.add_argument("--compare-single", type=int, default=0,
+                    help="İlk N cümleyi tek tek de sınıflandırıp toplu hızla karşılaştır.")
+parser.add_argument("--show-errors", type=int, default=10, help="Yazdırılacak en fazla hatalı örnek.")
+args = parser.parse_args()
+
+# --- 1. YÜKLEME ---
+dataset = load_labelled_dataset(args.dataset)
+texts = [text for text, _ in dataset]
+y_true = [label for _, label in dataset]
+print(f"📂 {args.dataset}: {len(dataset)} cümle ({sum(y_true)} kriz, {len(y_true) - sum(y_true)} normal)")
+if len(dataset) < REPRESENTATIVE_DATASET_SIZE:
+    print(f"⚠️ Veri seti {REPRESENTATIVE_DATASET_SIZE} cümleden küçük (duman testi); doğruluk, eşik ve hız "
+          "sayıları temsili değildir. Gerçek değerlendirme için --dataset ile büyük bir set verin.")
 
 print("⏳ Kriz Modeli Test İçin Yükleniyor...")
-SENTIMENT_MODEL_ID = "savasy/bert-base-turkish-sentiment-cased" 
-tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL_ID)
-sentiment_model = AutoModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL_ID)
+detector = CrisisDetector(CrisisLexicon.load(LEXICON_PATH), load_classifier(SENTIMENT_MODEL_ID, args.runtime),
+                          threshold=args.threshold)
+detector.detect_batch(["ısınma cümlesi, dayanamıyorum"])
 print("✅ Model Yüklendi.")
 
-def test_detect_crisis(text):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=128)
-    with torch.no_grad():
-        logits = sentiment_model(**inputs).logits
-    
-    probabilities = torch.softmax(logits, dim=1)
-    negative_score = probabilities[0][0].item()
-    
-    risk_keywords = ["ölmek", "intihar", "canıma", "dayanamıyorum", "bıktım", "hap", "kesmek"]
-    keyword_hit = any(word in text.lower() for word in risk_keywords)
-
-    is_crisis = False
-    if (negative_score > 0.9) or (negative_score > 0.7 and keyword_hit):
-        is_crisis = True
-        
-    return is_crisis, negative_score
-
-# TEST VERİLERİ
-test_sentences = [
-    ("Bugün hava çok güzel, kendimi harika hissediyorum.", False), 
-    ("Sınavdan düşük aldım biraz moralim bozuk.", False),       
-    ("Artık yaşamak istemiyorum, her şey bitti.", True),       
-    ("Bu acıya dayanamıyorum, intiharı düşünüyorum.", True),                 
-    ("Çok yorgunum ama yarın düzelir diye umuyorum.", False),        
-    ("Bıktım artık bu hayattan, kendimi keseceğim.", True)            
-]
+# --- 2. TOPLU SINIFLANDIRMA ---
+start = time.perf_counter()
+scans = detector.scan_batch(texts)
+scores = detector.score_batch(texts, scans, args.batch_size)
+elapsed = time.perf_counter() - start
+flagged = sum(1 for scan in scans if scan[0])
+print(f"⚡ {len(texts)} cümle {elapsed:.2f} sn'de sınıflandırıldı ({len(texts) / max(elapsed, 1e-9):.0f} cümle/sn; "
+      f"modele giden: {flagged})")
+
+if args.compare_single:
+    sample = texts[:args.compare_single]
+    start = time.perf_counter()
+    for text in sample:
+        detector.detect(text)
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    detector.detect_batch(sample, args.batch_size)
+    batched = time.perf_counter() - start
+    print(f"🔁 Tek tek: {single:.2f} sn | Toplu: {batched:.2f} sn | Hızlanma: {single / max(batched, 1e-9):.1f}x "
+          f"({len(sample)} cümle)")
+
+# --- 3. RAPOR ---
+def predict(threshold):
+    return [1 if detector.decide(scan[1], score, threshold) else 0 for scan, score in zip(scans, scores)]
+
+y_pred = predict(args.threshold)
+correct = sum(t == p for t, p in zip(y_true, y_pred))
 
 print("\n--- KRİZ MODÜLÜ DOĞRULUK TESTİ ---\n")
-correct = 0
-for text, expected in test_sentences:
-    prediction, score = test_detect_crisis(text)
-    result = "✅" if prediction == expected else "❌"
-    if prediction == expected: correct += 1
-    
-    label = "KRİZ 🚨" if prediction else "NORMAL 😊"
-    print(f"Metin: '{text}'")
-    print(f"Tahmin: {label} (Negatiflik: {score:.4f}) | Beklenen: {expected}")
-    print(f"Sonuç: {result}\n")
-
-acc = (correct / len(test_sentences)) * 100
-print(f"Genel Doğruluk: %{acc:.2f}")
\ No newline at end of file
+print(classification_report(y_true, y_pred, labels=[0, 1], target_names=['Normal Durum', 'Kriz Durumu'],
+                            zero_division=0))
+print(f"Genel Doğruluk: %{correct / len(dataset) * 100:.2f} (eşik {args.threshold:.2f})")
+
+errors = [(text, label, score) for text, label, pred, score in zip(texts, y_true, y_pred, scores) if label != pred]
+if errors and args.show_errors:
+    print(f"\n--- HATALI ÖRNEKLER ({len(errors)}) ---")
+    for text, label, score in errors[:args.show_errors]:
+        expected = "KRİZ 🚨" if label else "NORMAL 😊"
+        print(f"❌ Beklenen: {expected} | Negatiflik: {score:.4f} | Metin: '{text}'")
+
+if args.sweep:
+    print("\n--- EŞİK TARAMASI ---")
+    print(f"{'Eşik':>6} | {'Doğruluk':>9} | {'Kriz Recall':>11} | {'Yanlış Alarm':>12}")
+    for threshold in sorted(args.sweep):
+        pred = predict(threshold)
+        accuracy = sum(t == p for t, p in zip(y_true, pred)) / len(dataset)
+        recall = sum(t and p for t, p in zip(y_true, pred)) / max(1, sum(y_true))
+        false_alarms = sum(p and not t for t, p in zip(y_true, pred))
+        print(f"{threshold:>6.2f} | %{accuracy * 100:>7.2f} | %{recall * 100:>9.2f} | {false_alarms:>12}")
@@ -1,22 +1,52 @@
+import os
+import sys
+import json
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 
 # --- VERİLER ---
-metrics_data = {
-    "Metrik": ["Genel Doğruluk (Accuracy)", "Ortalama Cevap Süresi (Latency)", "Normal Durum F1-Score", "Kriz Durumu F1-Score"],
-    "Değer": ["%85.00", "2.64 sn", "0.87", "0.82"]
-}
+# 6_performance_test.py'nin kaydettiği sonuçlar (varsayılan ya da ilk argüman)
+RESULTS_FILE = sys.argv[1] if len(sys.argv) > 1 else os.path.join("data", "benchmarks", "performance.json")
+
+if not os.path.exists(RESULTS_FILE):
+    sys.exit(f"❌ {RESULTS_FILE} bulunamadı. Önce 'python 6_performance_test.py' çalıştırın.")
+
+with open(RESULTS_FILE, "r", encoding="utf-8") as f:
+    results = json.load(f)
+
+summary = results["summary"]
+crisis = results.get("crisis")
+config = results["config"]
+print(f"📂 {RESULTS_FILE} okundu ({results['created_at']}, {summary['requests']} istek).")
 
-class_data = {
-    "Sınıf": ["Normal Durum", "Kriz Durumu"],
-    "Precision": [0.77, 1.00],
-    "Recall": [1.00, 0.70],
-    "F1-Score": [0.87, 0.82]
+def ms(stats, key):
+    return f"{stats[key] / 1000:.2f} sn" if stats else "-"
+
+metrics_data = {
+    "Metrik": [
+        "Ortalama Cevap Süresi (Latency)",
+        "Cevap Süresi p50 / p95 / p99",
+        "İlk Token Süresi (TTFT) p50 / p95",
+        "Throughput",
+        "Hata Oranı",
+    ],
+    "Değer": [
+        ms(summary["latency_ms"], "mean"),
+        " / ".join(ms(summary["latency_ms"], p) for p in ("p50", "p95", "p99")),
+        " / ".join(ms(summary["ttft_ms"], p) for p in ("p50", "p95")),
+        f"{summary['throughput_rps']:.2f} istek/sn",
+        f"%{summary['error_rate'] * 100:.2f}",
+    ],
 }
+if crisis:
+    metrics_data["Metrik"] = ["Genel Doğruluk (Accuracy)"] + metrics_data["Metrik"] + [
+        "Normal Durum F1-Score", "Kriz Durumu F1-Score"]
+    metrics_data["Değer"] = [f"%{crisis['accuracy'] * 100:.2f}"] + metrics_data["Değer"] + [
+        f"{crisis['classes']['Normal Durum']['f1']:.2f}", f"{crisis['classes']['Kriz Durumu']['f1']:.2f}"]
 
 # --- 1. TABLO GÖRSELİ OLUŞTURMA ---
-fig, ax = plt.subplots(figsize=(8, 3))
+fig, ax = plt.subplots(figsize=(8, 0.45 * len(metrics_data["Metrik"]) + 1))
 ax.axis('tight')
 ax.axis('off')
 table_data = [[k, v] for k, v in zip(metrics_data["Metrik"], metrics_data["Değer"])]
@@ -33,47 +63,83 @@ for (row, col), cell in table.get_celld().items():
     elif row > 0:
         cell.set_facecolor('#f1f1f2' if row % 2 == 0 else '#ffffff') # Satır Renkleri
 
-plt.title("Sistem Performans Özeti", fontsize=14, weight='bold', color='#333333')
+plt.title(f"Sistem Performans Özeti ({config['concurrency']} eşzamanlı kullanıcı)",
+          fontsize=14, weight='bold', color='#333333')
 plt.savefig("performans_tablosu.png", bbox_inches='tight', dpi=300)
 print("✅ performans_tablosu.png oluşturuldu.")
 
-# --- 2. GRAFİK OLUŞTURMA (BAR CHART) ---
-df = pd.DataFrame(class_data)
-labels = df["Sınıf"]
-precision = df["Precision"]
-recall = df["Recall"]
-f1 = df["F1-Score"]
-
-x = np.arange(len(labels))
-width = 0.25
-
-fig, ax = plt.subplots(figsize=(10, 6))
-rects1 = ax.bar(x - width, precision, width, label='Precision (Kesinlik)', color='#2ecc71')
-rects2 = ax.bar(x, recall, width, label='Recall (Duyarlılık)', color='#3498db')
-rects3 = ax.bar(x + width, f1, width, label='F1-Score', color='#e67e22')
-
-ax.set_ylabel('Skor (0-1 Arası)')
-ax.set_title('Normal vs Kriz Durumu Başarım Analizi', fontsize=14, weight='bold')
-ax.set_xticks(x)
-ax.set_xticklabels(labels, fontsize=12)
-ax.legend()
-ax.set_ylim(0, 1.1)
-ax.grid(axis='y', linestyle='--', alpha=0.7)
-
 # Değerleri çubukların üzerine yaz
-def autolabel(rects):
+def autolabel(ax, rects, fmt='{:.2f}'):
     for rect in rects:
         height = rect.get_height()
-        ax.annotate(f'{height:.2f}',
+        ax.annotate(fmt.format(height),
                     xy=(rect.get_x() + rect.get_width() / 2, height),
                     xytext=(0, 3),
                     textcoords="offset points",
                     ha='center', va='bottom', weight='bold')
 
-autolabel(rects1)
-autolabel(rects2)
-autolabel(rects3)
+# --- 2. GRAFİK OLUŞTURMA (BAR CHART) ---
+if crisis:
+    df = pd.DataFrame({
+        "Sınıf": list(crisis["classes"]),
+        "Precision": [c["precision"] for c in crisis["classes"].values()],
+        "Recall": [c["recall"] for c in crisis["classes"].values()],
+        "F1-Score": [c["f1"] for c in crisis["classes"].values()],
+    })
+    labels = df["Sınıf"]
+    x = np.arange(len(labels))
+    width = 0.25
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    rects1 = ax.bar(x - width, df["Precision"], width, label='Precision (Kesinlik)', color='#2ecc71')
+    rects2 = ax.bar(x, df["Recall"], width, label='Recall (Duyarlılık)', color='#3498db')
+    rects3 = ax.bar(x + width, df["F1-Score"], width, label='F1-Score', color='#e67e22')
+
+    ax.set_ylabel('Skor (0-1 Arası)')
+    # Küçük (duman testi) veri setiyle üretilen sonuçlar grafikte işaretlenir
+    title = 'Normal vs Kriz Durumu Başarım Analizi'
+    if not crisis.get("representative", True):
+        title += f"\n(duman testi: {crisis['samples']} cümle, temsili değil)"
+    ax.set_title(title, fontsize=14, weight='bold')
+    ax.set_xticks(x)
+    ax.set_xticklabels(labels, fontsize=12)
+    ax.legend()
+    ax.set_ylim(0, 1.1)
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+
+    autolabel(ax, rects1)
+    autolabel(ax, rects2)
+    autolabel(ax, rects3)
+
+    plt.tight_layout()
+    plt.savefig("siniflandirma_grafigi.png", dpi=300)
+    print("✅ siniflandirma_grafigi.png oluşturuldu.")
+else:
+    print("ℹ️ Sonuçlarda etiketli kriz örneği yok; siniflandirma_grafigi.png atlandı.")
+
+# --- 3. GEÇMİŞ BÜYÜDÜKÇE GECİKME (tur bazında p50 / p95) ---
+if summary["by_turn"]:
+    turns = sorted(summary["by_turn"], key=int)
+    p50 = [summary["by_turn"][t]["latency_ms"]["p50"] / 1000 for t in turns]
+    p95 = [summary["by_turn"][t]["latency_ms"]["p95"] / 1000 for t in turns]
+    labels = [f"Tur {int(t) + 1}\n({summary['by_turn'][t]['history_messages']} mesaj)" for t in turns]
+    x = np.arange(len(turns))
+    width = 0.35
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    rects1 = ax.bar(x - width / 2, p50, width, label='p50', color='#3498db')
+    rects2 = ax.bar(x + width / 2, p95, width, label='p95', color='#e74c3c')
+
+    ax.set_ylabel('Cevap Süresi (sn)')
+    ax.set_title('Sohbet Geçmişi Büyüdükçe Cevap Süresi', fontsize=14, weight='bold')
+    ax.set_xticks(x)
+    ax.set_xticklabels(labels, fontsize=10)
+    ax.legend()
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+
+    autolabel(ax, rects1)
+    autolabel(ax, rects2)
 
-plt.tight_layout()
-plt.savefig("siniflandirma_grafigi.png", dpi=300)
-print("✅ siniflandirma_grafigi.png oluşturuldu.")
\ No newline at end of file
+    plt.tight_layout()
+    plt.savefig("gecikme_grafigi.png", dpi=300)
+    print("✅ gecikme_grafigi.png oluşturuldu.")
@@ -0,0 +1,111 @@
+# 8_benchmark_query_encoder.py
+#
+# Sorgu encoder'ının çalışma zamanlarını (fp32 / int8 / onnx / onnx_int8) karşılaştırır:
+# - Tek sorgu encode gecikmesi (p50 / p95), /chat'teki kullanım gibi batch=1
+# - Gerçek chunk korpusu üzerinde fp32 embedding'leriyle kosinüs benzerliği
+# - Index'te fp32 ile aynı chunk'ların getirilip getirilmediği (top-k örtüşmesi)
+
+import time
+import argparse
+import numpy as np
+
+from chunk_store import ChunkStore
+from query_encoder import RUNTIMES, QueryEncoder, cosine_similarities
+import vector_index
+
+# --- 1. AYARLAR ---
+
+VECTOR_STORE_DIR = "data/vector_store"
+MODEL_NAME = 'paraphrase-multilingual-mpnet-base-v2'
+
+parser = argparse.ArgumentParser(description="Sorgu encoder çalışma zamanlarının gecikme ve doğruluk karşılaştırması.")
+parser.add_argument("--runtimes", nargs="+", choices=RUNTIMES, default=list(RUNTIMES))
+parser.add_argument("--samples", type=int, default=500, help="Korpustan örneklenecek chunk sayısı.")
+parser.add_argument("--latency-queries", type=int, default=200, help="Gecikme ölçümünde encode edilecek sorgu sayısı.")
+parser.add_argument("--query-words", type=int, default=12, help="Sorgu gibi kısa metin için chunk'ın ilk kaç kelimesi.")
+parser.add_argument("--k", type=int, default=5, help="Top-k örtüşmesi için k.")
+args = parser.parse_args()
+
+# --- 2. VERİ ---
+
+print("Chunk store ve index yükleniyor...")
+store = ChunkStore(VECTOR_STORE_DIR)
+index, _ = vector_index.load_index(VECTOR_STORE_DIR)
+
+
+def live_ids(store):
+    ids = []
+    for i in range(len(store)):
+        try:
+            store.get(i)
+        except IndexError:
+            continue
+        ids.append(i)
+    return ids
+
+
+rng = np.random.default_rng(0)
+ids = live_ids(store)
+sample = rng.choice(ids, size=min(args.samples, len(ids)), replace=False)
+chunks = [store.text(int(i)) for i in sample]
+# Kullanıcı soruları kısa; gecikme ve top-k için chunk başlarından sorgu benzeri metinler
+queries = [" ".join(c.split()[:args.query_words]) for c in chunks[:args.latency_queries]]
+print(f"{len(chunks)} chunk, {len(queries)} sorgu örneklendi.")
+
+# --- 3. ÖLÇÜM ---
+
+def latency_ms(encoder, texts):
+    encoder.encode(texts[:5])  # ısınma
+    times = []
+    for text in texts:
+        start = time.perf_counter()
+        encoder.encode([text])
+        times.append((time.perf_counter() - start) * 1000)
+    return np.percentile(times, 50), np.percentile(times, 95)
+
+
+def top_k(vectors, k):
+    _, found = index.search(np.asarray(vectors, dtype="float32"), k)
+    return found
+
+
+results = []
+reference_chunks = None
+reference_top = None
+
+for runtime in ["fp32"] + [r for r in args.runtimes if r != "fp32"]:
+    print(f"\n--- {runtime} ---")
+    start = time.perf_counter()
+    encoder = QueryEncoder(MODEL_NAME, runtime)
+    load_s = time.perf_counter() - start
+
+    p50, p95 = latency_ms(encoder, queries)
+    chunk_vectors = encoder.encode(chunks)
+    query_top = top_k(encoder.encode(queries), args.k)
+
+    if runtime == "fp32":
+        reference_chunks, reference_top = chunk_vectors, query_top
+    cos = cosine_similarities(chunk_vectors, reference_chunks)
+    overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(query_top, reference_top)])
+
+    row = {
+        "runtime": runtime, "load_s": load_s, "p50_ms": p50, "p95_ms": p95,
+        "cos_mean": float(cos.mean()), "cos_min": float(cos.min()), "topk_overlap": float(overlap),
+    }
+    print(f"Yükleme {load_s:.1f} sn | p50 {p50:.2f} ms | p95 {p95:.2f} ms | "
+          f"kosinüs ort. {row['cos_mean']:.5f} min {row['cos_min']:.5f} | top-{args.k} örtüşme {overlap:.3f}")
+    if runtime in args.runtimes:
+        results.append(row)
+
+# --- 4. ÖZET TABLO ---
+
+base_p50 = results[0]["p50_ms"] if results and results[0]["runtime"] == "fp32" else None
+print("\n" + "=" * 86)
+print(f"{'Çalışma zamanı':<14} {'p50 (ms)':>9} {'p95 (ms)':>9} {'Hızlanma':>9} {'Kos. ort.':>10} {'Kos. min':>10} {f'Top-{args.k}':>8}")
+print("-" * 86)
+for row in results:
+    speedup = f"{base_p50 / row['p50_ms']:.2f}x" if base_p50 else "-"
+    print(f"{row['runtime']:<14} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {speedup:>9} "
+          f"{row['cos_mean']:>10.5f} {row['cos_min']:>10.5f} {row['topk_overlap']:>8.3f}")
+print("=" * 86)
+print("api.py'de kullanmak için: EMBEDDING_RUNTIME=<çalışma zamanı> (ör. onnx)")
@@ -0,0 +1,119 @@
+# 9_benchmark_retrieval.py
+#
+# Vektör (dense), BM25 (lexical) ve hibrit aramayı karşılaştırır:
+# - Sorgu başına gecikme (p50 / p95); dense ve hibritte encode dahil
+# - Hibrit modda sözcüksel hızlı yolun kullanılma oranı
+# - Dense sonuçlarla top-k örtüşmesi
+
+import os
+import time
+import argparse
+import numpy as np
+
+from lexical_index import BM25Index, FAST_PATH_CONFIDENCE, is_confident, reciprocal_rank_fusion
+from query_encoder import load_query_encoder
+import vector_index
+
+# --- 1. AYARLAR ---
+
+VECTOR_STORE_DIR = "data/vector_store"
+MODEL_NAME = 'paraphrase-multilingual-mpnet-base-v2'
+
+# Terim sorguları (hızlı yol adayları) ve doğal dil soruları karışık
+QUERIES = [
+    "bilişsel çarpıtma",
+    "otomatik düşünceler",
+    "ara inançlar",
+    "temel inanç",
+    "davranışsal deney",
+    "Sokratik sorgulama",
+    "felaketleştirme",
+    "zihin okuma",
+    "aşırı genelleme",
+    "depresyon",
+    "panik bozukluk",
+    "sosyal kaygı",
+    "Bilişsel çarpıtma nedir?",
+    "Depresyonun belirtileri nelerdir?",
+    "Terapide kullanılan temel teknikler hangileridir?",
+    "Olumsuz düşüncelerimle nasıl başa çıkabilirim?",
+    "Kendimi sürekli başarısız hissediyorum, ne yapmalıyım?",
+    "Kaygılandığımda nefesim daralıyor.",
+    "Ev ödevleri terapide neden önemlidir?",
+    "Danışanla terapötik ilişki nasıl kurulur?",
+]
+
+parser = argparse.ArgumentParser(description="Dense, BM25 ve hibrit arama karşılaştırması.")
+parser.add_argument("--k", type=int, default=3)
+parser.add_argument("--candidates", type=int, default=20, help="Hibritte RRF'e giren aday sayısı.")
+parser.add_argument("--confidence", type=float, default=FAST_PATH_CONFIDENCE, help="Hızlı yol güven eşiği.")
+parser.add_argument("--runtime", default=os.getenv("EMBEDDING_RUNTIME", "fp32"), help="Sorgu encoder çalışma zamanı.")
+parser.add_argument("--repeat", type=int, default=5, help="Her sorgu kaç kez ölçülsün.")
+args = parser.parse_args()
+
+# --- 2. YÜKLEME ---
+
+print("Index'ler ve model yükleniyor...")
+index, _ = vector_index.load_index(VECTOR_STORE_DIR)
+lexical_index = BM25Index.load(VECTOR_STORE_DIR)
+encoder = load_query_encoder(MODEL_NAME, args.runtime)
+encoder.encode(["ısınma"])
+
+# --- 3. ARAMA YOLLARI ---
+
+def dense(query, k):
+    vector = encoder.encode([query])
+    _, indices = index.search(np.asarray(vector, dtype="float32"), k)
+    return [int(i) for i in indices[0] if i != -1], False
+
+
+def lexical(query, k):
+    return lexical_index.search(query, k).ids.tolist(), True
+
+
+def hybrid(query, k):
+    result = lexical_index.search(query, max(k, args.candidates))
+    if is_confident(result, k, args.confidence):
+        return result.ids[:k].tolist(), True
+    vector = encoder.encode([query])
+    _, indices = index.search(np.asarray(vector, dtype="float32"), max(k, args.candidates))
+    return reciprocal_rank_fusion([indices[0], result.ids], k), False
+
+
+def measure(fn, query):
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        ids, fast = fn(query, args.k)
+        times.append((time.perf_counter() - start) * 1000)
+    return ids, fast, min(times)
+
+# --- 4. ÖLÇÜM ---
+
+rows = {name: {"ms": [], "overlap": [], "fast": 0} for name in ("dense", "lexical", "hybrid")}
+for query in QUERIES:
+    dense_ids, _, dense_ms = measure(dense, query)
+    rows["dense"]["ms"].append(dense_ms)
+    rows["dense"]["overlap"].append(1.0)
+    line = [f"{query[:40]:<40} dense {dense_ms:7.2f} ms"]
+    for name, fn in (("lexical", lexical), ("hybrid", hybrid)):
+        ids, fast, ms = measure(fn, query)
+        overlap = len(set(ids) & set(dense_ids)) / args.k
+        rows[name]["ms"].append(ms)
+        rows[name]["overlap"].append(overlap)
+        if name == "hybrid" and fast:
+            rows[name]["fast"] += 1
+        line.append(f"{name} {ms:7.2f} ms ({overlap:.2f}{', hızlı yol' if name == 'hybrid' and fast else ''})")
+    print(" | ".join(line))
+
+# --- 5. ÖZET ---
+
+print("\n" + "=" * 72)
+print(f"{'Mod':<10} {'p50 (ms)':>10} {'p95 (ms)':>10} {f'Top-{args.k} örtüşme':>16} {'Hızlı yol':>12}")
+print("-" * 72)
+for name, row in rows.items():
+    fast = f"{row['fast']}/{len(QUERIES)}" if name == "hybrid" else "-"
+    print(f"{name:<10} {np.percentile(row['ms'], 50):>10.3f} {np.percentile(row['ms'], 95):>10.3f} "
+          f"{np.mean(row['overlap']):>16.3f} {fast:>12}")
+print("=" * 72)
+print("Örtüşme: dense sonuçlarla ortak chunk oranı (dense = 1.0).")
@@ -1,17 +1,38 @@
 import os
 import json
-import faiss
+import time
+import asyncio
+import functools
+import contextvars
 import numpy as np
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
 
-# --- GEMINI & KRİZ MODÜLÜ ---
-import google.generativeai as genai
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
-import torch
+import model_store
+from chunk_store import ChunkStore
+from context_builder import assemble_context
+from memory_stats import process_memory
+import metrics
+from metrics import RequestMetricsMiddleware, span
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import EmbeddingCache
+from query_encoder import load_query_encoder
+from lexical_index import BM25Index, is_confident, reciprocal_rank_fusion
+import vector_index
+from history_compactor import HistoryCompactor, estimate_tokens
+from session_cache import SessionHistoryCache
+from response_cache import SemanticResponseCache
+
+# --- LLM & KRİZ MODÜLÜ ---
+from llm_backend import LLMClient, create_backend
+from crisis import CrisisDetector, CrisisLexicon, load_classifier
 
 # ==========================================
 # 🔑 API KEY AYARI
@@ -24,7 +45,126 @@ VECTOR_STORE_DIR = "data/vector_store"
 MODEL_NAME = 'paraphrase-multilingual-mpnet-base-v2'
 SENTIMENT_MODEL_ID = "savasy/bert-base-turkish-sentiment-cased"
 
-app = FastAPI(title="Psikoloji AI Chatbot API")
+# Modeller sadece yerel kopyalardan yüklenir (data/models, safetensors; bkz. 0_snapshot_models.py),
+# açılışta Hugging Face Hub'a hiç bağlanılmaz. transformers import edilmeden önce ayarlanmalı.
+MODEL_LOCAL_ONLY = os.getenv("MODEL_LOCAL_ONLY", "1") == "1"
+if MODEL_LOCAL_ONLY:
+    model_store.enable_offline_mode()
+
+# Sorgu embedding modelinin çalışma zamanı: "fp32", "int8", "onnx" ya da "onnx_int8".
+# fp32 dışındakiler fp32 embedding'leriyle bir kez karşılaştırılır (kosinüs; 0_snapshot_models.py ya da
+# ilk açılış), sonuç data/models altında saklanır; sapma varsa fp32'ye dönülür.
+# Karşılaştırma için: python 8_benchmark_query_encoder.py
+EMBEDDING_RUNTIME = os.getenv("EMBEDDING_RUNTIME", "onnx")
+
+# Kriz sınıflandırıcısının çalışma zamanı: "fp32", "int8" (dinamik kuantizasyon) ya da "onnx".
+# fp32 dışındakiler fp32 skorlarıyla bir kez karşılaştırılır (sonuç saklanır), sapma varsa fp32'ye dönülür.
+CRISIS_RUNTIME = os.getenv("CRISIS_RUNTIME", "int8")
+
+# serve.py ön yüklemede fork'a dayanmayan (onnx) çalışma zamanlarını değiştirir ve
+# istenen değerleri buraya yazar ({"EMBEDDING_RUNTIME": "onnx"}). İstenen ve kullanılan
+# çalışma zamanları /readyz'de (runtimes) ve /metrics'te (chatbot_runtime_info) görünür.
+RUNTIME_OVERRIDES = {}
+
+# Index mmap ile açılır; IVF türleri ve (faiss >= 1.10'da) flat / sq8 kodları worker'lar
+# arasında paylaşılır, bkz. vector_index.py. Arama parametreleri
+# build sırasında index_config.json'a yazılır; VECTOR_SEARCH_PARAMS ile ezilebilir (ör. "nprobe=16").
+VECTOR_INDEX_MMAP = os.getenv("VECTOR_INDEX_MMAP", "1") == "1"
+VECTOR_SEARCH_PARAMS = os.getenv("VECTOR_SEARCH_PARAMS", "")
+
+# Arama modu: "hybrid" (BM25 + vektör, RRF ile birleştirilir), "dense" ya da "lexical".
+# Hibrit modda kısa sorgularda BM25 güveni LEXICAL_FAST_PATH_CONFIDENCE'ı geçerse
+# FAISS araması yapılmaz; sorgu sadece geçmişsiz sorularda cevap önbelleği için encode
+# edilir. Karşılaştırma için: python 9_benchmark_retrieval.py
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+LEXICAL_FAST_PATH_CONFIDENCE = float(os.getenv("LEXICAL_FAST_PATH_CONFIDENCE", "0.6"))
+# RRF'e her iki taraftan girecek aday sayısı
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+# Context derleme (bkz. context_builder.py): aramadan CONTEXT_CANDIDATES aday alınır;
+# en iyi L2 mesafesinin CONTEXT_DISTANCE_RATIO katından (ya da CONTEXT_MAX_DISTANCE'tan, 0 = kapalı)
+# uzak olanlar atılır, MMR ile k chunk seçilir (CONTEXT_MMR_LAMBDA), komşu chunk'lar örtüşmesiz
+# birleştirilir ve context bloğu CONTEXT_TOKEN_BUDGET token'ı geçmez.
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "12"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_DISTANCE_RATIO = float(os.getenv("CONTEXT_DISTANCE_RATIO", "1.5"))
+CONTEXT_MAX_DISTANCE = float(os.getenv("CONTEXT_MAX_DISTANCE", "0"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# Eşzamanlı isteklerin sorguları tek encode çağrısında birleştirilir.
+# En fazla EMBED_BATCH_MAX_SIZE sorgu ya da EMBED_BATCH_MAX_WAIT_MS kadar beklenir.
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+
+# Tekrarlanan sorguların embedding önbelleği (boyut, saniye cinsinden ömür).
+# EMBED_CACHE_PATH verilirse önbellek kapanışta diske yazılır, açılışta geri yüklenir.
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "2048"))
+EMBED_CACHE_TTL_S = float(os.getenv("EMBED_CACHE_TTL_S", str(24 * 3600)))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "")
+
+# Sohbet geçmişi: son HISTORY_KEEP_TURNS tur her zaman aynen gönderilir, daha eskiler
+# oturum özetine katlanır. Daha eski ama henüz özetlenmemiş mesajlar, prompt'un tamamı
+# (talimat + context + özet + geçmiş + soru) PROMPT_TOKEN_BUDGET'a sığdığı sürece aynen
+# gönderilir; sığmazlarsa önce özetlenir (oturumun özeti o sırada arka planda
+# güncelleniyorsa beklenmez, sadece son turlar gönderilir).
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "4"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+LLM_MODEL_NAME = 'gemini-2.5-flash'
+
+# LLM backend'i (bkz. llm_backend.py): 'gemini' ya da yük testleri için ağsız yerel taklit 'stub'.
+# Taklidin gecikmeleri: ilk parçaya kadar LLM_STUB_FIRST_TOKEN_MS, sonra kelime başına LLM_STUB_TOKEN_MS;
+# LLM_STUB_SLOW_EVERY > 0 ise her N'inci çağrı LLM_STUB_SLOW_MS daha geç başlar (kuyruk gecikmesi).
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+LLM_STUB_FIRST_TOKEN_MS = float(os.getenv("LLM_STUB_FIRST_TOKEN_MS", "300"))
+LLM_STUB_TOKEN_MS = float(os.getenv("LLM_STUB_TOKEN_MS", "15"))
+LLM_STUB_SLOW_EVERY = int(os.getenv("LLM_STUB_SLOW_EVERY", "0"))
+LLM_STUB_SLOW_MS = float(os.getenv("LLM_STUB_SLOW_MS", "0"))
+
+# LLM çağrısı: çağrı başına tek süre sınırı (tekrarlar ve hedging dahil; akışta ilk parçaya,
+# ayrıca parçalar arasına), süre kaldıkça geçici hatalarda jitter'lı tekrar sayısı ve taban
+# bekleme. LLM_HEDGE=1 ise ilk deneme son çağrıların p95 süresini aşınca ikinci bir çağrı
+# başlatılır (çağrıların en fazla %10'u).
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF_S = float(os.getenv("LLM_RETRY_BACKOFF_S", "0.5"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+
+# /crisis/batch: tek istekte en fazla CRISIS_BATCH_MAX_TEXTS metin; model CRISIS_BATCH_SIZE'lık
+# (uzunluğa göre sıralı, dinamik padding'li) batch'lerle çalışır.
+CRISIS_BATCH_MAX_TEXTS = int(os.getenv("CRISIS_BATCH_MAX_TEXTS", "5000"))
+CRISIS_BATCH_SIZE = int(os.getenv("CRISIS_BATCH_SIZE", "64"))
+
+# Kriz sınıflandırması ve arama (BM25/FAISS) gibi CPU işleri event loop'u bloklamadan
+# bu boyuttaki ortak havuzda çalışır; kriz kontrolü ve arama aynı anda yürütülür.
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Geçmişsiz (ilk mesaj) sorular için anlamsal cevap önbelleği: yeni sorgunun embedding'i
+# önbellekteki bir sorguya RESPONSE_CACHE_THRESHOLD kosinüs benzerliğinden yakınsa Gemini'ye
+# gidilmez. Riskli kelime içeren sorgular önbelleğe yazılmaz ve önbellekten cevaplanmaz.
+# RESPONSE_CACHE_SIZE=0 önbelleği kapatır.
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL_S = float(os.getenv("RESPONSE_CACHE_TTL_S", str(6 * 3600)))
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.92"))
+
+# session_id ile gelen isteklerde geçmiş sunucuda (psychbot.db) tutulur;
+# son aktif SESSION_CACHE_SIZE oturumun en fazla SESSION_CACHE_MAX_MESSAGES mesajı bellekte önbelleklenir.
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "256"))
+SESSION_CACHE_MAX_MESSAGES = int(os.getenv("SESSION_CACHE_MAX_MESSAGES", "200"))
+
+# Modeller arka planda yüklenir; sunucu hemen bağlantı kabul eder (/healthz),
+# /readyz ve sohbet uçları yükleme bitince hazır olur.
+@asynccontextmanager
+async def lifespan(app):
+    loading = None
+    # serve.py modelleri fork'tan önce ana süreçte yükler; worker'lar tekrar yüklemez
+    if startup_state["seconds"] is None:
+        loading = asyncio.create_task(asyncio.to_thread(load_resources))
+    yield
+    if loading is not None and not loading.done():
+        print("⚠️ Açılış tamamlanmadan kapatılıyor.")
+    await release_resources()
+
+app = FastAPI(title="Psikoloji AI Chatbot API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,89 +172,205 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# İstek başına request id, aşama süreleri (/metrics) ve JSON log satırı
+app.add_middleware(RequestMetricsMiddleware, skip_paths=("/metrics", "/healthz", "/readyz"))
 
 # Global Değişkenler
 embedding_model = None
+embedding_batcher = None
+embedding_cache = EmbeddingCache(EMBED_CACHE_SIZE, EMBED_CACHE_TTL_S, EMBED_CACHE_PATH)
 index = None
-chunk_map = None
-sentiment_tokenizer = None
-sentiment_model = None
+chunk_store = None
+lexical_index = None
+retrieval_stats = {"lexical_fast_path": 0, "hybrid": 0, "dense": 0, "lexical": 0}
+crisis_detector = CrisisDetector(CrisisLexicon.load())
+session_cache = SessionHistoryCache(SESSION_CACHE_SIZE, SESSION_CACHE_MAX_MESSAGES)
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+response_cache = (SemanticResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_S, RESPONSE_CACHE_THRESHOLD)
+                  if RESPONSE_CACHE_SIZE > 0 else None)
 
-@app.on_event("startup")
-def load_resources():
-    global embedding_model, index, chunk_map, sentiment_tokenizer, sentiment_model
-    print("🚀 SİSTEM BAŞLATILIYOR...")
-    
-    # 1. Embedding Model (CPU - Bilgisayarı yormaz)
-    print("📦 1. Embedding Modeli (CPU) Yükleniyor...")
-    embedding_model = SentenceTransformer(MODEL_NAME, device='cpu')
-    
+# --- AÇILIŞ ---
+# Üç bağımsız adım (embedding modeli, vektör deposu, kriz modeli) paralel yüklenir;
+# her model bir ısınma çıkarımı yapar. Adım süreleri /readyz'de ve logda görünür.
+startup_state = {"ready": False, "seconds": None, "stages": {}, "runtimes": {}}
+# Bu adımlar olmadan sohbet uçları çalışamaz (kriz modeli yoksa sözlük filtresi yeterli)
+REQUIRED_STAGES = ("embedding", "vector_store")
+WARMUP_TEXT = "Merhaba, bugün kendimi biraz yorgun hissediyorum."
+
+def record_runtime(model, setting, configured, actual):
+    """İstenen (serve.py değiştirdiyse asıl istenen) ve kullanılan çalışma zamanını yayınlar."""
+    requested = RUNTIME_OVERRIDES.get(setting, configured)
+    startup_state["runtimes"][model] = {"requested": requested, "actual": actual}
+    metrics.RUNTIME_INFO.set(model=model, requested=requested, actual=actual)
+    if requested != actual:
+        print(f"⚠️ {model} için '{requested}' istendi, '{actual}' kullanılıyor.")
+
+def load_embedding_model():
+    global embedding_model, embedding_batcher
+    print(f"📦 1. Embedding Modeli (CPU, {EMBEDDING_RUNTIME}) Yükleniyor...")
+    model = load_query_encoder(MODEL_NAME, EMBEDDING_RUNTIME, local_files_only=MODEL_LOCAL_ONLY)
+    # Isınma: ilk çıkarımdaki tembel ilklemeler (thread havuzu, bellek ayırma) ilk kullanıcıya kalmasın
+    model.encode([WARMUP_TEXT])
+    embedding_batcher = EmbeddingBatcher(model, EMBED_BATCH_MAX_SIZE, EMBED_BATCH_MAX_WAIT_MS)
+    embedding_model = model
+    record_runtime("embedding", "EMBEDDING_RUNTIME", EMBEDDING_RUNTIME, model.runtime)
+    print(f"✅ Embedding Modeli Hazır! ({model.runtime})")
     try:
-        index = faiss.read_index(os.path.join(VECTOR_STORE_DIR, "vector_store.index"))
-        with open(os.path.join(VECTOR_STORE_DIR, "chunk_map.json"), 'r', encoding='utf-8') as f:
-            chunk_map = json.load(f)
-        print("✅ RAG Veritabanı Hazır!")
+        restored = embedding_cache.load()
+        if restored:
+            print(f"♻️ Embedding önbelleği diskten yüklendi ({restored} kayıt).")
     except Exception as e:
-        print(f"❌ RAG Yükleme Hatası: {e}")
+        print(f"⚠️ Embedding önbelleği okunamadı: {e}")
 
-    # 2. Kriz Modeli (CPU)
+def load_vector_store():
+    global index, chunk_store, lexical_index
+    loaded_index, index_config = vector_index.load_index(VECTOR_STORE_DIR, VECTOR_INDEX_MMAP, VECTOR_SEARCH_PARAMS)
+    print(f"🔎 Index türü: {index_config.get('type')} | {VECTOR_SEARCH_PARAMS or index_config.get('search') or 'parametresiz arama'}")
+    # Chunk metinleri bir kez mmap ile açılır; istek başına dosya okunmaz.
+    store = ChunkStore(VECTOR_STORE_DIR)
+    if store.live != loaded_index.ntotal:
+        print(f"⚠️ Index ({loaded_index.ntotal}) ve chunk store ({store.live}) boyutları farklı. 3_create_vector_store.py'yi tekrar çalıştırın.")
+    # Isınma: mmap'lenmiş index sayfaları ilk aramadan önce belleğe gelsin
+    loaded_index.search(np.zeros((1, loaded_index.d), dtype='float32'), 1)
+    index, chunk_store = loaded_index, store
+    print(f"✅ RAG Veritabanı Hazır! ({store.live} chunk)")
+
+    if RETRIEVAL_MODE != "dense":
+        try:
+            lexical = BM25Index.load(VECTOR_STORE_DIR)
+            lexical.search(WARMUP_TEXT, 1)
+            lexical_index = lexical
+            print(f"✅ BM25 Index'i Hazır! ({len(lexical)} terim, mod: {RETRIEVAL_MODE})")
+        except Exception as e:
+            print(f"⚠️ BM25 index'i yüklenemedi ({e}); sadece vektör araması kullanılacak. "
+                  "3_create_vector_store.py'yi tekrar çalıştırın.")
+
+def load_crisis_model():
+    print(f"📦 2. Kriz Modeli (CPU, {CRISIS_RUNTIME}) Yükleniyor...")
+    classifier = load_classifier(SENTIMENT_MODEL_ID, CRISIS_RUNTIME, local_files_only=MODEL_LOCAL_ONLY)
+    classifier.negative_scores([WARMUP_TEXT])
+    crisis_detector.classifier = classifier
+    record_runtime("crisis", "CRISIS_RUNTIME", CRISIS_RUNTIME, classifier.runtime)
+    print(f"✅ Kriz Modeli Hazır! ({classifier.runtime})")
+
+STARTUP_STAGES = (
+    ("embedding", load_embedding_model),
+    ("vector_store", load_vector_store),
+    ("crisis", load_crisis_model),
+)
+
+def run_stage(name, fn):
+    stage = startup_state["stages"][name]
+    stage["status"] = "loading"
+    start = time.perf_counter()
     try:
-        print("📦 2. Kriz Modeli (CPU) Yükleniyor...")
-        sentiment_tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL_ID)
-        sentiment_model = AutoModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL_ID).to("cpu")
-        print("✅ Kriz Modeli Hazır!")
+        fn()
+        stage["status"] = "ready"
     except Exception as e:
-        print(f"❌ Kriz Modeli Hatası: {e}")
+        stage["status"] = f"failed: {e}"
+        print(f"❌ Açılış adımı '{name}' başarısız: {e}")
+    stage["seconds"] = round(time.perf_counter() - start, 3)
 
-# --- GELİŞMİŞ KRİZ TESPİTİ (Filtreli) ---
-def detect_crisis(text):
-    if not sentiment_model or not sentiment_tokenizer:
-        return False, 0.0
+def load_resources():
+    """Tüm açılış adımlarını paralel çalıştırır ve bitene kadar bekler."""
+    print("🚀 SİSTEM BAŞLATILIYOR...")
+    start = time.perf_counter()
+    # Anahtarlar önceden oluşturulur; /readyz okurken sözlük boyutu değişmez
+    startup_state["stages"] = {name: {"status": "pending", "seconds": None} for name, _ in STARTUP_STAGES}
+    with ThreadPoolExecutor(max_workers=len(STARTUP_STAGES), thread_name_prefix="startup") as pool:
+        for name, fn in STARTUP_STAGES:
+            pool.submit(run_stage, name, fn)
+    startup_state["seconds"] = round(time.perf_counter() - start, 3)
+    startup_state["ready"] = all(startup_state["stages"][n]["status"] == "ready" for n in REQUIRED_STAGES)
 
-    # 1. ADIM: HIZLI FİLTRE (Keywords)
-    # Eğer bu kelimeler yoksa, modeli boşuna çalıştırma ve alarm verme.
-    risk_keywords = [
-        "ölmek", "intihar", "canıma kıy", "dayanamıyorum", "bıktım", "hap iç", 
-        "kendimi kes", "yaşamak istemiyorum", "her şey bitsin", "veda", 
-        "artık son", "kimse beni sevmiyor", "kurtulmak istiyorum"
-    ]
-    
-    text_lower = text.lower()
-    keyword_hit = any(word in text_lower for word in risk_keywords)
+    breakdown = " | ".join(f"{name}: {stage['seconds']:.2f} sn" + ("" if stage["status"] == "ready" else " (hata)")
+                           for name, stage in startup_state["stages"].items())
+    status = "✅ Hazır" if startup_state["ready"] else "❌ Hazır değil"
+    print(f"⏱️ {status} — açılış {startup_state['seconds']:.2f} sn ({breakdown})")
 
-    # Eğer riskli kelime HİÇ yoksa, direkt güvenli kabul et.
-    if not keyword_hit:
-        return False, 0.0
+async def release_resources():
+    llm.close()
+    if embedding_batcher:
+        await embedding_batcher.close()
+    cpu_executor.shutdown(wait=False, cancel_futures=True)
+    try:
+        embedding_cache.save()
+    except Exception as e:
+        print(f"⚠️ Embedding önbelleği kaydedilemedi: {e}")
+    print(f"📊 Embedding önbelleği: {embedding_cache.stats()}")
 
-    # 2. ADIM: DERİN ANALİZ (Model)
-    # Sadece riskli kelime varsa buraya girer.
-    inputs = sentiment_tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=128)
-    inputs = {key: val.to("cpu") for key, val in inputs.items()}
+def require_ready():
+    if not startup_state["ready"]:
+        raise HTTPException(status_code=503, detail="Servis hazırlanıyor, lütfen biraz sonra tekrar deneyin.")
 
-    with torch.no_grad():
-        logits = sentiment_model(**inputs).logits
-    
-    probabilities = torch.softmax(logits, dim=1)
-    
-    # savasy modelinde genelde: Index 0 -> Negatif, Index 1 -> Pozitif olabilir
-    # Ancak biz keyword kontrolü yaptığımız için sadece negatif skora bakacağız.
-    # Genelde Index 0 negatiftir bu modelde.
-    negative_score = probabilities[0][0].item() 
+@app.get("/healthz")
+def healthz():
+    # Canlılık: süreç ayakta ve istek karşılıyor (modeller yükleniyor olabilir)
+    return {"status": "ok"}
 
-    print(f"🔍 Kriz Analizi: '{text}' | Kelime: Var | Negatiflik: {negative_score:.4f}")
+@app.get("/readyz")
+def readyz():
+    # Hazırlık: sohbet uçları trafik almaya hazır mı; adım süreleri ve durumları ile
+    return JSONResponse(status_code=200 if startup_state["ready"] else 503, content=startup_state)
 
-    # KURAL: Hem kelime geçecek HEM DE model %70 üstü negatif diyecek.
-    # Veya kelime çok net "intihar" ise skora bakmadan uyar.
-    is_crisis = False
-    
-    if negative_score > 0.70:
-        is_crisis = True
-    elif "intihar" in text_lower or "ölmek" in text_lower:
-        is_crisis = True
-        
+async def embed_query(text):
+    # Önce önbellek; yoksa batcher ile hesaplayıp önbelleğe koy
+    with span("query_embed"):
+        vector = embedding_cache.get(text)
+        if vector is None:
+            vector = await embedding_batcher.encode(text)
+            embedding_cache.put(text, vector)
+    return vector
+
+def run_cpu(fn, *args):
+    """CPU işini sınırlı havuzda çalıştırır (await edilebilir); isteğin metrik izi de taşınır."""
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(cpu_executor, functools.partial(context.run, fn, *args))
+
+# --- GELİŞMİŞ KRİZ TESPİTİ (Filtreli) ---
+def detect_crisis(text):
+    # Sözlük her zaman yüklüdür; model yüklenemediyse sadece net ifadeler kriz sayılır
+    with span("crisis_keyword"):
+        scan = crisis_detector.lexicon.scan(text)
+    if not scan[0]:
+        return False, 0.0
+    with span("crisis_model"):
+        is_crisis, negative_score = crisis_detector.classify(text, scan)
+    metrics.annotate(crisis_keywords=list(scan[2]), negative_score=round(float(negative_score), 4))
     return is_crisis, negative_score
 
+def detect_crisis_batch(texts, threshold=None):
+    """detect_crisis'in toplu hali: [(kriz mi, negatiflik skoru, eşleşen ifadeler)]."""
+    with span("crisis_keyword"):
+        scans = crisis_detector.scan_batch(texts)
+    with span("crisis_model"):
+        scores = crisis_detector.score_batch(texts, scans, CRISIS_BATCH_SIZE)
+    return [(crisis_detector.decide(scan[1], score, threshold), score, scan[2])
+            for scan, score in zip(scans, scores)]
+
+@app.get("/stats")
+def stats_endpoint():
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "embedding_batcher": embedding_batcher.stats() if embedding_batcher else None,
+        "session_cache": session_cache.stats(),
+        "retrieval": dict(retrieval_stats, mode=RETRIEVAL_MODE),
+        "response_cache": response_cache.stats() if response_cache else None,
+        "llm": llm.stats(),
+        "memory": dict(process_memory() or {}, pid=os.getpid()),
+    }
+
+@app.get("/metrics")
+def metrics_endpoint(request: Request):
+    # Prometheus metin formatı; OpenMetrics isteyen kazıyıcıya exemplar'lar (request id) da gönderilir
+    openmetrics = "application/openmetrics-text" in request.headers.get("accept", "")
+    return Response(
+        content=metrics.render(openmetrics),
+        media_type=metrics.OPENMETRICS_CONTENT_TYPE if openmetrics else metrics.PROMETHEUS_CONTENT_TYPE,
+    )
+
 # --- VERİ MODELLERİ ---
 class Message(BaseModel):
     role: str
@@ -127,66 +383,114 @@ class UserProfile(BaseModel):
 
 class ChatRequest(BaseModel):
     query: str
+    # session_id verilirse geçmiş sunucuda tutulur ve bu alan yok sayılır;
+    # oturumsuz istemciler (testler vb.) geçmişi kendileri gönderebilir.
     history: List[Message] = []
     user_profile: Optional[UserProfile] = None
     k: int = 3
+    session_id: Optional[int] = None
 
-@app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
-    # 1. KRİZ KONTROLÜ
-    is_crisis, confidence = detect_crisis(request.query)
-    
-    if is_crisis:
-        print(f"🚨 KRİZ TESPİT EDİLDİ! Skor: {confidence:.4f}")
-        return {
-            "reply": (
-                "⚠️ **ÖNEMLİ UYARI:** Yazdıklarınızdan zor bir süreçten geçtiğiniz anlaşılıyor. "
-                "Lütfen yalnız kalmayın.\n\n"
-                "**Acil Destek:**\n"
-                "- 📞 **112** Acil Çağrı\n"
-                "- 📞 **ALO 183** Sosyal Destek"
-            ),
-            "sources": ["KRİZ PROTOKOLÜ"],
-            "is_crisis": True 
-        }
-
-    # 2. RAG ARAMASI
+class CrisisBatchRequest(BaseModel):
+    texts: List[str]
+    # Verilirse model eşiği bu istek için değiştirilir (eşik denemeleri için)
+    threshold: Optional[float] = None
+
+CRISIS_REPLY = (
+    "⚠️ **ÖNEMLİ UYARI:** Yazdıklarınızdan zor bir süreçten geçtiğiniz anlaşılıyor. "
+    "Lütfen yalnız kalmayın.\n\n"
+    "**Acil Destek:**\n"
+    "- 📞 **112** Acil Çağrı\n"
+    "- 📞 **ALO 183** Sosyal Destek"
+)
+CRISIS_SOURCES = ["KRİZ PROTOKOLÜ"]
+
+# --- SOHBET ADIMLARI (/chat ve /chat/stream ortak kullanır) ---
+async def search_lexical(query, n):
+    """BM25 araması (en az HYBRID_CANDIDATES aday); BM25 index'i yoksa None."""
+    if lexical_index is None:
+        return None
+    with span("lexical_search"):
+        return await run_cpu(lexical_index.search, query, max(n, HYBRID_CANDIDATES))
+
+def lexical_suffices(lexical, k):
+    """BM25 sonucu tek başına yeterli mi (sadece sözcüksel mod ya da emin hızlı yol)?"""
+    return lexical is not None and (RETRIEVAL_MODE == "lexical" or is_confident(lexical, k, LEXICAL_FAST_PATH_CONFIDENCE))
+
+async def retrieve_ids(query, k, n=None, lexical=None, query_vector=None):
+    """
+    Sorgu için en alakalı n (varsayılan k) chunk id'si (RETRIEVAL_MODE'a göre) ve
+    dense sonuçların L2 mesafeleri: (ids, {id: mesafe}). BM25 sonucu ya da sorgu
+    vektörü önceden hesaplandıysa (prepare_reply) tekrar hesaplanmaz.
+    """
+    n = max(k, n or k)
+    if lexical is None:
+        lexical = await search_lexical(query, n)
+    if lexical is not None:
+        if RETRIEVAL_MODE == "lexical":
+            retrieval_stats["lexical"] += 1
+            return lexical.ids[:n].tolist(), {}
+        if lexical_suffices(lexical, k):
+            retrieval_stats["lexical_fast_path"] += 1
+            return lexical.ids[:n].tolist(), {}
+
+    # Encode, diğer isteklerle aynı batch'te ve event loop dışında yapılır
+    if query_vector is None:
+        query_vector = await embed_query(query)
+    n_dense = max(n, HYBRID_CANDIDATES) if lexical is not None else n
+    with span("faiss_search"):
+        distances, indices = await run_cpu(index.search, np.array([query_vector]).astype('float32'), n_dense)
+    dense_distances = {int(i): float(d) for i, d in zip(indices[0], distances[0]) if i != -1}
+    if lexical is None or len(lexical.ids) == 0:
+        retrieval_stats["dense"] += 1
+        return indices[0][:n].tolist(), dense_distances
+
+    retrieval_stats["hybrid"] += 1
+    return reciprocal_rank_fusion([indices[0], lexical.ids], n), dense_distances
+
+async def retrieve_context(query, k, lexical=None, query_vector=None):
+    """Sorgu için context bloğunu derler; (context_block, sources) döndürür."""
+    blocks = []
     try:
-        query_vector = embedding_model.encode([request.query])
-        distances, indices = index.search(np.array(query_vector).astype('float32'), request.k)
-
-        retrieved_texts = []
-        sources = []
-        if chunk_map:
-            for i, idx in enumerate(indices[0]):
-                if idx == -1: continue
-                try:
-                    # JSON keyleri string olabilir, int'e çeviriyoruz veya tam tersi
-                    chunk_file = chunk_map[str(idx)] if str(idx) in chunk_map else chunk_map[idx]
-                    
-                    with open(chunk_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        retrieved_texts.append(f"- {data[0]['text']}")
-                        sources.append(os.path.basename(chunk_file))
-                except: continue
-        
-        context_block = "\n".join(retrieved_texts)
+        ids, distances = await retrieve_ids(query, k, CONTEXT_CANDIDATES, lexical, query_vector)
+
+        chunks = []
+        if chunk_store:
+            with span("chunk_fetch"):
+                for idx in ids:
+                    if idx == -1: continue
+                    try:
+                        chunks.append(chunk_store.get(idx))
+                    except IndexError:
+                        continue
+
+        # Mesafe eşiği, MMR, komşu chunk birleştirme ve token bütçesi
+        with span("context_assembly"):
+            blocks, stats = assemble_context(
+                chunks, distances, k, mmr_lambda=CONTEXT_MMR_LAMBDA, max_distance=CONTEXT_MAX_DISTANCE,
+                distance_ratio=CONTEXT_DISTANCE_RATIO, budget_tokens=CONTEXT_TOKEN_BUDGET)
+        metrics.annotate(context=stats)
     except Exception as e:
         print(f"RAG Hatası: {e}")
-        context_block = ""
 
-    # 3. GEMINI HAZIRLIĞI
-    genai.configure(api_key=GEMINI_API_KEY)
-    
+    context_block = "\n".join(f"- {block['text']}" for block in blocks)
+    return context_block, list(set(block["source"] for block in blocks))
+
+def build_system_instruction(user_profile, context_block, summary=""):
     profile_text = ""
-    if request.user_profile:
-        p = request.user_profile
+    if user_profile:
+        p = user_profile
         profile_text = f"KULLANICI PROFİLİ: Adı: {p.name}, Yaşı: {p.age}, Cinsiyeti: {p.gender}."
 
-    system_instruction = f"""
+    summary_text = ""
+    if summary:
+        summary_text = f"ÖNCEKİ KONUŞMANIN ÖZETİ (daha eski mesajlar):\n    {summary}"
+
+    return f"""
     Sen Bilişsel Davranışçı Terapi (BDT) konusunda uzman, empatik bir yapay zeka psikoloji asistanısın.
     
     {profile_text}
+
+    {summary_text}
     
     AŞAĞIDAKİ KAYNAK BİLGİLERİ (CONTEXT) KULLANARAK CEVAP VER:
     {context_block}
@@ -199,22 +503,263 @@ async def chat_endpoint(request: ChatRequest):
     5. Cevaplarında "Yapay zeka", "Dil modeli", "Bilgi kesilme tarihi" gibi robotik ifadeler KULLANMA.
     """
 
-    # Model İsmi Düzeltildi: gemini-2.5-flash
-    model = genai.GenerativeModel(
-        'gemini-2.5-flash',
-        system_instruction=system_instruction
+llm = LLMClient(
+    create_backend(LLM_BACKEND, api_key=GEMINI_API_KEY, model_name=LLM_MODEL_NAME,
+                   first_token_ms=LLM_STUB_FIRST_TOKEN_MS, token_ms=LLM_STUB_TOKEN_MS,
+                   slow_every=LLM_STUB_SLOW_EVERY, slow_ms=LLM_STUB_SLOW_MS),
+    timeout_s=LLM_TIMEOUT_S, max_retries=LLM_MAX_RETRIES, backoff_s=LLM_RETRY_BACKOFF_S, hedge=LLM_HEDGE,
+)
+
+async def summarize_history(previous_summary, messages):
+    """
+    Önceki özet + pencereden yeni çıkan mesajlar -> güncel özet. LLMClient üzerinden
+    (süre sınırı ve tekrarlarla) çağrılır; CPU havuzunu tutmaz.
+    """
+    transcript = "\n".join(
+        f"{'Kullanıcı' if m['role'] == 'user' else 'Asistan'}: {m['content']}" for m in messages
+    )
+    prompt = (
+        "Bir terapi sohbetinin özetini güncelliyorsun. Kullanıcının anlattığı önemli olayları, "
+        "duyguları, düşünce kalıplarını ve konuşulan teknikleri koru. En fazla 150 kelime yaz.\n\n"
+        f"MEVCUT ÖZET:\n{previous_summary or '(yok)'}\n\n"
+        f"YENİ MESAJLAR:\n{transcript}\n\n"
+        "GÜNCEL ÖZET:"
     )
+    return (await llm.complete(prompt)).strip()
+
+history_compactor = HistoryCompactor(summarize_history, HISTORY_KEEP_TURNS)
+
+async def load_history(request):
+    """
+    Yeni mesajdan önceki geçmiş: oturum varsa sunucudan, yoksa istekten.
+    (offset, mesajlar) döndürür; offset, oturum önbelleğinde tutulmayan eski mesaj sayısıdır.
+    """
+    if request.session_id is not None:
+        return await run_in_threadpool(session_cache.get, request.session_id)
+    return 0, [{"role": 'user' if m.role == 'user' else 'model', "content": m.content} for m in request.history]
+
+async def persist_exchange(request, reply):
+    # Kullanıcı mesajı cevapla birlikte, cevap tamamlandıktan sonra yazılır; istemci
+    # akış ortasında koparsa oturumda cevapsız bir mesaj kalmaz.
+    if request.session_id is not None:
+        await run_in_threadpool(session_cache.append, request.session_id,
+                                [("user", request.query), ("model", reply)])
+
+async def build_prompt(request, history, offset, context_block):
+    """
+    LLM'e gidecek (sistem talimatı, geçmiş) ikilisi. Bütçeye sığmayan eski mesajlar
+    gerekirse önce özetlenir (LLM çağrısı, event loop'ta beklenir).
+    """
+    with span("prompt_build"):
+        # Geçmiş, prompt bütçesinin talimat + context + sorudan artan kısmına sığdırılır
+        fixed_tokens = estimate_tokens(build_system_instruction(request.user_profile, context_block)) + estimate_tokens(request.query)
+        summary, recent = await history_compactor.build(
+            request.session_id, history, max(0, PROMPT_TOKEN_BUDGET - fixed_tokens), offset)
+        return build_system_instruction(request.user_profile, context_block, summary), recent
+
+def profile_name(request):
+    return request.user_profile.name if request.user_profile else ""
+
+async def lookup_cached_reply(request, history):
+    """
+    Geçmişsiz ve risksiz sorgular için (sorgu vektörü, önbellek sonucu) döndürür.
+    Önbelleğe uygun olmayan sorgularda vektör None'dır (cevap da önbelleğe yazılmaz).
+    """
+    if response_cache is None or history:
+        return None, None
+    # Kriz sayılmasa bile riskli kelime geçen sorgular genel bir cevapla karşılanmamalı
+    if crisis_detector.lexicon.scan(request.query)[0]:
+        return None, None
+    try:
+        vector = await embed_query(request.query)
+    except Exception as e:
+        print(f"⚠️ Cevap önbelleği atlandı: {e}")
+        return None, None
+    return vector, response_cache.get(vector, request.k, profile_name(request))
+
+def store_cached_reply(request, vector, reply, sources):
+    if vector is not None:
+        response_cache.put(vector, request.query, reply, sources, request.k, profile_name(request))
+
+async def prepare_reply(request, history):
+    """
+    Kriz kontrolünden bağımsız hazırlık: cevap önbelleği, yoksa RAG araması.
+    (önbellek vektörü, önbellek sonucu, context_block, sources) döndürür.
+    BM25 araması ve önbellek bakışı birlikte yürür. Geçmişsiz sorgularda önbelleğe
+    her zaman bakılır (sorgu encode edilir, cevap önbelleğe yazılabilsin); sözcüksel
+    hızlı yol sadece aramada geçerlidir. Geçmişli sorgularda hızlı yol yeterliyse
+    sorgu hiç encode edilmez; encode edildiyse vektör aramada da kullanılır.
+    """
+    async def lexical_search():
+        try:
+            return await search_lexical(request.query, max(request.k, CONTEXT_CANDIDATES))
+        except Exception as e:
+            print(f"⚠️ BM25 araması başarısız: {e}")
+            return None
+
+    lexical, (cache_vector, cached) = await asyncio.gather(lexical_search(), lookup_cached_reply(request, history))
+    if cached is not None:
+        return cache_vector, cached, "", cached[1]
+    context_block, sources = await retrieve_context(request.query, request.k, lexical, cache_vector)
+    return cache_vector, None, context_block, sources
 
-    gemini_history = []
-    for msg in request.history:
-        role = 'user' if msg.role == 'user' else 'model'
-        gemini_history.append({'role': role, 'parts': [msg.content]})
+def discard(task):
+    # Sonucu artık gerekmeyen görevi iptal et; hata verirse "retrieved" sayılsın
+    task.cancel()
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+async def check_crisis_and_prepare(request, history):
+    """
+    Kriz tespiti ve cevap hazırlığı eşzamanlı çalışır; istek süresi ikisinin
+    toplamı değil, uzun olanıdır. Kriz varsa hazırlık iptal edilir.
+    (kriz mi, skor, hazırlık ya da None) döndürür.
+    """
+    prepare = asyncio.ensure_future(prepare_reply(request, history))
+    try:
+        is_crisis, confidence = await run_cpu(detect_crisis, request.query)
+    except BaseException:
+        discard(prepare)
+        raise
+    if is_crisis:
+        discard(prepare)
+        return True, confidence, None
+    return False, confidence, await prepare
 
+async def update_history_summary(request, history, offset, reply):
+    # Cevap gönderildikten sonra çalışır; pencereden çıkan mesajları özete ekler
+    if request.session_id is None:
+        return
+    messages = history + [
+        {"role": "user", "content": request.query},
+        {"role": "model", "content": reply},
+    ]
     try:
-        chat = model.start_chat(history=gemini_history)
-        response = chat.send_message(request.query)
-        ai_reply = response.text
+        await history_compactor.update(request.session_id, messages, offset)
+    except Exception as e:
+        print(f"⚠️ Geçmiş özeti güncellenemedi: {e}")
+
+@app.post("/chat")
+async def chat_endpoint(request: ChatRequest, background_tasks: BackgroundTasks):
+    require_ready()
+    # 0. GEÇMİŞ (sunucu tarafı oturum); kullanıcı mesajı cevapla birlikte kaydedilir
+    offset, history = await load_history(request)
+
+    # 1. KRİZ KONTROLÜ ile eşzamanlı: CEVAP ÖNBELLEĞİ (geçmişsiz sorular) ya da RAG ARAMASI
+    is_crisis, confidence, prepared = await check_crisis_and_prepare(request, history)
+    metrics.annotate(is_crisis=is_crisis, cached=bool(prepared and prepared[1] is not None))
+
+    if is_crisis:
+        print(f"🚨 KRİZ TESPİT EDİLDİ! Skor: {confidence:.4f}")
+        await persist_exchange(request, CRISIS_REPLY)
+        return {"reply": CRISIS_REPLY, "sources": CRISIS_SOURCES, "is_crisis": True}
+
+    # 2. ÖNBELLEKTEN CEVAP
+    cache_vector, cached, context_block, sources = prepared
+    if cached is not None:
+        ai_reply, sources, _ = cached
+        await persist_exchange(request, ai_reply)
+        return {"reply": ai_reply, "sources": sources, "is_crisis": False, "cached": True}
+
+    # 3. LLM (süre sınırı, tekrar ve hedging LLMClient'ta)
+    try:
+        system_instruction, recent = await build_prompt(request, history, offset, context_block)
+        with span("llm_call"):
+            ai_reply = await llm.generate(system_instruction, recent, request.query)
+        store_cached_reply(request, cache_vector, ai_reply, sources)
     except Exception as e:
         ai_reply = f"Bağlantı hatası oluştu: {str(e)}"
 
-    return {"reply": ai_reply, "sources": list(set(sources)), "is_crisis": False}
+    await persist_exchange(request, ai_reply)
+    background_tasks.add_task(update_history_summary, request, history, offset, ai_reply)
+    return {"reply": ai_reply, "sources": sources, "is_crisis": False}
+
+@app.post("/crisis/batch")
+async def crisis_batch_endpoint(request: CrisisBatchRequest):
+    """Metin listesini toplu sınıflandırır (moderasyon kuyruğu, eşik denemeleri)."""
+    require_ready()
+    # Model yoksa skorlar 0 olur ve sonuçlar gerçek bir sınıflandırma gibi görünür;
+    # /chat sözlükle yetinebilir ama toplu sınıflandırma isteyen bunu ayırt edemez
+    if crisis_detector.classifier is None:
+        raise HTTPException(status_code=503, detail="Kriz modeli yüklenemedi; toplu sınıflandırma kullanılamıyor.")
+    if len(request.texts) > CRISIS_BATCH_MAX_TEXTS:
+        raise HTTPException(status_code=413,
+                            detail=f"Tek istekte en fazla {CRISIS_BATCH_MAX_TEXTS} metin gönderilebilir.")
+    start = time.perf_counter()
+    results = await run_cpu(detect_crisis_batch, request.texts, request.threshold)
+    return {
+        "results": [
+            {"is_crisis": bool(is_crisis), "negative_score": round(float(score), 4), "keywords": list(keywords)}
+            for is_crisis, score, keywords in results
+        ],
+        "count": len(results),
+        "crisis_count": sum(1 for r in results if r[0]),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+# --- STREAMING (Server-Sent Events) ---
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Cevabı Gemini'den geldikçe 'token' olaylarıyla gönderir.
+    Son olarak 'done' olayında tam cevap, kaynaklar ve kriz bilgisi gelir.
+    """
+    require_ready()
+    finished = {}
+
+    async def event_stream():
+        offset, history = await load_history(request)
+        finished["history"] = (offset, history)
+
+        is_crisis, confidence, prepared = await check_crisis_and_prepare(request, history)
+        metrics.annotate(is_crisis=is_crisis, cached=bool(prepared and prepared[1] is not None))
+        if is_crisis:
+            print(f"🚨 KRİZ TESPİT EDİLDİ! Skor: {confidence:.4f}")
+            await persist_exchange(request, CRISIS_REPLY)
+            yield sse_event("token", {"text": CRISIS_REPLY})
+            yield sse_event("done", {"reply": CRISIS_REPLY, "sources": CRISIS_SOURCES, "is_crisis": True})
+            return
+
+        cache_vector, cached, context_block, sources = prepared
+        if cached is not None:
+            reply, sources, _ = cached
+            await persist_exchange(request, reply)
+            finished["reply"] = reply
+            yield sse_event("token", {"text": reply})
+            yield sse_event("done", {"reply": reply, "sources": sources, "is_crisis": False, "cached": True})
+            return
+
+        parts = []
+        try:
+            system_instruction, recent = await build_prompt(request, history, offset, context_block)
+            llm_start = time.perf_counter()
+            async for text in llm.stream(system_instruction, recent, request.query):
+                if not parts:
+                    metrics.record("llm_first_token", time.perf_counter() - llm_start)
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+            metrics.record("llm_call", time.perf_counter() - llm_start)
+            store_cached_reply(request, cache_vector, "".join(parts), sources)
+        except Exception as e:
+            error_text = f"Bağlantı hatası oluştu: {str(e)}"
+            parts.append(error_text)
+            yield sse_event("token", {"text": error_text})
+
+        reply = "".join(parts)
+        await persist_exchange(request, reply)
+        finished["reply"] = reply
+        yield sse_event("done", {"reply": reply, "sources": sources, "is_crisis": False})
+
+    async def after_stream():
+        if "reply" in finished:
+            offset, history = finished["history"]
+            await update_history_summary(request, history, offset, finished["reply"])
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(after_stream),
+    )
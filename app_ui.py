@@ -2,10 +2,16 @@ import streamlit as st
 import requests
 import database as db
 import time
+import json
 
 st.set_page_config(page_title="Psikoloji AI", page_icon="🧠", layout="wide")
 
 API_URL = "http://127.0.0.1:8000/chat"
+STREAM_URL = API_URL + "/stream"
+
+# Sayfalama: kenar çubuğunda ve sohbet ekranında bir seferde yüklenen kayıt sayısı
+SESSION_PAGE_SIZE = 20
+MESSAGE_PAGE_SIZE = 30
 
 if "user" not in st.session_state:
     st.session_state.user = None 
@@ -13,6 +19,12 @@ if "current_session_id" not in st.session_state:
     st.session_state.current_session_id = None
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "messages_cursor" not in st.session_state:
+    st.session_state.messages_cursor = None  # Daha eski mesajlar için imleç
+if "sessions" not in st.session_state:
+    st.session_state.sessions = None  # Kenar çubuğunda yüklenmiş oturumlar (None = henüz yüklenmedi)
+if "sessions_cursor" not in st.session_state:
+    st.session_state.sessions_cursor = None
 if "bg_image" not in st.session_state:
     st.session_state.bg_image = "linear-gradient(to right, #e0eafc, #cfdef3)"
 
@@ -71,6 +83,21 @@ st.markdown(f"""
 </style>
 """, unsafe_allow_html=True)
 
+def iter_sse(response):
+    # Sunucudan gelen 'event: ...' / 'data: ...' satırlarını (olay, veri) çiftlerine çevirir
+    event = "message"
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            event = "message"
+            continue
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[len("data:"):].strip())
+
+def ai_bubble(content):
+    return f"<div style='display:flex;justify-content:flex-start;'><div style='margin-right:12px; font-size:28px; padding-top:10px;'>🧠</div><div class='chat-ai'>{content}</div></div>"
+
 def login_page():
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
@@ -157,20 +184,37 @@ def chat_page():
         if st.button("➕ Yeni Sohbet Başlat", use_container_width=True):
             st.session_state.current_session_id = None
             st.session_state.messages = []
+            st.session_state.messages_cursor = None
             st.rerun()
 
-        sessions = db.get_user_sessions(user[0])
-        for sess in sessions:
+        # Oturumlar sayfa sayfa yüklenir ve session_state'te tutulur;
+        # her rerun'da veritabanına tekrar gidilmez.
+        if st.session_state.sessions is None:
+            st.session_state.sessions, st.session_state.sessions_cursor = db.get_user_sessions_page(user[0], SESSION_PAGE_SIZE)
+
+        for sess in st.session_state.sessions:
             b_type = "primary" if st.session_state.current_session_id == sess[0] else "secondary"
             sess_title = (sess[1][:22] + '..') if len(sess[1]) > 22 else sess[1]
             if st.button(f"📄 {sess_title}", key=sess[0], type=b_type, use_container_width=True):
                 st.session_state.current_session_id = sess[0]
-                st.session_state.messages = db.get_session_messages(sess[0])
+                st.session_state.messages, st.session_state.messages_cursor = db.get_latest_messages(sess[0], MESSAGE_PAGE_SIZE)
+                st.rerun()
+
+        if st.session_state.sessions_cursor is not None:
+            if st.button("⬇️ Daha eski sohbetler", use_container_width=True):
+                older, st.session_state.sessions_cursor = db.get_user_sessions_page(
+                    user[0], SESSION_PAGE_SIZE, st.session_state.sessions_cursor)
+                st.session_state.sessions = st.session_state.sessions + older
                 st.rerun()
         
         st.divider()
         if st.button("Çıkış Yap"):
             st.session_state.user = None
+            st.session_state.current_session_id = None
+            st.session_state.messages = []
+            st.session_state.messages_cursor = None
+            st.session_state.sessions = None
+            st.session_state.sessions_cursor = None
             st.rerun()
 
     st.markdown(f"""
@@ -179,6 +223,13 @@ def chat_page():
         <p style='color: #6b7280; font-size: 0.95rem;'>Bugün zihninden neler geçiyor?</p>
     </div>
     """, unsafe_allow_html=True)
+
+    if st.session_state.messages_cursor is not None:
+        if st.button("⬆️ Önceki mesajları yükle"):
+            older, st.session_state.messages_cursor = db.get_messages_before(
+                st.session_state.current_session_id, st.session_state.messages_cursor, MESSAGE_PAGE_SIZE)
+            st.session_state.messages = older + st.session_state.messages
+            st.rerun()
     
     for msg in st.session_state.messages:
         role = msg["role"]
@@ -186,50 +237,61 @@ def chat_page():
         if role == "user":
             st.markdown(f"<div style='display:flex;justify-content:flex-end;'><div class='chat-user'>{content}</div></div>", unsafe_allow_html=True)
         else:
-            st.markdown(f"<div style='display:flex;justify-content:flex-start;'><div style='margin-right:12px; font-size:28px; padding-top:10px;'>🧠</div><div class='chat-ai'>{content}</div></div>", unsafe_allow_html=True)
+            st.markdown(ai_bubble(content), unsafe_allow_html=True)
 
     if prompt := st.chat_input("Buraya yaz..."):
         if st.session_state.current_session_id is None:
             title = (prompt[:25] + '..') if len(prompt) > 25 else prompt
             sess_id = db.create_session(user[0], title)
             st.session_state.current_session_id = sess_id
+            st.session_state.messages_cursor = None
+            # Yeni oturum listenin başına gelsin diye ilk sayfayı yeniden yükle
+            st.session_state.sessions = None
         
+        # Mesajı API kaydeder (session_id ile); burada sadece ekrana ekliyoruz
         st.session_state.messages.append({"role": "user", "content": prompt})
-        db.save_message(st.session_state.current_session_id, "user", prompt)
         st.rerun()
 
     if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
-        with st.spinner("Düşünüyor..."):
-            try:
-                # Profil ve Geçmiş Hazırlığı
-                prof = {"name": user[2], "age": user[3], "gender": user[4]}
-                hist = [{"role": "user" if m["role"] == "user" else "model", "content": m["content"]} for m in st.session_state.messages[:-1]]
-                
-                payload = {
-                    "query": st.session_state.messages[-1]["content"],
-                    "history": hist,
-                    "user_profile": prof,
-                    "k": 3
-                }
-                
+        placeholder = st.empty()
+        placeholder.markdown(ai_bubble("Düşünüyor..."), unsafe_allow_html=True)
+        try:
+            # Profil Hazırlığı. Geçmiş gönderilmez: API oturumu session_id ile
+            # kendisi yükler, kullanıcı mesajını ve cevabı kendisi kaydeder.
+            prof = {"name": user[2], "age": user[3], "gender": user[4]}
             
-                response = requests.post(API_URL, json=payload)
+            payload = {
+                "query": st.session_state.messages[-1]["content"],
+                "user_profile": prof,
+                "k": 3,
+                "session_id": st.session_state.current_session_id
+            }
+
+            # Cevap parça parça gelir; her parçada balonu güncelliyoruz
+            with requests.post(STREAM_URL, json=payload, stream=True) as response:
                 if response.status_code == 200:
-                    data = response.json()
-                    reply = data["reply"]
-                    is_crisis = data.get("is_crisis", False)
+                    reply = ""
+                    is_crisis = False
+                    for event, data in iter_sse(response):
+                        if event == "token":
+                            reply += data["text"]
+                            placeholder.markdown(ai_bubble(reply + " ▌"), unsafe_allow_html=True)
+                        elif event == "done":
+                            reply = data["reply"]
+                            is_crisis = data.get("is_crisis", False)
 
                     if is_crisis:
-                        st.markdown(f"<div class='crisis-alert'>🚨 {reply}</div>", unsafe_allow_html=True)
+                        placeholder.markdown(f"<div class='crisis-alert'>🚨 {reply}</div>", unsafe_allow_html=True)
                     else:
-                        st.markdown(f"<div style='display:flex;justify-content:flex-start;'><div style='margin-right:12px; font-size:28px; padding-top:10px;'>🧠</div><div class='chat-ai'>{reply}</div></div>", unsafe_allow_html=True)
+                        placeholder.markdown(ai_bubble(reply), unsafe_allow_html=True)
                     
                     st.session_state.messages.append({"role": "model", "content": reply})
-                    db.save_message(st.session_state.current_session_id, "model", reply)
                 else:
+                    placeholder.empty()
                     st.error(f"Sunucu Hatası: {response.status_code}")
-            except Exception as e:
-                st.error(f"Bağlantı Hatası: {e}")
+        except Exception as e:
+            placeholder.empty()
+            st.error(f"Bağlantı Hatası: {e}")
 
 if st.session_state.user:
     chat_page()
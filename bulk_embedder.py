@@ -0,0 +1,175 @@
+# bulk_embedder.py
+#
+# 3_create_vector_store.py için toplu embedding. Metinler token sayısına göre
+# sıralanıp parçalara (shard) bölünür ve çok süreçli bir havuzda encode edilir. Biten her
+# parça float16 olarak diske yazılır; yarıda kesilen bir build tekrar
+# çalıştırıldığında hazır parçaları okur, sadece eksikleri hesaplar.
+
+import os
+import time
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_SHARD_SIZE = 512
+
+# --- WORKER ---
+# Her worker süreci modeli bir kez yükler (initializer) ve parçaları sırayla işler.
+_model = None
+
+
+def _init_worker(model_name, threads):
+    global _model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if threads:
+        # Süreçler çekirdekleri paylaşır; her biri kendi payı kadar thread kullanır
+        torch.set_num_threads(threads)
+    _model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode_shard(texts, batch_size):
+    start = time.perf_counter()
+    vectors = _model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+    return os.getpid(), vectors.astype("float16"), time.perf_counter() - start
+
+
+# --- ANA SÜREÇ ---
+def shard_key(model_name, texts):
+    h = hashlib.sha256(model_name.encode("utf-8"))
+    for text in texts:
+        h.update(b"\0")
+        h.update(text.encode("utf-8"))
+    return h.hexdigest()[:24]
+
+
+class BulkEmbedder:
+    """
+    encode(texts) girdi sırasıyla float32 matris döndürür.
+    workers=1 ise model ana süreçte yüklenir (havuz açılmaz).
+    """
+
+    def __init__(self, model_name, shard_dir, workers=1, batch_size=DEFAULT_BATCH_SIZE,
+                 shard_size=DEFAULT_SHARD_SIZE):
+        self.model_name = model_name
+        self.shard_dir = shard_dir
+        self.workers = max(1, int(workers))
+        self.batch_size = batch_size
+        self.shard_size = max(1, int(shard_size))
+        self.worker_stats = {}  # pid -> {"chunks", "seconds"}
+        self.resumed_shards = 0
+
+    def _shard_path(self, key):
+        return os.path.join(self.shard_dir, f"shard_{key}.npy")
+
+    def _save_shard(self, key, vectors):
+        path = self._shard_path(key)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, vectors)
+        os.replace(path + ".tmp", path)
+
+    def _plan(self, texts, lengths=None):
+        # Uzun metinler önce: benzer uzunluktakiler aynı batch'e düşer (daha az padding)
+        # ve en pahalı parçalar önce dağıtılır. Padding token üzerinden olduğu için
+        # token sayıları verildiyse onlar kullanılır; yoksa karakter uzunluğu.
+        if lengths is None:
+            lengths = [len(text) for text in texts]
+        order = sorted(range(len(texts)), key=lambda i: lengths[i], reverse=True)
+        shards = []
+        for start in range(0, len(order), self.shard_size):
+            positions = order[start:start + self.shard_size]
+            shard_texts = [texts[i] for i in positions]
+            shards.append((shard_key(self.model_name, shard_texts), positions, shard_texts))
+        return shards
+
+    def _record(self, pid, n, seconds):
+        s = self.worker_stats.setdefault(pid, {"chunks": 0, "seconds": 0.0})
+        s["chunks"] += n
+        s["seconds"] += seconds
+
+    def encode(self, texts, lengths=None):
+        """lengths: metinlerin token sayıları (ör. token_chunker.count_tokens), sıralama için."""
+        os.makedirs(self.shard_dir, exist_ok=True)
+        shards = self._plan(texts, lengths)
+        result = None
+        pending = []
+        for key, positions, shard_texts in shards:
+            path = self._shard_path(key)
+            if os.path.exists(path):
+                vectors = np.load(path)
+                result = self._place(result, len(texts), positions, vectors)
+                self.resumed_shards += 1
+            else:
+                pending.append((key, positions, shard_texts))
+
+        if self.resumed_shards:
+            print(f"♻️ {self.resumed_shards} parça önceki çalıştırmadan yüklendi, {len(pending)} parça kaldı.")
+
+        if pending:
+            done = 0
+            total = sum(len(p) for _, p, _ in pending)
+            for key, positions, pid, vectors, seconds in self._run(pending):
+                self._save_shard(key, vectors)
+                self._record(pid, len(positions), seconds)
+                result = self._place(result, len(texts), positions, vectors)
+                done += len(positions)
+                print(f"   {done}/{total} chunk embed edildi", end="\r")
+            print()
+        return result.astype("float32") if result is not None else np.zeros((0, 0), dtype="float32")
+
+    def _run(self, pending):
+        if self.workers == 1:
+            if _model is None:
+                _init_worker(self.model_name, None)
+            for key, positions, shard_texts in pending:
+                pid, vectors, seconds = _encode_shard(shard_texts, self.batch_size)
+                yield key, positions, pid, vectors, seconds
+            return
+
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        # fork yerine spawn: ana süreçteki tokenizer / torch thread havuzu kopyalanınca
+        # worker'lar kilitlenebilir; her worker temiz bir yorumlayıcıyla başlar.
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                       initargs=(self.model_name, threads),
+                                       mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futures = {executor.submit(_encode_shard, shard_texts, self.batch_size): (key, positions)
+                       for key, positions, shard_texts in pending}
+            for future in as_completed(futures):
+                key, positions = futures[future]
+                pid, vectors, seconds = future.result()
+                yield key, positions, pid, vectors, seconds
+        finally:
+            # Ctrl-C ya da hata: bekleyen parçaları iptal et; bitenler diskte kalır
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _place(result, n, positions, vectors):
+        if result is None:
+            result = np.zeros((n, vectors.shape[1]), dtype="float16")
+        result[positions] = vectors
+        return result
+
+    def report(self):
+        """Worker başına chunk/saniye satırları."""
+        lines = []
+        for i, (pid, s) in enumerate(sorted(self.worker_stats.items()), start=1):
+            rate = s["chunks"] / s["seconds"] if s["seconds"] else 0.0
+            lines.append(f"worker {i} (pid {pid}): {s['chunks']} chunk, {s['seconds']:.1f} sn, {rate:.1f} chunk/sn")
+        return lines
+
+    def clear(self):
+        """Build başarıyla kaydedildikten sonra parça dosyalarını siler."""
+        if not os.path.isdir(self.shard_dir):
+            return
+        for filename in os.listdir(self.shard_dir):
+            if filename.startswith("shard_"):
+                os.remove(os.path.join(self.shard_dir, filename))
+        try:
+            os.rmdir(self.shard_dir)
+        except OSError:
+            pass
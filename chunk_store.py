@@ -0,0 +1,187 @@
+# chunk_store.py
+#
+# Chunk metinlerini tek bir "metin arenası" (chunks.bin) ve sabit boyutlu bir
+# ofset/metadata tablosunda (chunks.idx) tutar. İki dosya da mmap ile açılır;
+# FAISS id'si doğrudan tablodaki satır numarasıdır, yani arama sonucu başına
+# ne dosya açılır ne de JSON parse edilir.
+
+import os
+import json
+import mmap
+import struct
+
+# --- AYARLAR ---
+ARENA_FILE = "chunks.bin"
+TABLE_FILE = "chunks.idx"
+META_FILE = "chunks_meta.json"
+FORMAT_VERSION = 1
+
+# Her satır: arena ofseti (uint64), chunk_id byte uzunluğu (uint32),
+# metin byte uzunluğu (uint32), kaynak kitap index'i (uint32),
+# kitap içindeki sıra numarası (uint32).
+# Arenada her chunk için önce chunk_id, hemen ardından metin durur.
+RECORD = struct.Struct("<QIIII")
+
+# Silinmiş chunk'ların (artımlı build'de boşalan FAISS id'leri) kaynak index'i
+DELETED = 0xFFFFFFFF
+
+
+# --- 1. CHUNK DOSYALARINI OKUMA ---
+def iter_chunk_files(chunks_dir):
+    """
+    data/chunks altındaki tüm kitap dosyalarını (.json ya da .jsonl, sıralı) okur ve her chunk'ı
+    {"text", "source", "chunk_id", "seq"} sözlüğü olarak döndürür.
+    "seq", chunk'ın kitaptaki orijinal sırasıdır (chunk_id'nin sonundaki sayı).
+    """
+    for filename in sorted(os.listdir(chunks_dir)):
+        if not filename.endswith((".json", ".jsonl")):
+            continue
+        stem = os.path.splitext(filename)[0]
+        for position, item in enumerate(_read_items(os.path.join(chunks_dir, filename))):
+            # Elle düzeltilmiş bazı chunk'larda metin 'corrected_text' alanında
+            text = item.get("text") or item.get("corrected_text")
+            if not text:
+                continue
+            chunk_id = item.get("chunk_id", f"{stem}_{position}")
+            yield {
+                "text": text,
+                "source": item.get("source", filename),
+                "chunk_id": chunk_id,
+                "seq": _parse_seq(chunk_id, position),
+            }
+
+
+def _read_items(path):
+    # .jsonl (notebooks/process_pdfs.py çıktısı) satır satır akıtılır; eski .json dosyaları tek liste
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+
+def _parse_seq(chunk_id, default):
+    suffix = chunk_id.rsplit("_", 1)[-1]
+    return int(suffix) if suffix.isdigit() else default
+
+
+def _replace_atomic(tmp_path, final_path):
+    with open(tmp_path, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, final_path)
+
+
+# --- 2. YAZMA ---
+def write_chunk_store(chunks, store_dir):
+    """
+    Chunk listesini arena + tablo formatında diske yazar.
+    Listedeki sıra = FAISS id'si; None olan elemanlar boş (silinmiş) id'lerdir.
+    Yazma işlemi geçici dosyalar üzerinden yapılır, böylece yarım kalan bir
+    build mevcut store'u bozmaz.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    sources = []
+    source_ids = {}
+
+    arena_tmp = os.path.join(store_dir, ARENA_FILE + ".tmp")
+    table_tmp = os.path.join(store_dir, TABLE_FILE + ".tmp")
+    meta_tmp = os.path.join(store_dir, META_FILE + ".tmp")
+
+    offset = 0
+    count = 0
+    live = 0
+    with open(arena_tmp, 'wb') as arena, open(table_tmp, 'wb') as table:
+        for chunk in chunks:
+            count += 1
+            if chunk is None:
+                table.write(RECORD.pack(offset, 0, 0, DELETED, 0))
+                continue
+            cid = chunk["chunk_id"].encode('utf-8')
+            data = chunk["text"].encode('utf-8')
+            source = chunk["source"]
+            if source not in source_ids:
+                source_ids[source] = len(sources)
+                sources.append(source)
+            arena.write(cid)
+            arena.write(data)
+            table.write(RECORD.pack(offset, len(cid), len(data), source_ids[source], chunk["seq"]))
+            offset += len(cid) + len(data)
+            live += 1
+
+    meta = {"version": FORMAT_VERSION, "count": count, "live": live, "sources": sources}
+    with open(meta_tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    _replace_atomic(arena_tmp, os.path.join(store_dir, ARENA_FILE))
+    _replace_atomic(table_tmp, os.path.join(store_dir, TABLE_FILE))
+    _replace_atomic(meta_tmp, os.path.join(store_dir, META_FILE))
+    return count
+
+
+# --- 3. OKUMA ---
+class ChunkStore:
+    """Diskteki chunk store'u mmap ile açar; id ile O(1) erişim sağlar."""
+
+    def __init__(self, store_dir):
+        with open(os.path.join(store_dir, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Desteklenmeyen chunk store sürümü: {meta.get('version')}")
+
+        self.sources = meta["sources"]
+        self._count = meta["count"]
+        self.live = meta.get("live", self._count)
+
+        self._files = []
+        self._arena = self._map(os.path.join(store_dir, ARENA_FILE))
+        self._table = self._map(os.path.join(store_dir, TABLE_FILE))
+
+        if len(self._table) < self._count * RECORD.size:
+            raise ValueError("Chunk tablosu meta dosyasıyla uyuşmuyor.")
+
+    def _map(self, path):
+        f = open(path, 'rb')
+        self._files.append(f)
+        # Boş dosya mmap'lenemez
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, idx):
+        if idx < 0 or idx >= self._count:
+            raise IndexError(idx)
+        record = RECORD.unpack_from(self._table, idx * RECORD.size)
+        if record[3] == DELETED:
+            raise IndexError(idx)
+        return record
+
+    def text(self, idx):
+        offset, id_len, text_len, _, _ = self._record(int(idx))
+        start = offset + id_len
+        return self._arena[start:start + text_len].decode('utf-8')
+
+    def get(self, idx):
+        """FAISS id'sine karşılık gelen chunk'ı döndürür."""
+        idx = int(idx)
+        offset, id_len, text_len, source_idx, seq = self._record(idx)
+        start = offset + id_len
+        return {
+            "id": idx,
+            "text": self._arena[start:start + text_len].decode('utf-8'),
+            "source": self.sources[source_idx],
+            "chunk_id": self._arena[offset:start].decode('utf-8'),
+            "seq": seq,
+        }
+
+    def close(self):
+        for m in (self._arena, self._table):
+            if isinstance(m, mmap.mmap):
+                m.close()
+        for f in self._files:
+            f.close()
+        self._files = []
@@ -0,0 +1,133 @@
+# context_builder.py
+#
+# Arama ile prompt arasında context derleme. Chunk'lar kitapta birbirleriyle
+# örtüşür (process_pdfs.py, CHUNK_OVERLAP_IN_WORDS); arama çoğu zaman aynı
+# kitabın komşu chunk'larını döndürür ve bunlar olduğu gibi yapıştırılınca aynı
+# metin prompt'ta iki kez ödenir. Aday listesi (alaka sırasıyla) şu adımlardan geçer:
+# 1. Mesafe eşiği: en iyi dense sonuca göre çok uzak ya da mutlak eşiği aşan
+#    sonuçlar atılır (sadece BM25'ten gelen adayların mesafesi yoktur, kalırlar).
+# 2. MMR: alaka ile seçilmiş olanlara benzerlik dengelenerek k chunk seçilir;
+#    benzerlik, chunk'ların BM25 terim kümelerinin Jaccard örtüşmesidir.
+# 3. Komşu birleştirme: aynı kaynakta ardışık chunk'lar tek blok olur, örtüşen
+#    kelimeler bir kez yazılır.
+# 4. Bütçe: blok metinleri alaka sırasıyla eklenir; context token bütçesini aşmaz.
+
+from history_compactor import CHARS_PER_TOKEN, estimate_tokens
+from turkish_text import lexical_terms
+
+DEFAULT_MMR_LAMBDA = 0.7       # 1.0 = sadece alaka, 0.0 = sadece çeşitlilik
+DEFAULT_DISTANCE_RATIO = 1.5   # en iyi L2 mesafesinin en fazla bu katı
+DEFAULT_TOKEN_BUDGET = 1500
+MAX_OVERLAP_WORDS = 200        # komşu chunk'larda aranan en uzun örtüşme
+MIN_TRUNCATED_TOKENS = 40      # bütçeye sığmayan blok bundan kısaysa kırpılmaz, atılır
+
+
+def apply_distance_cutoff(chunks, distances, max_distance=0.0, ratio=DEFAULT_DISTANCE_RATIO):
+    """distances: {id: L2 mesafe} (sadece dense sonuçlar). max_distance / ratio 0 ise kapalı."""
+    if not distances:
+        return list(chunks)
+    limit = float("inf")
+    best = min(distances.values())
+    if ratio and best > 0:
+        limit = best * ratio
+    if max_distance:
+        limit = min(limit, max_distance)
+    return [c for c in chunks if distances.get(c["id"], 0.0) <= limit]
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def mmr_select(chunks, k, lambda_=DEFAULT_MMR_LAMBDA):
+    """Alaka sırasıyla gelen chunk'lardan MMR ile k tanesini seçer (seçim sırasıyla)."""
+    n = len(chunks)
+    if n <= 1 or k <= 0:
+        return list(chunks[:max(k, 0)])
+    relevance = [1.0 - i / n for i in range(n)]
+    terms = [frozenset(lexical_terms(c["text"])) for c in chunks]
+    # Her aday için seçilmişlere en yüksek benzerlik (seçim ilerledikçe güncellenir)
+    redundancy = [0.0] * n
+    remaining = list(range(n))
+    selected = []
+    while remaining and len(selected) < k:
+        best = max(remaining, key=lambda i: lambda_ * relevance[i] - (1.0 - lambda_) * redundancy[i])
+        remaining.remove(best)
+        selected.append(best)
+        for i in remaining:
+            redundancy[i] = max(redundancy[i], _jaccard(terms[i], terms[best]))
+    return [chunks[i] for i in selected]
+
+
+def merge_overlap(first, second, max_overlap=MAX_OVERLAP_WORDS):
+    """İki ardışık metni birleştirir; first'ün sonu second'ın başıyla örtüşüyorsa bir kez yazar."""
+    a, b = first.split(), second.split()
+    for n in range(min(len(a), len(b), max_overlap), 0, -1):
+        if a[-n:] == b[:n]:
+            return " ".join(a + b[n:]), n
+    return " ".join(a + b), 0
+
+
+def merge_adjacent(chunks):
+    """
+    Seçilen chunk'lardan bloklar: [{"text", "source", "ids", "rank"}]. Aynı kaynakta
+    ardışık sıra numaralı chunk'lar birleşir. Bloklar en alakalı üyelerine göre sıralanır.
+    """
+    ranked = sorted(enumerate(chunks), key=lambda item: (item[1]["source"], item[1]["seq"]))
+    blocks = []
+    previous = None
+    for rank, chunk in ranked:
+        if previous is not None and chunk["source"] == previous["source"] and chunk["seq"] == previous["seq"] + 1:
+            block = blocks[-1]
+            block["text"], overlap = merge_overlap(block["text"], chunk["text"])
+            block["ids"].append(chunk["id"])
+            block["rank"] = min(block["rank"], rank)
+            block["overlap_words"] += overlap
+        else:
+            blocks.append({"text": chunk["text"], "source": chunk["source"], "ids": [chunk["id"]],
+                           "rank": rank, "overlap_words": 0})
+        previous = chunk
+    return sorted(blocks, key=lambda block: block["rank"])
+
+
+def fit_budget(blocks, budget_tokens=DEFAULT_TOKEN_BUDGET):
+    """Blokları sırayla bütçeye yerleştirir; sığmayan ilk blok kelime sınırından kırpılır."""
+    if not budget_tokens:
+        return list(blocks)
+    fitted = []
+    used = 0
+    for block in blocks:
+        tokens = estimate_tokens(block["text"])
+        if used + tokens <= budget_tokens:
+            fitted.append(block)
+            used += tokens
+            continue
+        remaining = budget_tokens - used
+        if remaining >= MIN_TRUNCATED_TOKENS:
+            text = block["text"][:remaining * CHARS_PER_TOKEN - 2].rsplit(" ", 1)[0]
+            fitted.append(dict(block, text=text + " …", truncated=True))
+        break
+    return fitted
+
+
+def assemble_context(chunks, distances, k, mmr_lambda=DEFAULT_MMR_LAMBDA, max_distance=0.0,
+                     distance_ratio=DEFAULT_DISTANCE_RATIO, budget_tokens=DEFAULT_TOKEN_BUDGET):
+    """
+    chunks: alaka sırasıyla aday chunk'lar (ChunkStore.get çıktısı), distances: {id: L2 mesafe}.
+    (bloklar, istatistik) döndürür; istatistikte düz top-k'ya göre token karşılaştırması vardır.
+    """
+    kept = apply_distance_cutoff(chunks, distances, max_distance, distance_ratio)
+    selected = mmr_select(kept, k, mmr_lambda)
+    blocks = fit_budget(merge_adjacent(selected), budget_tokens)
+    stats = {
+        "candidates": len(chunks),
+        "after_cutoff": len(kept),
+        "selected": len(selected),
+        "blocks": len(blocks),
+        "overlap_words_removed": sum(block["overlap_words"] for block in blocks),
+        "naive_tokens": sum(estimate_tokens(c["text"]) for c in chunks[:k]),
+        "context_tokens": sum(estimate_tokens(block["text"]) for block in blocks),
+    }
+    return blocks, stats
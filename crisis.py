@@ -0,0 +1,318 @@
+# crisis.py
+#
+# Kriz tespiti iki aşamalıdır:
+# 1. Sözlük filtresi: data/crisis_lexicon.json'daki tüm terimler tek bir derlenmiş
+#    regex'te birleştirilir; metin tek geçişte taranır, Türkçe ekler ('*') yakalanır.
+# 2. Sınıflandırıcı: sadece filtre tetiklenirse BERT duygu modeli çalışır.
+#    Model fp32 (PyTorch), int8 (dinamik kuantizasyon) ya da ONNX Runtime ile
+#    çalıştırılabilir; hızlı çalışma zamanları fp32 skorlarıyla bir kez (ilk
+#    açılışta) doğrulanır, sonuç data/models altına yazılır ve sonraki açılışlarda
+#    fp32 referans modeli yüklenmez.
+
+import os
+import re
+import json
+
+import model_store
+from turkish_text import tr_lower
+
+# --- AYARLAR ---
+LEXICON_PATH = "data/crisis_lexicon.json"
+# Etiketli değerlendirme verisi: text,label (1 = kriz, 0 = normal)
+EVAL_DATASET_PATH = "data/crisis_eval.csv"
+# Depodaki veri seti (~110 cümle) duman testi içindir. Bundan küçük setlerle ölçülen
+# doğruluk, eşik ve throughput sayıları temsili değildir (5_ ve 6_ betikleri uyarır).
+REPRESENTATIVE_DATASET_SIZE = 1000
+RUNTIMES = ("fp32", "int8", "onnx")
+
+# Toplu sınıflandırmada tek forward pass'teki cümle sayısı
+DEFAULT_BATCH_SIZE = 64
+
+# Hızlı çalışma zamanı ile fp32 arasındaki izin verilen en büyük skor farkı
+PARITY_TOLERANCE = 0.05
+
+# Doğrulama için kullanılan örnek cümleler (kriz ve normal karışık)
+CALIBRATION_SENTENCES = [
+    "Artık yaşamak istemiyorum, her şey boş.",
+    "Bu acıya dayanamıyorum, bıçakla bileklerimi keseceğim.",
+    "Bıktım artık, veda etme zamanı geldi.",
+    "Kimse beni sevmiyor, ölsem herkes rahatlar.",
+    "Sınavdan düşük aldım, moralim çok bozuk.",
+    "Hayat bazen çok zorluyor ama mücadele ediyorum.",
+    "Bugün kendimi biraz yorgun ve mutsuz hissediyorum.",
+    "Merhaba, nasılsın?",
+]
+
+
+# --- 1. SÖZLÜK FİLTRESİ ---
+def _term_pattern(term):
+    # "bilekler* kes*" -> r"bilekler\w*\s+kes\w*"
+    words = []
+    for word in term.split():
+        if word.endswith("*"):
+            words.append(re.escape(word[:-1]) + r"\w*")
+        else:
+            words.append(re.escape(word))
+    return r"\s+".join(words)
+
+
+def _alternation(terms):
+    # Uzun terimler önce denensin
+    return "|".join(_term_pattern(t) for t in sorted(set(terms), key=len, reverse=True))
+
+
+class CrisisLexicon:
+    """Sözlükteki tüm terimleri tek bir regex ile, tek geçişte arar."""
+
+    def __init__(self, strong_terms, risk_terms):
+        self.strong_terms = [tr_lower(t) for t in strong_terms]
+        self.risk_terms = [tr_lower(t) for t in risk_terms]
+        pattern = r"(?<!\w)(?:(?P<strong>{})|(?P<risk>{}))(?!\w)".format(
+            _alternation(self.strong_terms), _alternation(self.risk_terms)
+        )
+        self._regex = re.compile(pattern)
+
+    @classmethod
+    def load(cls, path=LEXICON_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data.get("strong", []), data.get("risk", []))
+
+    def scan(self, text):
+        """(riskli kelime var mı, güçlü kriz ifadesi var mı, eşleşen ifadeler)"""
+        strong = False
+        matches = []
+        for m in self._regex.finditer(tr_lower(text)):
+            matches.append(m.group(0))
+            if m.group("strong"):
+                strong = True
+        return bool(matches), strong, matches
+
+
+# --- 2. SINIFLANDIRICI ---
+class CrisisClassifier:
+    """
+    Duygu modelinin negatiflik skorunu hesaplar.
+    runtime: 'fp32' (varsayılan), 'int8' (torch dinamik kuantizasyon) ya da 'onnx'.
+    """
+
+    def __init__(self, model_id, runtime="fp32", onnx_path=None, max_length=128, local_files_only=False):
+        import torch
+        from transformers import AutoTokenizer
+
+        if runtime not in RUNTIMES:
+            raise ValueError(f"Bilinmeyen çalışma zamanı: {runtime} (seçenekler: {', '.join(RUNTIMES)})")
+
+        self.model_id = model_id
+        self.runtime = runtime
+        self.max_length = max_length
+        # data/models altında safetensors kopyası varsa oradan yüklenir (bkz. model_store.py)
+        source = model_store.resolve(model_id)
+        self.tokenizer = AutoTokenizer.from_pretrained(source, local_files_only=local_files_only)
+        self._torch = torch
+        self._session = None
+        # Karşılaştırma sonucunun bağlı olduğu dosya (ONNX grafı)
+        self.artifact = None
+
+        if runtime == "onnx":
+            path = onnx_path or self._default_onnx_path()
+            if not os.path.exists(path):
+                # PyTorch modeli sadece ONNX'e aktarım için bir kez yüklenir
+                self._export_onnx(self._load_model(source, local_files_only), path)
+            self._session = self._open_session(path)
+            self.artifact = path
+            self.model = None
+            return
+
+        model = self._load_model(source, local_files_only)
+        if runtime == "int8":
+            # Linear katmanlar int8'e çevrilir; ağırlıklar ~4 kat küçülür, CPU'da hızlanır
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+
+    @staticmethod
+    def _load_model(source, local_files_only):
+        from transformers import AutoModelForSequenceClassification
+
+        return AutoModelForSequenceClassification.from_pretrained(
+            source, local_files_only=local_files_only).to("cpu").eval()
+
+    def _default_onnx_path(self):
+        return os.path.join("data", "models", self.model_id.replace("/", "__") + ".onnx")
+
+    def _export_onnx(self, model, path):
+        print(f"📦 Kriz modeli ONNX'e aktarılıyor: {path}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        dummy = self.tokenizer(["örnek cümle"], return_tensors="pt")
+        self._torch.onnx.export(
+            model,
+            (dummy["input_ids"], dummy["attention_mask"]),
+            path + ".tmp",
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=17,
+            dynamo=False,  # TorchScript dışa aktarıcı (dynamo onnxscript ister)
+        )
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def _open_session(path):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def _batch_scores(self, features):
+        if self._session is not None:
+            import numpy as np
+            inputs = self.tokenizer.pad(features, return_tensors="np")
+            logits = self._session.run(["logits"], {
+                "input_ids": inputs["input_ids"].astype("int64"),
+                "attention_mask": inputs["attention_mask"].astype("int64"),
+            })[0]
+            exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+            return (exp[:, 0] / exp.sum(axis=1)).tolist()
+
+        torch = self._torch
+        inputs = self.tokenizer.pad(features, return_tensors="pt")
+        with torch.no_grad():
+            logits = self.model(**inputs).logits
+        # savasy modelinde Index 0 -> Negatif
+        return torch.softmax(logits, dim=1)[:, 0].tolist()
+
+    def negative_scores(self, texts, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Her metin için negatif sınıf olasılığını (index 0) döndürür. Liste bir kez
+        (padding'siz) tokenize edilir, token sayısına göre sıralanıp batch'lere
+        bölünür; her batch sadece kendi en uzun cümlesine kadar doldurulur.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+        order = sorted(range(len(texts)), key=lengths.__getitem__)
+
+        scores = [0.0] * len(texts)
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            features = [{key: encoded[key][i] for key in encoded.keys()} for i in batch]
+            for i, score in zip(batch, self._batch_scores(features)):
+                scores[i] = score
+        return scores
+
+
+def verify_parity(candidate, reference, sentences=CALIBRATION_SENTENCES):
+    """Hızlı çalışma zamanının skorlarını fp32 modelle karşılaştırır; en büyük farkı döndürür."""
+    fast = candidate.negative_scores(sentences)
+    exact = reference.negative_scores(sentences)
+    return max(abs(a - b) for a, b in zip(fast, exact))
+
+
+def check_parity(model_id, runtime, local_files_only=False):
+    """
+    Hızlı çalışma zamanını fp32 ile bir kez karşılaştırır ve sonucu modelin
+    yanına yazar (model_store.save_parity). (sonuç, aday, referans) döndürür.
+    """
+    reference = CrisisClassifier(model_id, "fp32", local_files_only=local_files_only)
+    candidate = CrisisClassifier(model_id, runtime, local_files_only=local_files_only)
+    verdict = {"max_diff": verify_parity(candidate, reference), "tolerance": PARITY_TOLERANCE}
+    verdict = model_store.save_parity(model_id, runtime, verdict, artifact=candidate.artifact)
+    return verdict, candidate, reference
+
+
+def load_classifier(model_id, runtime="fp32", tolerance=PARITY_TOLERANCE, local_files_only=False):
+    """
+    İstenen çalışma zamanıyla sınıflandırıcıyı yükler. fp32 dışındaki çalışma
+    zamanları için kayıtlı karşılaştırma sonucu kullanılır; sonuç yoksa (ilk
+    açılış) bir kez hesaplanır. Fark toleransı aşarsa fp32'ye dönülür.
+    """
+    if runtime == "fp32":
+        return CrisisClassifier(model_id, "fp32", local_files_only=local_files_only)
+
+    candidate = reference = None
+    try:
+        verdict = model_store.load_parity(model_id, runtime)
+        if verdict is None:
+            print(f"🔬 '{runtime}' kriz modeli fp32 ile karşılaştırılıyor (bir kez)...")
+            verdict, candidate, reference = check_parity(model_id, runtime, local_files_only)
+        diff = verdict["max_diff"]
+        if diff <= tolerance and candidate is None:
+            candidate = CrisisClassifier(model_id, runtime, local_files_only=local_files_only)
+    except Exception as e:
+        print(f"⚠️ '{runtime}' kriz modeli yüklenemedi ({e}); fp32 kullanılacak.")
+        return reference or CrisisClassifier(model_id, "fp32", local_files_only=local_files_only)
+
+    if diff > tolerance:
+        print(f"⚠️ '{runtime}' kriz modeli fp32'den fazla sapıyor (max fark {diff:.4f}); fp32 kullanılacak.")
+        return reference or CrisisClassifier(model_id, "fp32", local_files_only=local_files_only)
+    print(f"✅ '{runtime}' kriz modeli doğrulandı (fp32 ile max fark {diff:.4f}).")
+    return candidate
+
+
+# --- 3. KARAR ---
+class CrisisDetector:
+    def __init__(self, lexicon, classifier=None, threshold=0.70):
+        self.lexicon = lexicon
+        self.classifier = classifier
+        self.threshold = threshold
+
+    def decide(self, strong_hit, negative_score, threshold=None):
+        # KURAL: Hem kelime geçecek HEM DE model %70 üstü negatif diyecek.
+        # Veya ifade çok net ("intihar" gibi) ise skora bakmadan uyar.
+        return strong_hit or negative_score > (self.threshold if threshold is None else threshold)
+
+    def detect(self, text):
+        """(kriz mi, negatiflik skoru) döndürür."""
+        # 1. ADIM: HIZLI FİLTRE
+        # Eğer riskli kelime HİÇ yoksa, modeli boşuna çalıştırma ve alarm verme.
+        scan = self.lexicon.scan(text)
+        if not scan[0]:
+            return False, 0.0
+        is_crisis, negative_score = self.classify(text, scan)
+        print(f"🔍 Kriz Analizi: '{text}' | Kelime: {', '.join(scan[2])} | Negatiflik: {negative_score:.4f}")
+        return is_crisis, negative_score
+
+    def classify(self, text, scan):
+        """Sözlükte eşleşme bulunan metin için karar: (kriz mi, negatiflik skoru)."""
+        _, strong_hit, _ = scan
+
+        # 2. ADIM: DERİN ANALİZ (Model)
+        negative_score = 0.0
+        if self.classifier is not None:
+            negative_score = self.classifier.negative_scores([text])[0]
+        return self.decide(strong_hit, negative_score), negative_score
+
+    def scan_batch(self, texts):
+        """Her metin için sözlük taraması: [(riskli kelime var mı, güçlü ifade var mı, eşleşmeler)]."""
+        return [self.lexicon.scan(text) for text in texts]
+
+    def score_batch(self, texts, scans, batch_size=DEFAULT_BATCH_SIZE):
+        """Sadece sözlükte eşleşme bulunan metinler modele (toplu) gider; diğerlerinin skoru 0."""
+        scores = [0.0] * len(texts)
+        flagged = [i for i, scan in enumerate(scans) if scan[0]]
+        if self.classifier is not None and flagged:
+            flagged_scores = self.classifier.negative_scores([texts[i] for i in flagged], batch_size)
+            for i, score in zip(flagged, flagged_scores):
+                scores[i] = score
+        return scores
+
+    def detect_batch(self, texts, batch_size=DEFAULT_BATCH_SIZE, threshold=None):
+        """detect'in toplu hali: [(kriz mi, negatiflik skoru)]."""
+        scans = self.scan_batch(texts)
+        scores = self.score_batch(texts, scans, batch_size)
+        return [(self.decide(scan[1], score, threshold), score) for scan, score in zip(scans, scores)]
+
+
+def load_labelled_dataset(path=EVAL_DATASET_PATH):
+    """Etiketli değerlendirme verisi: [(metin, etiket)] (1 = kriz, 0 = normal)."""
+    import csv
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return [(row["text"], int(row["label"])) for row in csv.DictReader(f) if row["text"].strip()]
@@ -1,121 +1,241 @@
+import os
 import sqlite3
 import hashlib
+import threading
 from datetime import datetime
 
-DB_NAME = "psychbot.db"
+# PSYCHBOT_DB ile başka bir dosya kullanılabilir (ör. testler depodaki veritabanına dokunmasın)
+DB_NAME = os.getenv("PSYCHBOT_DB", "psychbot.db")
+
+# --- 0. BAĞLANTI YÖNETİMİ ---
+# Her thread kendi bağlantısını bir kez açar ve tekrar kullanır (Streamlit ve
+# FastAPI istekleri farklı thread'lerde çalışır; sqlite3 bağlantısı thread'ler
+# arasında paylaşılmamalı). sqlite3 modülü aynı SQL metni için hazırlanmış
+# (prepared) ifadeyi bağlantı başına önbellekte tutar; bu yüzden sorgular
+# aşağıda sabit metinler olarak tanımlı.
+_local = threading.local()
+STATEMENT_CACHE_SIZE = 128
+
+def _configure(conn):
+    # WAL: okuyucular yazanı beklemez; NORMAL: her commit'te fsync yapılmaz (WAL ile güvenli)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+def get_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "db_name", None) != DB_NAME:
+        conn = sqlite3.connect(DB_NAME, cached_statements=STATEMENT_CACHE_SIZE)
+        _configure(conn)
+        _local.conn = conn
+        _local.db_name = DB_NAME
+    return conn
+
+def close_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+# --- SORGULAR ---
+SQL_INSERT_USER = "INSERT INTO users (username, password_hash, display_name, age, gender, avatar) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_LOGIN = "SELECT id, username, display_name, age, gender, avatar FROM users WHERE username=? AND password_hash=?"
+SQL_UPDATE_PROFILE = "UPDATE users SET display_name=?, age=?, gender=?, avatar=? WHERE id=?"
+SQL_GET_USER = "SELECT id, username, display_name, age, gender, avatar FROM users WHERE id=?"
+SQL_INSERT_SESSION = "INSERT INTO sessions (user_id, title, created_at) VALUES (?, ?, ?)"
+SQL_USER_SESSIONS = "SELECT id, title FROM sessions WHERE user_id=? ORDER BY created_at DESC"
+SQL_INSERT_MESSAGE = "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)"
+SQL_SESSION_MESSAGES = "SELECT role, content FROM messages WHERE session_id=? ORDER BY created_at ASC, id ASC"
+SQL_GET_SUMMARY = "SELECT summary, covered_count FROM session_summaries WHERE session_id=?"
+SQL_SAVE_SUMMARY = ("INSERT INTO session_summaries (session_id, summary, covered_count, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET summary=excluded.summary, "
+                    "covered_count=excluded.covered_count, updated_at=excluded.updated_at")
+
+# Keyset (imleç) sayfalama: (created_at, id) çifti üzerinden. OFFSET kullanılmadığı için
+# her sayfa, geçmiş ne kadar uzun olursa olsun index'ten sabit maliyetle okunur.
+SQL_SESSIONS_FIRST_PAGE = ("SELECT id, title, created_at FROM sessions WHERE user_id=? "
+                           "ORDER BY created_at DESC, id DESC LIMIT ?")
+SQL_SESSIONS_PAGE = ("SELECT id, title, created_at FROM sessions WHERE user_id=? AND (created_at, id) < (?, ?) "
+                     "ORDER BY created_at DESC, id DESC LIMIT ?")
+SQL_LATEST_MESSAGES = ("SELECT id, role, content, created_at FROM messages WHERE session_id=? "
+                       "ORDER BY created_at DESC, id DESC LIMIT ?")
+SQL_MESSAGES_BEFORE = ("SELECT id, role, content, created_at FROM messages WHERE session_id=? AND (created_at, id) < (?, ?) "
+                       "ORDER BY created_at DESC, id DESC LIMIT ?")
+SQL_COUNT_MESSAGES_BEFORE = "SELECT COUNT(*) FROM messages WHERE session_id=? AND (created_at, id) < (?, ?)"
 
 # --- 1. VERİTABANI KURULUMU ---
+# Şema sürümü PRAGMA user_version'da tutulur; her migration bir kez çalışır.
+MIGRATIONS = [
+    # 1: Sık kullanılan sorgular için index'ler.
+    # sessions: (user_id, created_at, title) kullanıcı oturum listesini tablo okumadan karşılar (covering).
+    # messages: (session_id, created_at) mesajları sıralı okur, tam tablo taraması yapılmaz.
+    [
+        "CREATE INDEX IF NOT EXISTS idx_sessions_user_created ON sessions(user_id, created_at, title)",
+        "CREATE INDEX IF NOT EXISTS idx_messages_session_created ON messages(session_id, created_at)",
+    ],
+    # 2: Keyset sayfalama (created_at, id) sırasıyla okur; oturum index'ine id eklenir.
+    # (messages index'inde rowid zaten created_at'ten hemen sonra gelir.)
+    [
+        "DROP INDEX IF EXISTS idx_sessions_user_created",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_user_created_id ON sessions(user_id, created_at, id, title)",
+    ],
+    # 3: Uzun sohbetlerin eski mesajlarının kayan özeti.
+    # covered_count: oturumun ilk kaç mesajının özete dahil edildiği.
+    [
+        '''CREATE TABLE IF NOT EXISTS session_summaries
+           (session_id INTEGER PRIMARY KEY,
+            summary TEXT,
+            covered_count INTEGER,
+            updated_at TIMESTAMP,
+            FOREIGN KEY(session_id) REFERENCES sessions(id))''',
+    ],
+]
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        with conn:
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute(f"PRAGMA user_version={target}")
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     c = conn.cursor()
-    
+
     # Kullanıcılar Tablosu (Gelişmiş Profil)
     c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                  username TEXT UNIQUE, 
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  username TEXT UNIQUE,
                   password_hash TEXT,
                   display_name TEXT,
                   age INTEGER,
                   gender TEXT,
                   avatar TEXT)''')
-    
+
     # Sohbet Oturumları
     c.execute('''CREATE TABLE IF NOT EXISTS sessions
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                  user_id INTEGER, 
-                  title TEXT, 
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id INTEGER,
+                  title TEXT,
                   created_at TIMESTAMP,
                   FOREIGN KEY(user_id) REFERENCES users(id))''')
-    
+
     # Mesajlar
     c.execute('''CREATE TABLE IF NOT EXISTS messages
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                  session_id INTEGER, 
-                  role TEXT, 
-                  content TEXT, 
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  session_id INTEGER,
+                  role TEXT,
+                  content TEXT,
                   created_at TIMESTAMP,
                   FOREIGN KEY(session_id) REFERENCES sessions(id))''')
-    
+
     conn.commit()
-    conn.close()
+    migrate(conn)
 
 # --- 2. KULLANICI İŞLEMLERİ ---
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 def register_user(username, password, display_name, age, gender):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    conn = get_connection()
     try:
         # Varsayılan avatar 'default'
-        c.execute("INSERT INTO users (username, password_hash, display_name, age, gender, avatar) VALUES (?, ?, ?, ?, ?, ?)", 
-                  (username, hash_password(password), display_name, age, gender, 'default'))
-        conn.commit()
+        with conn:
+            conn.execute(SQL_INSERT_USER,
+                         (username, hash_password(password), display_name, age, gender, 'default'))
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
 
 def login_user(username, password):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
     # Tüm profil bilgilerini çekiyoruz
-    c.execute("SELECT id, username, display_name, age, gender, avatar FROM users WHERE username=? AND password_hash=?", 
-              (username, hash_password(password)))
-    user = c.fetchone()
-    conn.close()
+    user = get_connection().execute(SQL_LOGIN, (username, hash_password(password))).fetchone()
     return user # (id, username, display_name, age, gender, avatar)
 
 def update_profile(user_id, display_name, age, gender, avatar):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("UPDATE users SET display_name=?, age=?, gender=?, avatar=? WHERE id=?", 
-              (display_name, age, gender, avatar, user_id))
-    conn.commit()
-    conn.close()
-    
+    conn = get_connection()
+    with conn:
+        conn.execute(SQL_UPDATE_PROFILE, (display_name, age, gender, avatar, user_id))
+
     # Güncel bilgiyi geri döndür
-    c = conn.cursor()
-    c.execute("SELECT id, username, display_name, age, gender, avatar FROM users WHERE id=?", (user_id,))
-    updated_user = c.fetchone()
-    conn.close()
+    updated_user = conn.execute(SQL_GET_USER, (user_id,)).fetchone()
     return updated_user
 
 # --- 3. SOHBET İŞLEMLERİ ---
 def create_session(user_id, title="Yeni Sohbet"):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("INSERT INTO sessions (user_id, title, created_at) VALUES (?, ?, ?)", 
-              (user_id, title, datetime.now()))
-    session_id = c.lastrowid
-    conn.commit()
-    conn.close()
-    return session_id
+    conn = get_connection()
+    with conn:
+        c = conn.execute(SQL_INSERT_SESSION, (user_id, title, datetime.now()))
+    return c.lastrowid
 
 def get_user_sessions(user_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT id, title FROM sessions WHERE user_id=? ORDER BY created_at DESC", (user_id,))
-    sessions = c.fetchall()
-    conn.close()
-    return sessions
+    return get_connection().execute(SQL_USER_SESSIONS, (user_id,)).fetchall()
 
 def save_message(session_id, role, content):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)", 
-              (session_id, role, content, datetime.now()))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute(SQL_INSERT_MESSAGE, (session_id, role, content, datetime.now()))
+
+def save_messages(session_id, messages):
+    """[(role, content), ...] mesajlarını tek transaction'da, sırayla yazar (ya hepsi ya hiçbiri)."""
+    conn = get_connection()
+    now = datetime.now()
+    with conn:
+        conn.executemany(SQL_INSERT_MESSAGE, [(session_id, role, content, now) for role, content in messages])
 
 def get_session_messages(session_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT role, content FROM messages WHERE session_id=? ORDER BY created_at ASC", (session_id,))
-    messages = [{"role": role, "content": content} for role, content in c.fetchall()]
-    conn.close()
-    return messages
+    rows = get_connection().execute(SQL_SESSION_MESSAGES, (session_id,)).fetchall()
+    return [{"role": role, "content": content} for role, content in rows]
+
+def get_session_summary(session_id):
+    return get_connection().execute(SQL_GET_SUMMARY, (session_id,)).fetchone() # (summary, covered_count)
+
+def save_session_summary(session_id, summary, covered_count):
+    conn = get_connection()
+    with conn:
+        conn.execute(SQL_SAVE_SUMMARY, (session_id, summary, covered_count, datetime.now()))
+
+# --- 4. SAYFALI OKUMA ---
+# İmleç (cursor), sayfadaki en eski kaydın (created_at, id) çiftidir; None ise daha eski kayıt yoktur.
+def _page(rows, limit):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = (rows[-1][-1], rows[-1][0]) if has_more else None
+    return rows, cursor
+
+def get_user_sessions_page(user_id, limit=20, cursor=None):
+    """En yeniden eskiye `limit` oturum: ([(id, title), ...], sonraki_imleç)"""
+    conn = get_connection()
+    if cursor is None:
+        rows = conn.execute(SQL_SESSIONS_FIRST_PAGE, (user_id, limit + 1)).fetchall()
+    else:
+        rows = conn.execute(SQL_SESSIONS_PAGE, (user_id, cursor[0], cursor[1], limit + 1)).fetchall()
+    rows, next_cursor = _page(rows, limit)
+    return [(sid, title) for sid, title, _ in rows], next_cursor
+
+def _messages_page(rows, limit):
+    rows, cursor = _page(rows, limit)
+    # Sorgu en yeniden eskiye okur; ekranda eskiden yeniye gösterilir
+    messages = [{"role": role, "content": content} for _, role, content, _ in reversed(rows)]
+    return messages, cursor
+
+def get_latest_messages(session_id, limit=50):
+    """Oturumun son `limit` mesajı (eskiden yeniye) ve daha eskileri için imleç."""
+    rows = get_connection().execute(SQL_LATEST_MESSAGES, (session_id, limit + 1)).fetchall()
+    return _messages_page(rows, limit)
+
+def get_messages_before(session_id, cursor, limit=50):
+    """İmleçten daha eski `limit` mesaj ("önceki mesajları yükle")."""
+    rows = get_connection().execute(SQL_MESSAGES_BEFORE, (session_id, cursor[0], cursor[1], limit + 1)).fetchall()
+    return _messages_page(rows, limit)
+
+def count_messages_before(session_id, cursor):
+    """İmleçten daha eski mesaj sayısı (sadece index okunur, mesaj metinleri okunmaz)."""
+    return get_connection().execute(SQL_COUNT_MESSAGES_BEFORE, (session_id, cursor[0], cursor[1])).fetchone()[0]
 
 # Dosya import edildiğinde tabloları oluştur
-init_db()
\ No newline at end of file
+init_db()
@@ -0,0 +1,101 @@
+# embedding_batcher.py
+#
+# Eşzamanlı /chat isteklerinin sorgularını kısa bir süre biriktirip tek bir
+# SentenceTransformer.encode çağrısında vektöre çevirir. encode işlemi ayrı bir
+# thread'de çalıştığı için event loop yeni bağlantıları kabul etmeye devam eder.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class EmbeddingBatcher:
+    """
+    Sorguları kuyruğa alır; en fazla `max_batch_size` adet ya da ilk sorgudan
+    sonra `max_wait_ms` milisaniye dolana kadar toplar ve tek seferde encode eder.
+    """
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5.0):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        # Tek worker: PyTorch zaten kendi içinde çok çekirdek kullanır.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._queue = None
+        self._worker = None
+
+        # İstatistikler
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_worker(self):
+        # Kuyruk ve worker ilk istekte, çalışan event loop üzerinde oluşturulur.
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def encode(self, text):
+        """Tek bir metnin embedding'ini döndürür (batch içinde hesaplanır)."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _collect(self):
+        text, future = await self._queue.get()
+        batch = [(text, future)]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Kuyrukta bekleyenleri beklemeden al
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # İptal edilmiş (istemcisi kopmuş) istekleri encode etme
+            batch = [(t, f) for t, f in batch if not f.cancelled()]
+            if not batch:
+                continue
+
+            texts = [t for t, _ in batch]
+            try:
+                vectors = await loop.run_in_executor(self._executor, self.model.encode, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def stats(self):
+        avg = self.items / self.batches if self.batches else 0.0
+        return {"batches": self.batches, "items": self.items, "avg_batch_size": round(avg, 2)}
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,123 @@
+# embedding_cache.py
+#
+# Sık tekrar eden sorguların ("Merhaba, nasılsın?" gibi) embedding'lerini
+# bellekte tutar. Anahtar, Türkçe'ye uygun şekilde küçük harfe çevrilmiş ve
+# boşlukları sadeleştirilmiş sorgu metnidir. Boyut (LRU) ve süre (TTL) ile
+# sınırlıdır; istenirse diske yazılıp yeniden başlatmada geri yüklenir.
+
+import os
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from turkish_text import tr_lower, fold_whitespace
+
+
+def normalize_query(text):
+    """Türkçe küçük harf + tek boşluk: 'MERHABA,  nasılsın? ' -> 'merhaba, nasılsın?'"""
+    return fold_whitespace(tr_lower(text))
+
+
+class EmbeddingCache:
+    """Normalize edilmiş sorgu -> embedding vektörü için LRU + TTL önbellek."""
+
+    def __init__(self, max_size=1024, ttl_seconds=24 * 3600, path=None):
+        self.max_size = max(1, int(max_size))
+        self.ttl = float(ttl_seconds) if ttl_seconds else None
+        self.path = path or None
+        self._data = OrderedDict()  # key -> (vector, kayıt zamanı)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def get(self, text):
+        key = normalize_query(text)
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self._expired(entry[1], now):
+                del self._data[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, text, vector, stored_at=None):
+        key = normalize_query(text)
+        with self._lock:
+            self._data[key] = (np.asarray(vector, dtype='float32'), stored_at or time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    # --- DİSKE YAZMA / GERİ YÜKLEME ---
+    def save(self):
+        """Önbelleği (varsa) self.path'e atomik olarak yazar."""
+        if not self.path:
+            return 0
+        with self._lock:
+            items = list(self._data.items())
+        if not items:
+            return 0
+
+        keys = np.array([k for k, _ in items])
+        vectors = np.stack([v for _, (v, _) in items])
+        stored_at = np.array([t for _, (_, t) in items], dtype='float64')
+
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # Her süreç kendi geçici dosyasına yazar (serve.py worker'ları kapanışta
+        # aynı anda kaydeder); os.replace ile son yazan kazanır, dosya karışmaz.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, keys=keys, vectors=vectors, stored_at=stored_at)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return len(items)
+
+    def load(self):
+        """self.path'teki önbelleği yükler; süresi dolmuş kayıtları atlar."""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        now = time.time()
+        loaded = 0
+        with np.load(self.path, allow_pickle=False) as data:
+            # Dosya en eskiden en yeniye sıralı; LRU sırası korunur
+            for key, vector, stored_at in zip(data["keys"], data["vectors"], data["stored_at"]):
+                if self._expired(float(stored_at), now):
+                    continue
+                self.put(str(key), vector, float(stored_at))
+                loaded += 1
+        return loaded
@@ -0,0 +1,113 @@
+# history_compactor.py
+#
+# Sohbet geçmişini token bütçesi içinde tutar. Son N tur her zaman olduğu gibi
+# gönderilir; daha eski mesajlar oturum başına psychbot.db'de saklanan kayan bir
+# özetle temsil edilir. Özet artımlı güncellenir: her seferinde sadece pencereden
+# yeni çıkan mesajlar mevcut özete eklenir. Hiçbir mesaj özetlenmeden atılmaz.
+
+import asyncio
+
+import database as db
+
+# Token sayısı için kaba tahmin (Gemini'ye ek istek atmadan): ~4 karakter = 1 token
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1 if text else 0
+
+
+class HistoryCompactor:
+    """
+    summarizer(önceki_özet, mesajlar) -> yeni_özet (async; LLMClient üzerinden,
+    süre sınırıyla). Mesajlar {"role": ..., "content": ...} sözlükleridir.
+    build ve update event loop'ta çalışır; veritabanı okuma/yazmaları thread'e
+    taşınır. Aynı oturumun özeti aynı anda iki kez güncellenmez (_in_progress).
+    """
+
+    def __init__(self, summarizer, keep_last_turns=4,
+                 load_summary=db.get_session_summary, save_summary=db.save_session_summary):
+        self.summarizer = summarizer
+        self.keep_last_messages = max(1, keep_last_turns) * 2  # bir tur = kullanıcı + model
+        self.load_summary = load_summary
+        self.save_summary = save_summary
+        # Özeti güncellenmekte olan oturumlar (tek event loop; kilit gerekmez)
+        self._in_progress = set()
+
+    async def _stored(self, session_id, n_messages, offset=0):
+        """
+        (özet, mesaj listesinde özetin kapsamadığı ilk mesajın yeri). offset,
+        listeden önce gelen (oturum önbelleğinden düşmüş) mesaj sayısıdır.
+        """
+        if session_id is None:
+            return "", 0
+        row = await asyncio.to_thread(self.load_summary, session_id)
+        # Özet, elimizdeki geçmişten daha fazlasını kapsıyorsa (farklı/kısaltılmış geçmiş) kullanma
+        if not row or row[1] > offset + n_messages:
+            return "", 0
+        if row[1] < offset:
+            print(f"⚠️ Oturum {session_id}: özetlenmemiş {offset - row[1]} mesaj önbellekten düşmüş; "
+                  "özet bu mesajları içermiyor.")
+        return row[0] or "", max(0, row[1] - offset)
+
+    async def _fold(self, session_id, messages, keep_start, offset=0):
+        """
+        messages[:keep_start] aralığının özette olmayan kısmını özete ekler ve
+        kaydeder; (özet, özetin kapsamadığı ilk mesajın yeri) döndürür. Oturumun
+        özeti zaten güncelleniyorsa beklemez, None döndürür. Özet, oturum
+        sahiplenildikten sonra tekrar okunur; aynı aralık iki kez özetlenmez.
+        """
+        if session_id in self._in_progress:
+            return None
+        self._in_progress.add(session_id)
+        try:
+            summary, covered = await self._stored(session_id, len(messages), offset)
+            if keep_start <= covered:
+                return summary, covered
+            summary = await self.summarizer(summary, messages[covered:keep_start])
+            if session_id is not None:
+                await asyncio.to_thread(self.save_summary, session_id, summary, offset + keep_start)
+            return summary, keep_start
+        finally:
+            self._in_progress.discard(session_id)
+
+    async def build(self, session_id, messages, budget_tokens, offset=0):
+        """
+        Prompt'a girecek (özet, mesajlar) ikilisini döndürür. Son N tur bütçeden
+        bağımsız olarak her zaman gönderilir. Bunlardan eski olup henüz özete
+        girmemiş mesajlar (arka plan güncellemesi yetişmediyse) bütçeye sığarsa
+        olduğu gibi eklenir; sığmazsa önce özete katlanır. O sırada oturumun
+        özeti zaten güncelleniyorsa beklenmez, sadece son N tur gönderilir.
+        """
+        summary, covered = await self._stored(session_id, len(messages), offset)
+        keep_start = max(covered, len(messages) - self.keep_last_messages)
+        kept = messages[keep_start:]
+        pending = messages[covered:keep_start]
+        if not pending:
+            return summary, kept
+
+        used = estimate_tokens(summary) + sum(estimate_tokens(m["content"]) for m in kept)
+        if used + sum(estimate_tokens(m["content"]) for m in pending) <= budget_tokens:
+            return summary, pending + kept
+        try:
+            folded = await self._fold(session_id, messages, keep_start, offset)
+        except Exception as e:
+            # Özetlenemeyen mesajlar atılmaz; bütçe aşılsa da olduğu gibi gönderilir
+            print(f"⚠️ Geçmiş özetlenemedi, mesajlar olduğu gibi gönderiliyor: {e}")
+            return summary, pending + kept
+        if folded is None:
+            # Arka plan güncellemesi bu mesajları zaten özete ekliyor
+            return summary, kept
+        summary, covered = folded
+        return summary, messages[max(keep_start, covered):]
+
+    async def update(self, session_id, messages, offset=0):
+        """
+        Son N turun dışında kalıp henüz özetlenmemiş mesajları özete ekler.
+        Cevap gönderildikten sonra arka planda çağrılır; istek süresine eklenmez.
+        Oturumun özeti o sırada başka bir çağrıda güncelleniyorsa False döner.
+        """
+        if session_id is None:
+            return False
+        keep_start = max(0, len(messages) - self.keep_last_messages)
+        return await self._fold(session_id, messages, keep_start, offset) is not None
@@ -0,0 +1,174 @@
+# lexical_index.py
+#
+# Chunk'lar üzerinde BM25 ters index'i. Vektör deposuyla birlikte
+# 3_create_vector_store.py tarafından kurulur; doküman id'leri FAISS id'leriyle
+# (chunk store satırlarıyla) aynıdır. Terimler turkish_text.lexical_terms ile
+# normalize edilir (ı/i, şapkalı harfler, hafif ek kırpma).
+#
+# Diskte tek bir .npz: terimler, her terimin posting aralığı (offsets),
+# posting'lerdeki doküman id'leri ve önceden hesaplanmış BM25 ağırlıkları.
+# Terim normalizasyonunun sürümü de saklanır; sürümü farklı bir index
+# yüklenmez (sorgu terimleri index'tekilerle eşleşmezdi).
+
+import os
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from turkish_text import LEXICAL_TERMS_VERSION, lexical_terms
+
+LEXICAL_INDEX_FILE = "lexical_index.npz"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Reciprocal rank fusion sabiti (Cormack vd.; 60 yaygın varsayılan)
+RRF_K = 60
+
+# Sözcüksel hızlı yol: kısa sorgularda (ör. "bilişsel çarpıtma") BM25 yeterince
+# eminse embedding + FAISS araması atlanır.
+FAST_PATH_CONFIDENCE = 0.6
+FAST_PATH_MAX_TERMS = 4
+
+LexicalResult = namedtuple("LexicalResult", "ids scores confidence n_terms")
+
+
+class BM25Index:
+    def __init__(self, terms, offsets, doc_ids, weights, idf, n_docs, k1=BM25_K1):
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.idf = idf
+        self.n_docs = int(n_docs)
+        self.k1 = float(k1)
+        self._term_rows = {t: i for i, t in enumerate(terms.tolist())}
+
+    @classmethod
+    def build(cls, texts, k1=BM25_K1, b=BM25_B):
+        """texts[i] -> i numaralı dokümanın metni; None olan satırlar (boş id'ler) atlanır."""
+        postings = {}
+        doc_len = np.zeros(len(texts), dtype="float32")
+        for doc_id, text in enumerate(texts):
+            if text is None:
+                continue
+            counts = Counter(lexical_terms(text))
+            doc_len[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        live = doc_len[doc_len > 0]
+        avgdl = float(live.mean()) if len(live) else 1.0
+        n_live = len(live)
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype="int64")
+        doc_ids, weights = [], []
+        idf = np.zeros(len(terms), dtype="float32")
+        for row, term in enumerate(terms):
+            plist = postings[term]
+            ids = np.array([d for d, _ in plist], dtype="int32")
+            tf = np.array([t for _, t in plist], dtype="float32")
+            # Doküman uzunluğuyla normalize edilmiş, doygunlaşan tf (BM25); idf sorguda çarpılır
+            norm = k1 * (1 - b + b * doc_len[ids] / avgdl)
+            doc_ids.append(ids)
+            weights.append(tf * (k1 + 1) / (tf + norm))
+            df = len(plist)
+            idf[row] = np.log(1 + (n_live - df + 0.5) / (df + 0.5))
+            offsets[row + 1] = offsets[row] + df
+
+        return cls(
+            np.array(terms, dtype=str),
+            offsets,
+            np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype="int32"),
+            np.concatenate(weights).astype("float32") if weights else np.zeros(0, dtype="float32"),
+            idf,
+            len(texts),
+            k1,
+        )
+
+    def save(self, store_dir):
+        path = os.path.join(store_dir, LEXICAL_INDEX_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, terms=self.terms, offsets=self.offsets, doc_ids=self.doc_ids,
+                     weights=self.weights, idf=self.idf, n_docs=self.n_docs, k1=self.k1,
+                     terms_version=LEXICAL_TERMS_VERSION)
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    @staticmethod
+    def is_current(store_dir):
+        """Index diskte var ve güncel terim normalizasyonuyla kurulmuş mu?"""
+        path = os.path.join(store_dir, LEXICAL_INDEX_FILE)
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as data:
+            return "terms_version" in data and int(data["terms_version"]) == LEXICAL_TERMS_VERSION
+
+    @classmethod
+    def load(cls, store_dir):
+        with np.load(os.path.join(store_dir, LEXICAL_INDEX_FILE)) as data:
+            version = int(data["terms_version"]) if "terms_version" in data else 1
+            if version != LEXICAL_TERMS_VERSION:
+                raise ValueError(f"terim sürümü {version}, beklenen {LEXICAL_TERMS_VERSION}")
+            return cls(data["terms"], data["offsets"], data["doc_ids"], data["weights"],
+                       data["idf"], data["n_docs"], data["k1"])
+
+    def __len__(self):
+        return len(self.terms)
+
+    def search(self, query, k):
+        """
+        LexicalResult(doc_ids, skorlar, güven, terim sayısı) döndürür. Güven, en iyi skorun sorgu terimlerinin
+        alabileceği en yüksek skora oranıdır (0-1); sorgu terimlerinden biri en iyi
+        dokümanda (ya da index'te hiç) geçmiyorsa güven 0'dır.
+        """
+        terms = list(dict.fromkeys(lexical_terms(query)))
+        if not terms:
+            return LexicalResult(np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32"), 0.0, 0)
+
+        scores = np.zeros(self.n_docs, dtype="float32")
+        matched = np.zeros(self.n_docs, dtype="int16")
+        best_possible = 0.0
+        for term in terms:
+            row = self._term_rows.get(term)
+            if row is None:
+                continue
+            start, end = self.offsets[row], self.offsets[row + 1]
+            ids = self.doc_ids[start:end]
+            scores[ids] += self.idf[row] * self.weights[start:end]
+            matched[ids] += 1
+            best_possible += float(self.idf[row]) * (self.k1 + 1)
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) == 0:
+            return LexicalResult(np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32"), 0.0, len(terms))
+        if len(candidates) > k:
+            top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        else:
+            top = candidates
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        confidence = 0.0
+        if best_possible > 0 and matched[top[0]] == len(terms):
+            confidence = float(scores[top[0]]) / best_possible
+        return LexicalResult(top.astype("int64"), scores[top], confidence, len(terms))
+
+
+def is_confident(result, k, threshold=FAST_PATH_CONFIDENCE, max_terms=FAST_PATH_MAX_TERMS):
+    """Sözcüksel sonuç tek başına yeterli mi (hızlı yol)?"""
+    return (0 < result.n_terms <= max_terms and result.confidence >= threshold
+            and len(result.ids) >= k)
+
+
+def reciprocal_rank_fusion(rankings, limit, rrf_k=RRF_K):
+    """Birden fazla sıralamayı (id listeleri) RRF ile birleştirir; ilk `limit` id'yi döndürür."""
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            doc_id = int(doc_id)
+            if doc_id < 0:
+                continue
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return [doc_id for doc_id, _ in sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]]
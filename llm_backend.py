@@ -0,0 +1,329 @@
+# llm_backend.py
+#
+# Sohbet cevabını üreten LLM'in arkasındaki arayüz. api.py Gemini'yi doğrudan
+# çağırmaz; bir LLMBackend ('gemini' ya da yerel 'stub') ile konuşur.
+# LLMClient bu senkron backend'i ayrı bir thread havuzunda çalıştırır ve
+# - her çağrıya, çağrı başladığında hesaplanan tek bir süre sınırı koyar; tekrarlar
+#   ve hedging bu sürenin içinde kalır (takılan çağrı istek slotunu tutmasın),
+# - geçici hatalarda (429/503/zaman aşımı) süre kaldıkça jitter'lı, sınırlı sayıda
+#   tekrar dener; her deneme kalan süreyle sınırlanır,
+# - isteğe bağlı hedging yapar: ilk deneme son çağrıların p95 süresini aşarsa
+#   ikinci bir çağrı başlatır, hangisi önce dönerse o kullanılır.
+# Akışlı cevaplarda tekrar ve hedging sadece ilk parça gelene kadar geçerlidir;
+# kullanıcıya metin gönderilmeye başlandıktan sonra çağrı değiştirilemez.
+
+import time
+import random
+import asyncio
+import itertools
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from llm_stub import DEFAULT_REPLY_WORDS, StubModel
+
+BACKENDS = ("gemini", "stub")
+
+# google.api_core'daki geçici hata sınıfları (import etmeden isimle tanınır)
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "Aborted",
+}
+
+
+class LLMBackend(ABC):
+    """
+    Senkron arayüz; LLMClient tarafından thread havuzunda çağrılır.
+    history: [{"role": "user" | "model", "content": ...}], message: yeni kullanıcı mesajı.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def generate(self, system_instruction, history, message, timeout=None):
+        """Tam cevap metni."""
+
+    @abstractmethod
+    def stream(self, system_instruction, history, message, timeout=None):
+        """Cevap parçaları (str) üreten iterator; erken kapatılırsa bağlantısını bırakmalı."""
+
+    def is_retryable(self, error):
+        return (isinstance(error, (TimeoutError, ConnectionError))
+                or type(error).__name__ in RETRYABLE_ERRORS)
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self, api_key, model_name):
+        import google.generativeai as genai
+
+        # İstemci süreç başına bir kez yapılandırılır (istek başına değil)
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self.model_name = model_name
+        self._plain_model = genai.GenerativeModel(model_name)
+
+    def _model(self, system_instruction):
+        # Sistem talimatı isteğe göre değiştiği için (context) model nesnesi hafif bir sarmalayıcı
+        if not system_instruction:
+            return self._plain_model
+        return self._genai.GenerativeModel(self.model_name, system_instruction=system_instruction)
+
+    @staticmethod
+    def _contents(history, message):
+        return ([{"role": m["role"], "parts": [m["content"]]} for m in history]
+                + [{"role": "user", "parts": [message]}])
+
+    def generate(self, system_instruction, history, message, timeout=None):
+        response = self._model(system_instruction).generate_content(
+            self._contents(history, message), request_options={"timeout": timeout} if timeout else None)
+        return response.text
+
+    def stream(self, system_instruction, history, message, timeout=None):
+        response = self._model(system_instruction).generate_content(
+            self._contents(history, message), stream=True,
+            request_options={"timeout": timeout} if timeout else None)
+        try:
+            for part in response:
+                if part.text:
+                    yield part.text
+        finally:
+            # Yarıda bırakılan akışın HTTP bağlantısı açık kalmasın (grpc: cancel, rest: close)
+            iterator = getattr(response, "_iterator", None)
+            for method in ("cancel", "close"):
+                if callable(getattr(iterator, method, None)):
+                    getattr(iterator, method)()
+                    break
+
+
+class StubBackend(LLMBackend):
+    """
+    Yerel, deterministik LLM taklidi (bkz. llm_stub.py). slow_every > 0 ise her
+    slow_every'inci çağrının ilk parçası slow_ms kadar gecikir; kuyruk gecikmesini
+    ve hedging'i ağ olmadan denemek için.
+    """
+
+    name = "stub"
+
+    def __init__(self, first_token_ms, token_ms, reply_words=DEFAULT_REPLY_WORDS, slow_every=0, slow_ms=0.0):
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.reply_words = reply_words
+        self.slow_every = slow_every
+        self.slow_ms = slow_ms
+        self._calls = itertools.count(1)
+
+    def _model(self, system_instruction):
+        first_token_ms = self.first_token_ms
+        if self.slow_every and next(self._calls) % self.slow_every == 0:
+            first_token_ms += self.slow_ms
+        return StubModel(system_instruction, first_token_ms, self.token_ms, self.reply_words)
+
+    def generate(self, system_instruction, history, message, timeout=None):
+        return self._model(system_instruction).generate_content(message).text
+
+    def stream(self, system_instruction, history, message, timeout=None):
+        for part in self._model(system_instruction).generate_content(message, stream=True):
+            yield part.text
+
+
+def close_stream(parts):
+    """Backend akışını (generator) kapatır; kapatılamıyorsa sessizce geçer."""
+    close = getattr(parts, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
+
+
+def create_backend(name, api_key=None, model_name=None, **stub_options):
+    if name == "gemini":
+        return GeminiBackend(api_key, model_name)
+    if name == "stub":
+        return StubBackend(**stub_options)
+    raise ValueError(f"Bilinmeyen LLM backend'i: {name} (seçenekler: {', '.join(BACKENDS)})")
+
+
+class LLMClient:
+    """
+    Backend çağrılarını event loop dışında, süre sınırı / tekrar / hedging ile yapar.
+    timeout_s: çağrı başına süre; tekrarlar ve hedging dahil ilk cevaba (akışta ilk
+    parçaya) kadar. Akışta parçalar arası bekleme de bu süreyle sınırlıdır.
+    """
+
+    def __init__(self, backend, timeout_s=30.0, max_retries=2, backoff_s=0.5, max_backoff_s=4.0,
+                 hedge=False, hedge_percentile=95, hedge_min_samples=20, hedge_max_ratio=0.1,
+                 max_workers=32):
+        self.backend = backend
+        self.timeout_s = timeout_s
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        # Hedging bütçesi: çağrıların en fazla bu oranı ikinci bir çağrı tetikler
+        self.hedge_max_ratio = hedge_max_ratio
+        # Takılan çağrılar Starlette'in ortak thread havuzunu tüketmesin
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        # Başarılı denemelerin süreleri ('generate': tam cevap, 'stream': ilk parça,
+        # 'complete': arka plan istekleri; sohbet cevaplarının hedge süresini etkilemesin)
+        self._latencies = {"generate": deque(maxlen=500), "stream": deque(maxlen=500),
+                           "complete": deque(maxlen=500)}
+        self.counters = {"calls": 0, "retries": 0, "timeouts": 0, "errors": 0, "hedges": 0, "hedge_wins": 0}
+
+    @staticmethod
+    def _discard_when_done(future, discard):
+        """
+        Kullanılmayacak bir denemenin sonucunu bırakır. Thread'de çalışan çağrı
+        iptal edilemez; bittiğinde sonucu (ör. açık akış) discard ile kapatılır.
+        """
+        def on_done(f):
+            if not f.cancelled() and f.exception() is None:
+                discard(f.result())
+
+        if future.cancel():
+            return  # Hiç başlamadı, bırakılacak sonuç yok
+        future.add_done_callback(on_done)
+
+    def hedge_delay(self, kind):
+        """İkinci çağrının başlatılacağı süre (sn) ya da None (hedging yok)."""
+        latencies = self._latencies[kind]
+        if not self.hedge or len(latencies) < self.hedge_min_samples:
+            return None
+        if self.counters["hedges"] >= self.hedge_max_ratio * self.counters["calls"]:
+            return None
+        return float(np.percentile(latencies, self.hedge_percentile))
+
+    def _backoff(self, attempt):
+        # Full jitter: [0, min(üst sınır, taban * 2^deneme)]
+        return random.uniform(0.0, min(self.max_backoff_s, self.backoff_s * 2 ** attempt))
+
+    async def _race(self, fn, kind, deadline, discard=None):
+        """
+        fn(kalan_süre)'yi thread havuzunda bir deneme olarak başlatır; hedge süresi
+        dolarsa ikincisini de başlatır. Önce başarıyla biten kazanır; kaybeden
+        denemelerin sonuçları (bittiklerinde) discard ile bırakılır. deadline
+        (loop.time()) çağrının tamamı için tek süre sınırıdır.
+        """
+        loop = asyncio.get_running_loop()
+        began = loop.time()
+        delay = self.hedge_delay(kind)
+        hedge_at = began + delay if delay is not None and began + delay < deadline else None
+
+        started = {}
+
+        def launch():
+            # Backend'in kendi süre sınırı da kalan süreyi geçmesin
+            future = self._executor.submit(fn, max(0.0, deadline - loop.time()))
+            task = asyncio.wrap_future(future)
+            started[task] = (loop.time(), future)
+            return task
+
+        primary = launch()
+        pending = {primary}
+        winner = None
+        error = None
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    break
+                wake = min(deadline, hedge_at) if hedge_at is not None else deadline
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, wake - now),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    elif discard is not None:
+                        # İki deneme aynı anda bittiyse ikincisi de bırakılmalı
+                        discard(task.result())
+                if winner is not None:
+                    self._latencies[kind].append(loop.time() - started[winner][0])
+                    if winner is not primary:
+                        self.counters["hedge_wins"] += 1
+                    return winner.result()
+                if pending and hedge_at is not None and loop.time() >= hedge_at:
+                    hedge_at = None
+                    self.counters["hedges"] += 1
+                    pending.add(launch())
+            if not pending:
+                raise error
+            self.counters["timeouts"] += 1
+            raise TimeoutError(f"LLM {self.timeout_s:g} sn içinde cevap vermedi")
+        finally:
+            # Kaybeden denemelerin thread'leri durdurulamaz; backend süre sınırıyla biterler
+            for task in pending:
+                task.cancel()
+                self._discard_when_done(started[task][1], discard or (lambda result: None))
+
+    async def _with_retries(self, fn, kind, discard=None):
+        """
+        fn(kalan_süre)'yi tekrarlarla çalıştırır. Süre sınırı çağrı başında bir kez
+        hesaplanır; dolduysa (ya da beklemeden sonra dolacaksa) tekrar denenmez.
+        """
+        self.counters["calls"] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout_s
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._race(fn, kind, deadline, discard)
+            except Exception as e:
+                backoff = self._backoff(attempt)
+                if (attempt >= self.max_retries or not self.backend.is_retryable(e)
+                        or loop.time() + backoff >= deadline):
+                    self.counters["errors"] += 1
+                    raise
+                self.counters["retries"] += 1
+                await asyncio.sleep(backoff)
+
+    async def generate(self, system_instruction, history, message):
+        return await self._with_retries(
+            lambda timeout: self.backend.generate(system_instruction, history, message, timeout), "generate")
+
+    async def stream(self, system_instruction, history, message):
+        """
+        Cevap parçalarını üreten async iterator. Akış yarıda bırakılırsa (istemci
+        koptu, süre aşıldı) backend akışı kapatılır.
+        """
+        def open_stream(timeout):
+            parts = iter(self.backend.stream(system_instruction, history, message, timeout))
+            return parts, next(parts, None)
+
+        parts, text = await self._with_retries(open_stream, "stream", lambda result: close_stream(result[0]))
+        pending = None
+        try:
+            while text is not None:
+                yield text
+                pending = self._executor.submit(next, parts, None)
+                try:
+                    text = await asyncio.wait_for(asyncio.wrap_future(pending), self.timeout_s)
+                except asyncio.TimeoutError:
+                    self.counters["timeouts"] += 1
+                    raise TimeoutError(f"LLM akışı {self.timeout_s:g} sn içinde devam etmedi") from None
+        finally:
+            if pending is not None and not pending.done() and not pending.cancel():
+                # Çalışmakta olan generator kapatılamaz; next() dönünce kapatılır
+                self._discard_when_done(pending, lambda _: close_stream(parts))
+            else:
+                close_stream(parts)
+
+    async def complete(self, prompt):
+        """Sistem talimatı ve geçmiş olmadan tek seferlik çağrı (ör. geçmiş özeti); aynı süre sınırı ve tekrarlarla."""
+        return await self._with_retries(lambda timeout: self.backend.generate(None, [], prompt, timeout), "complete")
+
+    def stats(self):
+        stats = dict(self.counters, backend=self.backend.name, timeout_s=self.timeout_s, hedge=self.hedge)
+        for kind, latencies in self._latencies.items():
+            if latencies:
+                stats[f"{kind}_p95_ms"] = round(float(np.percentile(latencies, 95)) * 1000, 1)
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,68 @@
+# llm_stub.py
+#
+# Gemini yerine yerel, ağsız bir LLM taklidi (LLM_BACKEND=stub). Yük testlerinde
+# ölçülen süre ağın ve Gemini'nin değil, sunucunun kendisinin olsun diye
+# kullanılır: ilk parça sabit bir gecikmeyle, sonraki parçalar kelime başına
+# sabit aralıklarla gelir. google.generativeai'daki GenerativeModel.generate_content
+# arayüzünü taklit eder; api.py bunu llm_backend.StubBackend üzerinden kullanır.
+
+import time
+import zlib
+
+DEFAULT_FIRST_TOKEN_MS = 300.0
+DEFAULT_TOKEN_MS = 15.0
+DEFAULT_REPLY_WORDS = 60
+
+_FILLER = (
+    "Bunu paylaştığın için teşekkür ederim. Anlattıklarından bu durumun seni epey "
+    "yorduğu anlaşılıyor. Böyle anlarda aklından geçen ilk düşünce ne oluyor? "
+    "O düşüncenin doğru olduğunu gösteren ve göstermeyen kanıtlara birlikte bakabiliriz. "
+    "Kendine bir arkadaşına davrandığın kadar anlayışlı davrandığında neler değişirdi? "
+    "Küçük bir adımla başlamak, örneğin bugün beş dakikalık bir yürüyüş, iyi gelebilir."
+).split()
+
+
+class StubPart:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubResponse:
+    """Akışsız cevap (.text) ya da akışta parça iteratörü."""
+
+    def __init__(self, words, first_token_s, token_s, stream):
+        self._words = words
+        self._first_token_s = first_token_s
+        self._token_s = token_s
+        self._stream = stream
+        if not stream:
+            time.sleep(first_token_s + token_s * max(0, len(words) - 1))
+            self.text = " ".join(words)
+
+    def __iter__(self):
+        if not self._stream:
+            yield StubPart(self.text)
+            return
+        time.sleep(self._first_token_s)
+        for i, word in enumerate(self._words):
+            if i:
+                time.sleep(self._token_s)
+            yield StubPart(word if i == 0 else " " + word)
+
+
+class StubModel:
+    def __init__(self, system_instruction=None, first_token_ms=DEFAULT_FIRST_TOKEN_MS,
+                 token_ms=DEFAULT_TOKEN_MS, reply_words=DEFAULT_REPLY_WORDS):
+        self.system_instruction = system_instruction or ""
+        self.first_token_s = first_token_ms / 1000.0
+        self.token_s = token_ms / 1000.0
+        self.reply_words = reply_words
+
+    def _reply(self, prompt):
+        # Aynı girdiye aynı cevap (önbellek ve tekrar edilebilir ölçüm için)
+        offset = zlib.crc32(prompt.encode("utf-8")) % len(_FILLER)
+        return [_FILLER[(offset + i) % len(_FILLER)] for i in range(self.reply_words)]
+
+    def generate_content(self, prompt, stream=False):
+        return StubResponse(self._reply(prompt), self.first_token_s, self.token_s, stream)
+
@@ -0,0 +1,37 @@
+# memory_stats.py
+#
+# Süreç bellek ölçümü (Linux /proc/<pid>/smaps_rollup). Çok worker'lı çalışmada
+# asıl ölçüt USS'tir (sadece o sürece ait sayfalar): fork öncesi yüklenen
+# modeller ve mmap'lenen index worker'lar arasında paylaşıldığı için RSS'te
+# görünür ama USS'e girmez. PSS, paylaşılan sayfaları süreçlere bölüştürür.
+
+KB = 1024
+
+
+def process_memory(pid="self"):
+    """{"rss_mb", "pss_mb", "uss_mb", "shared_mb"}; desteklenmeyen sistemlerde None."""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    shared = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / KB, 1),
+        "pss_mb": round(fields.get("Pss", 0) / KB, 1),
+        "uss_mb": round(uss / KB, 1),
+        "shared_mb": round(shared / KB, 1),
+    }
+
+
+def format_memory(memory):
+    if memory is None:
+        return "bellek bilgisi yok"
+    return (f"RSS {memory['rss_mb']:.0f} MB | PSS {memory['pss_mb']:.0f} MB | "
+            f"USS {memory['uss_mb']:.0f} MB | paylaşılan {memory['shared_mb']:.0f} MB")
@@ -0,0 +1,265 @@
+# metrics.py
+#
+# İstek başına aşama süreleri. Her /chat isteği bir iz (trace) açar; kod içindeki
+# `with span("query_embed"):` blokları süreyi hem Prometheus histogramına
+# (/metrics) hem de isteğin izine yazar. İstek bitince iz tek satırlık JSON
+# olarak loglanır (request_id, uç, durum, toplam süre ve aşama süreleri).
+#
+# Request id, gelen X-Request-ID başlığından alınır ya da üretilir ve cevapta
+# geri gönderilir. Histogram etiketlerine request id konmaz (her istek ayrı
+# seri olurdu); bunun yerine her kovanın son örneği OpenMetrics "exemplar"
+# olarak request id ile birlikte yayınlanır.
+
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Sohbet isteğinin aşamaları (sırasıyla)
+STAGES = (
+    "crisis_keyword",   # kriz sözlüğü taraması
+    "crisis_model",     # kriz sınıflandırıcısı (sadece sözlükte eşleşme varsa)
+    "lexical_search",   # BM25 araması
+    "query_embed",      # sorgu embedding'i (önbellek + batch kuyruğu dahil)
+    "faiss_search",     # FAISS araması
+    "chunk_fetch",      # chunk metinlerinin okunması
+    "context_assembly", # mesafe eşiği, MMR, komşu birleştirme ve bütçe
+    "prompt_build",     # sistem talimatı + geçmiş sıkıştırma
+    "llm_first_token",  # akışta ilk parçaya kadar geçen süre
+    "llm_call",         # Gemini çağrısı (akışta tüm cevap)
+)
+
+# Saniye cinsinden kovan sınırları (1 ms'den 30 sn'ye)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_ID_HEADER = "x-request-id"
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger("chatbot.requests")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_le(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class Histogram:
+    """Etiketli Prometheus histogramı (thread-safe); son örnek exemplar olarak tutulur."""
+
+    def __init__(self, name, documentation, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, request_id=None, **labels):
+        key = tuple((name, labels[name]) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    "counts": [0] * len(self.buckets), "sum": 0.0, "count": 0,
+                    "exemplars": [None] * len(self.buckets),
+                }
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    if request_id is not None:
+                        series["exemplars"][i] = (request_id, value, time.time())
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self, openmetrics=False):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+            snapshot = [(key, list(s["counts"]), s["sum"], s["count"], list(s["exemplars"])) for key, s in series]
+        for key, counts, total, count, exemplars in snapshot:
+            cumulative = 0
+            for bound, n, exemplar in zip(self.buckets, counts, exemplars):
+                cumulative += n
+                line = f"{self.name}_bucket{_format_labels(key + (('le', _format_le(bound)),))} {cumulative}"
+                if openmetrics and exemplar is not None:
+                    request_id, value, ts = exemplar
+                    line += f' # {{request_id="{request_id}"}} {value:.6f} {ts:.3f}'
+                lines.append(line)
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Info:
+    """
+    Değeri her zaman 1 olan etiketli gauge; sayı değil durum bildirir (ör. hangi
+    çalışma zamanının kullanıldığı). Seri, key_label etiketine göre tutulur.
+    """
+
+    def __init__(self, name, documentation, label_names, key_label):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.key_label = key_label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def set(self, **labels):
+        key = tuple((name, labels[name]) for name in self.label_names)
+        with self._lock:
+            self._series[labels[self.key_label]] = key
+
+    def render(self, openmetrics=False):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            series = sorted(self._series.items())
+        lines += [f"{self.name}{_format_labels(key)} 1" for _, key in series]
+        return lines
+
+
+STAGE_SECONDS = Histogram("chatbot_stage_seconds", "Sohbet isteği aşama süreleri (saniye).", ["stage"])
+REQUEST_SECONDS = Histogram("chatbot_request_seconds", "Uç bazında toplam istek süresi (saniye).",
+                            ["method", "path", "status"])
+RUNTIME_INFO = Info("chatbot_runtime_info", "Model başına istenen ve kullanılan çalışma zamanı.",
+                    ["model", "requested", "actual"], key_label="model")
+
+
+class RequestTrace:
+    def __init__(self, request_id, method, path):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.start = time.perf_counter()
+        self.spans = []
+        self.fields = {}
+
+
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+def current_request_id():
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+def annotate(**fields):
+    """İsteğin JSON log satırına ek alanlar (örn. is_crisis, cached)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.fields.update(fields)
+
+
+def record(stage, seconds):
+    trace = _current_trace.get()
+    request_id = trace.request_id if trace else None
+    STAGE_SECONDS.observe(seconds, request_id=request_id, stage=stage)
+    if trace is not None:
+        trace.spans.append((stage, seconds))
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def log_request(trace, status):
+    stages = {}
+    for stage, seconds in trace.spans:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+    entry = {
+        "event": "request",
+        "request_id": trace.request_id,
+        "method": trace.method,
+        "path": trace.path,
+        "status": status,
+        "duration_ms": round((time.perf_counter() - trace.start) * 1000, 2),
+        "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in stages.items()},
+    }
+    entry.update(trace.fields)
+    logger.info(json.dumps(entry, ensure_ascii=False))
+
+
+def render(openmetrics=False):
+    lines = (STAGE_SECONDS.render(openmetrics) + REQUEST_SECONDS.render(openmetrics)
+             + RUNTIME_INFO.render(openmetrics))
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+class RequestMetricsMiddleware:
+    """
+    Saf ASGI middleware: request id atar, isteğin izini açar ve cevabın son
+    parçası gönderildiğinde (akışlı cevaplarda akış bittiğinde) kapatır.
+    skip_paths altındaki uçlar (/metrics, sağlık kontrolleri) ölçülmez.
+    """
+
+    def __init__(self, app, skip_paths=()):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER.encode():
+                # Log ve exemplar'lara güvenle yazılabilsin diye sadece [A-Za-z0-9_-]
+                request_id = "".join(c for c in value.decode("latin-1") if c.isalnum() or c in "-_")[:64]
+                break
+        trace = RequestTrace(request_id or uuid.uuid4().hex[:16], scope["method"], scope["path"])
+        token = _current_trace.set(trace)
+        state = {"status": 500, "finished": False}
+
+        def finish():
+            if state["finished"]:
+                return
+            state["finished"] = True
+            # Eşleşmeyen yollar etiket sayısını şişirmesin
+            path = "unmatched" if state["status"] == 404 else trace.path
+            REQUEST_SECONDS.observe(time.perf_counter() - trace.start, request_id=trace.request_id,
+                                    method=trace.method, path=path, status=str(state["status"]))
+            log_request(trace, state["status"])
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (REQUEST_ID_HEADER.encode(), trace.request_id.encode("latin-1"))]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            finish()
+            _current_trace.reset(token)
@@ -0,0 +1,92 @@
+# model_store.py
+#
+# Modellerin yerel kopyaları. API açılışta Hugging Face Hub'a hiç bağlanmaz;
+# modeller data/models altına bir kez safetensors formatında indirilir
+# (python 0_snapshot_models.py) ve oradan local_files_only ile yüklenir.
+# Safetensors dosyaları pickle çözmeden, doğrudan bellek eşlemeyle açılır;
+# .bin ağırlıklarına göre yükleme belirgin şekilde hızlıdır.
+
+import os
+import json
+
+MODELS_DIR = os.path.join("data", "models")
+
+
+def snapshot_path(model_id, models_dir=MODELS_DIR):
+    return os.path.join(models_dir, model_id.replace("/", "__"))
+
+
+def has_snapshot(model_id, models_dir=MODELS_DIR):
+    path = snapshot_path(model_id, models_dir)
+    if not os.path.isdir(path):
+        return False
+    for _, _, files in os.walk(path):
+        if any(f.endswith(".safetensors") for f in files):
+            return True
+    return False
+
+
+def resolve(model_id, models_dir=MODELS_DIR):
+    """Yerel safetensors kopyası varsa onun yolu, yoksa model id'si (HF önbelleğinden yüklenir)."""
+    return snapshot_path(model_id, models_dir) if has_snapshot(model_id, models_dir) else model_id
+
+
+def parity_path(model_id, runtime, models_dir=MODELS_DIR):
+    return snapshot_path(model_id, models_dir) + f".{runtime}.parity.json"
+
+
+def load_parity(model_id, runtime, models_dir=MODELS_DIR):
+    """
+    Hızlı çalışma zamanının fp32 ile karşılaştırma sonucu (save_parity ile yazılmış).
+    Sonuç bir dosyaya (ör. ONNX grafı) bağlıysa ve o dosya silinmiş ya da
+    değişmişse sonuç geçersizdir; None döner.
+    """
+    path = parity_path(model_id, runtime, models_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        verdict = json.load(f)
+    artifact = verdict.get("artifact")
+    if artifact and (not os.path.exists(artifact) or os.stat(artifact).st_mtime_ns != verdict.get("artifact_mtime_ns")):
+        return None
+    return verdict
+
+
+def save_parity(model_id, runtime, verdict, artifact=None, models_dir=MODELS_DIR):
+    """Karşılaştırma sonucunu modelin yanına yazar; açılışta referans model yüklenmez."""
+    verdict = dict(verdict, runtime=runtime)
+    if artifact:
+        verdict.update(artifact=artifact, artifact_mtime_ns=os.stat(artifact).st_mtime_ns)
+    path = parity_path(model_id, runtime, models_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(verdict, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+    return verdict
+
+
+def enable_offline_mode():
+    """
+    Hub'a gidilmesini engeller. huggingface_hub bu değişkenleri import sırasında
+    okuduğu için transformers / sentence_transformers import edilmeden çağrılmalı.
+    """
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+
+def snapshot_sentence_transformer(model_name, models_dir=MODELS_DIR):
+    from sentence_transformers import SentenceTransformer
+
+    path = snapshot_path(model_name, models_dir)
+    model = SentenceTransformer(model_name, device="cpu")
+    model.save(path, safe_serialization=True)
+    return path
+
+
+def snapshot_classifier(model_id, models_dir=MODELS_DIR):
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    path = snapshot_path(model_id, models_dir)
+    AutoTokenizer.from_pretrained(model_id).save_pretrained(path)
+    AutoModelForSequenceClassification.from_pretrained(model_id).save_pretrained(path, safe_serialization=True)
+    return path
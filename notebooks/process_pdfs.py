@@ -1,6 +1,10 @@
 # notebooks/process_pdfs.py
 
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import argparse
+import os
 import fitz  # PyMuPDF
 from tqdm import tqdm
 import sys
@@ -12,8 +16,10 @@ import json
 BASE_DIR = Path(__file__).resolve().parent.parent
 RAW_PATH = BASE_DIR / "data" / "raw"
 CHUNK_PATH = BASE_DIR / "data" / "chunks"
-RAW_PATH.mkdir(parents=True, exist_ok=True)
-CHUNK_PATH.mkdir(parents=True, exist_ok=True)
+
+# token_chunker.py proje kök dizininde
+sys.path.insert(0, str(BASE_DIR))
+import token_chunker as tc
 
 # --- SENİN İSTEĞİN ÜZERİNE YENİ KONTROL MERKEZİ ---
 # Her bir PDF için hangi sayfaların işleneceğini buradan belirliyoruz.
@@ -27,8 +33,18 @@ PDF_PROCESSING_RULES = {
 # EĞER SONUÇLAR İYİ OLMAZSA, İLK OLARAK BU SAYILARI DEĞİŞTİRMEK GEREKİR.
 
 # Chunk ayarları
+# 'tokens': embedding modelinin tokenizer'ıyla, cümle sınırında ve model sınırına (128) göre.
+# 'words': eski kelime penceresi (450 kelime; embedding sırasında büyük kısmı kesilir).
+CHUNK_MODE = "tokens"
 CHUNK_SIZE_IN_WORDS = 450
 CHUNK_OVERLAP_IN_WORDS = 50
+CHUNK_WINDOW_IN_TOKENS = tc.DEFAULT_WINDOW_TOKENS
+CHUNK_OVERLAP_IN_TOKENS = tc.DEFAULT_OVERLAP_TOKENS
+
+# Paralel işleme: her görev bir kitabın bu kadar sayfasını işler.
+# Aynı anda en fazla (worker sayısı x IN_FLIGHT_PER_WORKER) görev bellekte bekler.
+PAGES_PER_TASK = 16
+IN_FLIGHT_PER_WORKER = 2
 
 # Bilinen OCR hataları
 OCR_CORRECTIONS = {
@@ -38,7 +54,7 @@ OCR_CORRECTIONS = {
     'ar.ılı.klan uzatm~': 'aralıkları uzatma',
 }
 
-# --- 2. YARDIMCI FONKSİYONLAR (DEĞİŞİKLİK YOK) ---
+# --- 2. YARDIMCI FONKSİYONLAR ---
 
 def correct_ocr_errors(text):
     for wrong, right in OCR_CORRECTIONS.items():
@@ -61,66 +77,175 @@ def chunk_text(text, chunk_size, overlap):
         chunks.append(" ".join(chunk_words))
     return chunks
 
-# --- 3. ANA İŞLEM AKIŞI (TAMAMEN YENİLENDİ) ---
-
-# Başlamadan önce eski chunk'ları temizle
-print("Eski chunk dosyaları temizleniyor...")
-for file in CHUNK_PATH.glob("*.json"):
-    file.unlink()
-
-pdfs = list(RAW_PATH.glob("*.pdf"))
-if not pdfs:
-    print("HATA: data/raw içinde PDF bulunamadı.")
-    sys.exit(1)
-
-for pdf_path in tqdm(pdfs, desc="PDF'ler işleniyor"):
-    pdf_name = pdf_path.name
-    
-    # Kural setinde bu PDF için bir kural var mı kontrol et
-    if pdf_name not in PDF_PROCESSING_RULES:
-        print(f"\nUYARI: '{pdf_name}' için bir işleme kuralı bulunamadı. Bu dosya atlanıyor.")
-        continue
-
-    try:
-        doc = fitz.open(pdf_path)
-        
-        # Sayfa numarası kuralını al
-        rules = PDF_PROCESSING_RULES[pdf_name]
-        start_page = rules['start_page'] - 1  # fitz 0'dan başlar
-        end_page = len(doc) - rules['skip_end_pages']
-        
-        print(f"\n'{pdf_name}' işleniyor: Sayfa {start_page + 1}'den Sayfa {end_page}'e kadar.")
-        
-        # Sadece belirlenen aralıktaki sayfaları oku
-        full_text = ""
-        for page_num in range(start_page, end_page):
-            if page_num < len(doc):
-                full_text += doc[page_num].get_text("text", sort=True)
-        
-        # Metni temizle
-        prepared_text = clean_text_basic(full_text)
-        
-        # Metni parçalara ayır
-        chunks = chunk_text(prepared_text, CHUNK_SIZE_IN_WORDS, CHUNK_OVERLAP_IN_WORDS)
-        
-        if not chunks:
-            print(f"UYARI: {pdf_name} için hiç chunk oluşturulamadı.")
+# --- 3. PARALEL + AKIŞ (STREAMING) İŞLEME ---
+
+# Her worker süreci açtığı PDF'leri saklar; aynı kitabın sonraki sayfa aralıkları için tekrar açmaz.
+_open_docs = {}
+
+def extract_pages(pdf_path, start, end):
+    """Worker: [start, end) aralığındaki sayfaları okuyup temizlenmiş metin listesi döndürür."""
+    doc = _open_docs.get(pdf_path)
+    if doc is None:
+        doc = _open_docs[pdf_path] = fitz.open(pdf_path)
+    pages = []
+    for page_num in range(start, min(end, len(doc))):
+        # Sayfa sonundaki tire, bir sonraki sayfaya bölünmüş kelimeyi gösterir; birleştirme
+        # iter_words'te yapılır, bu yüzden satır sonu tiresi burada korunur.
+        raw = doc[page_num].get_text("text", sort=True)
+        trailing_hyphen = raw.rstrip().endswith("-")
+        text = clean_text_basic(raw)
+        if trailing_hyphen and not text.endswith("-"):
+            text += "-"
+        pages.append(text)
+    return pages
+
+def page_ranges(start_page, end_page, size):
+    for s in range(start_page, end_page, size):
+        yield s, min(s + size, end_page)
+
+def iter_pages(executor, pdf_path, ranges, in_flight):
+    """
+    Sayfa aralıklarını havuza gönderir ve sayfaları kitap sırasıyla akıtır.
+    Aynı anda en fazla `in_flight` aralık işlenir/bekler; bellek kitap boyutundan bağımsızdır.
+    """
+    pending = deque()
+    ranges = iter(ranges)
+    for s, e in ranges:
+        pending.append(executor.submit(extract_pages, str(pdf_path), s, e))
+        if len(pending) >= in_flight:
+            break
+    while pending:
+        pages = pending.popleft().result()
+        nxt = next(ranges, None)
+        if nxt is not None:
+            pending.append(executor.submit(extract_pages, str(pdf_path), *nxt))
+        yield from pages
+
+def iter_words(pages):
+    """Sayfa metinlerinden kelime akışı; sayfa sonunda tireyle bölünmüş kelimeleri birleştirir."""
+    carry = ""
+    for text in pages:
+        words = text.split()
+        if not words:
             continue
-            
-        # Chunk'ları JSON'a yaz
-        items = []
-        for i, c in enumerate(chunks):
-            items.append({
-                "text": c,
-                "source": str(pdf_name),
-                "chunk_id": f"{pdf_path.stem}_{i}"
-            })
-            
-        out_file = CHUNK_PATH / (pdf_path.stem + ".json")
-        out_file.write_text(json.dumps(items, ensure_ascii=False, indent=2), encoding="utf-8")
-
-    except Exception as e:
-        print(f"HATA: {pdf_name} işlenirken bir hata oluştu: {e}")
-
-print("\n✅ Sayfa numarası kontrollü veri işleme ve parçalama tamamlandı!")
-print(f"Oluşturulan chunk dosyaları: {CHUNK_PATH}")
\ No newline at end of file
+        if carry:
+            words[0] = carry + words[0]
+            carry = ""
+        if words[-1].endswith("-") and len(words[-1]) > 1:
+            carry = words.pop()[:-1]
+        yield from words
+    if carry:
+        yield carry
+
+def iter_chunks(words, chunk_size, overlap):
+    """chunk_text ile aynı pencereleri, tüm metni bellekte tutmadan üretir."""
+    step = chunk_size - overlap
+    window = deque()
+    for word in words:
+        window.append(word)
+        if len(window) == chunk_size:
+            yield " ".join(window)
+            for _ in range(step):
+                window.popleft()
+    # Sondaki (kısa) pencereler
+    while window:
+        yield " ".join(window)
+        for _ in range(min(step, len(window))):
+            window.popleft()
+
+def write_jsonl(chunks, pdf_path):
+    """Chunk'ları satır başına bir JSON olacak şekilde yazar; yazılan chunk sayısını döndürür."""
+    out_file = CHUNK_PATH / (pdf_path.stem + ".jsonl")
+    tmp_file = out_file.with_suffix(".jsonl.tmp")
+    count = 0
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for i, c in enumerate(chunks):
+                item = {"text": c, "source": str(pdf_path.name), "chunk_id": f"{pdf_path.stem}_{i}"}
+                f.write(json.dumps(item, ensure_ascii=False))
+                f.write("\n")
+                count += 1
+        if count:
+            os.replace(tmp_file, out_file)
+        else:
+            tmp_file.unlink()
+    except BaseException:
+        # Yarım kalan (ör. bozuk PDF, Ctrl+C) geçici dosya chunk klasöründe kalmasın
+        tmp_file.unlink(missing_ok=True)
+        raise
+    return count
+
+# --- 4. ANA İŞLEM AKIŞI ---
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF'leri paralel olarak okuyup JSONL chunk dosyalarına çevirir.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Sayfa çıkarma için süreç sayısı (varsayılan: çekirdek sayısı).")
+    parser.add_argument("--pages-per-task", type=int, default=PAGES_PER_TASK)
+    parser.add_argument("--chunk-mode", choices=("tokens", "words"), default=CHUNK_MODE)
+    parser.add_argument("--window-tokens", type=int, default=CHUNK_WINDOW_IN_TOKENS,
+                        help="Token modunda chunk başına en fazla token ([CLS]/[SEP] hariç).")
+    parser.add_argument("--overlap-tokens", type=int, default=CHUNK_OVERLAP_IN_TOKENS)
+    args = parser.parse_args()
+
+    chunker = None
+    if args.chunk_mode == "tokens":
+        print(f"'{tc.EMBEDDING_MODEL_NAME}' tokenizer'ı yükleniyor...")
+        chunker = tc.TokenChunker(tc.load_tokenizer(), args.window_tokens, args.overlap_tokens)
+
+    RAW_PATH.mkdir(parents=True, exist_ok=True)
+    CHUNK_PATH.mkdir(parents=True, exist_ok=True)
+
+    # Başlamadan önce eski chunk'ları temizle
+    print("Eski chunk dosyaları temizleniyor...")
+    for pattern in ("*.json", "*.jsonl"):
+        for file in CHUNK_PATH.glob(pattern):
+            file.unlink()
+
+    pdfs = list(RAW_PATH.glob("*.pdf"))
+    if not pdfs:
+        print("HATA: data/raw içinde PDF bulunamadı.")
+        sys.exit(1)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for pdf_path in tqdm(pdfs, desc="PDF'ler işleniyor"):
+            pdf_name = pdf_path.name
+
+            # Kural setinde bu PDF için bir kural var mı kontrol et
+            if pdf_name not in PDF_PROCESSING_RULES:
+                print(f"\nUYARI: '{pdf_name}' için bir işleme kuralı bulunamadı. Bu dosya atlanıyor.")
+                continue
+
+            try:
+                with fitz.open(pdf_path) as doc:
+                    page_count = len(doc)
+
+                # Sayfa numarası kuralını al
+                rules = PDF_PROCESSING_RULES[pdf_name]
+                start_page = rules['start_page'] - 1  # fitz 0'dan başlar
+                end_page = page_count - rules['skip_end_pages']
+
+                print(f"\n'{pdf_name}' işleniyor: Sayfa {start_page + 1}'den Sayfa {end_page}'e kadar ({args.workers} süreç).")
+
+                # sayfalar -> kelimeler -> chunk'lar -> JSONL; her adım bir generator
+                ranges = page_ranges(start_page, end_page, args.pages_per_task)
+                pages = iter_pages(executor, pdf_path, ranges, args.workers * IN_FLIGHT_PER_WORKER)
+                if chunker is not None:
+                    chunks = chunker.chunks(tc.iter_sentences(iter_words(pages)))
+                else:
+                    chunks = iter_chunks(iter_words(pages), CHUNK_SIZE_IN_WORDS, CHUNK_OVERLAP_IN_WORDS)
+                count = write_jsonl(chunks, pdf_path)
+
+                if not count:
+                    print(f"UYARI: {pdf_name} için hiç chunk oluşturulamadı.")
+                    continue
+                print(f"{pdf_name}: {count} chunk yazıldı.")
+
+            except Exception as e:
+                print(f"HATA: {pdf_name} işlenirken bir hata oluştu: {e}")
+
+    print("\n✅ Sayfa numarası kontrollü veri işleme ve parçalama tamamlandı!")
+    print(f"Oluşturulan chunk dosyaları: {CHUNK_PATH}")
+
+if __name__ == "__main__":
+    main()
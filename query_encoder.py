@@ -0,0 +1,228 @@
+# query_encoder.py
+#
+# Sorgu embedding'i için çalışma zamanları. /chat başına en büyük CPU maliyeti
+# sorgunun fp32 mpnet modeliyle encode edilmesidir; burada aynı model
+# - 'int8'     : PyTorch dinamik kuantizasyon (Linear katmanlar int8),
+# - 'onnx'     : ONNX Runtime (fp32 graf, grafik optimizasyonları açık),
+# - 'onnx_int8': ONNX Runtime + dinamik int8 kuantizasyon
+# ile çalıştırılabilir. Hızlı çalışma zamanları fp32 embedding'leriyle bir kez
+# (ONNX'e aktarımda / ilk açılışta) karşılaştırılır (kosinüs benzerliği) ve sonuç
+# data/models altına yazılır; eşik altında kalırsa fp32'ye dönülür. Sonraki
+# açılışlarda fp32 referans modeli yüklenmez, ONNX çalışma zamanlarında PyTorch
+# modeli de yüklenmez (sadece tokenizer + ONNX oturumu).
+
+import os
+import json
+
+import numpy as np
+
+import model_store
+
+RUNTIMES = ("fp32", "int8", "onnx", "onnx_int8")
+
+# fp32 ile en düşük kabul edilen kosinüs benzerliği
+MIN_COSINE = 0.99
+
+# Doğrulama için örnek sorgular
+CALIBRATION_QUERIES = [
+    "Bilişsel çarpıtma nedir?",
+    "Depresyonun belirtileri nelerdir?",
+    "Terapide kullanılan temel teknikler hangileridir?",
+    "Kaygı bozukluğu ile nasıl başa çıkabilirim?",
+    "Otomatik düşünceler nasıl fark edilir?",
+    "Sınavdan düşük aldım, moralim çok bozuk.",
+    "Uyku problemlerim var, sürekli yorgun hissediyorum.",
+    "Merhaba, nasılsın?",
+]
+
+
+class QueryEncoder:
+    """
+    SentenceTransformer.encode ile aynı arayüz: encode(metinler) -> (n, boyut) float32.
+    runtime: 'fp32' (varsayılan), 'int8', 'onnx' ya da 'onnx_int8'.
+    """
+
+    def __init__(self, model_name, runtime="fp32", onnx_dir=model_store.MODELS_DIR, local_files_only=False):
+        if runtime not in RUNTIMES:
+            raise ValueError(f"Bilinmeyen çalışma zamanı: {runtime} (seçenekler: {', '.join(RUNTIMES)})")
+
+        self.model_name = model_name
+        self.runtime = runtime
+        self.model = None
+        self._session = None
+        # Karşılaştırma sonucunun bağlı olduğu dosya (ONNX grafı)
+        self.artifact = None
+
+        if runtime in ("onnx", "onnx_int8"):
+            path = os.path.join(onnx_dir, model_name.replace("/", "__") + ".onnx")
+            meta = self._read_onnx_meta(path)
+            if meta is None:
+                # PyTorch modeli sadece ONNX'e aktarım için bir kez yüklenir
+                meta = self._export_onnx(self._load_model(local_files_only), path)
+            from transformers import AutoTokenizer
+
+            self.tokenizer = AutoTokenizer.from_pretrained(meta["tokenizer"], local_files_only=True)
+            self.max_seq_length = meta["max_seq_length"]
+            if runtime == "onnx_int8":
+                path = self._quantize_onnx(path)
+            self._session = self._open_session(path)
+            self.dimension = self._session.get_outputs()[0].shape[-1]
+            self.artifact = path
+            return
+
+        import torch
+
+        model = self._load_model(local_files_only)
+        self.tokenizer = model.tokenizer
+        self.max_seq_length = model.max_seq_length
+        self.dimension = model.get_sentence_embedding_dimension()
+        if runtime == "int8":
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+
+    def _load_model(self, local_files_only):
+        from sentence_transformers import SentenceTransformer
+
+        # data/models altında safetensors kopyası varsa oradan yüklenir (bkz. model_store.py)
+        model = SentenceTransformer(model_store.resolve(self.model_name), device="cpu",
+                                    local_files_only=local_files_only)
+        model.eval()
+        return model
+
+    # --- ONNX ---
+    @staticmethod
+    def _read_onnx_meta(path):
+        """Aktarılmış graf ve yanındaki tokenizer / ayar dosyası varsa ayarları döndürür."""
+        meta_path = path + ".json"
+        if not (os.path.exists(path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _export_onnx(model, path):
+        import torch
+
+        print(f"📦 Embedding modeli ONNX'e aktarılıyor: {path}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        transformer = model[0].auto_model
+        dummy = model.tokenizer(["örnek cümle"], return_tensors="pt")
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                (dummy["input_ids"], dummy["attention_mask"]),
+                path + ".tmp",
+                input_names=["input_ids", "attention_mask"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "last_hidden_state": {0: "batch", 1: "sequence"},
+                },
+                opset_version=17,
+                dynamo=False,  # TorchScript dışa aktarıcı (dynamo onnxscript ister)
+            )
+        os.replace(path + ".tmp", path)
+        # Açılışta PyTorch modeli yüklenmeden kullanılabilsin diye tokenizer ve ayarlar yanına yazılır
+        tokenizer_dir = path[:-len(".onnx")] + "_tokenizer"
+        model.tokenizer.save_pretrained(tokenizer_dir)
+        meta = {"max_seq_length": model.max_seq_length, "tokenizer": tokenizer_dir}
+        with open(path + ".json.tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(path + ".json.tmp", path + ".json")
+        return meta
+
+    @staticmethod
+    def _quantize_onnx(path):
+        quantized = path[:-len(".onnx")] + ".int8.onnx"
+        if not os.path.exists(quantized):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            print(f"📦 ONNX modeli int8'e çevriliyor: {quantized}")
+            quantize_dynamic(path, quantized + ".tmp", weight_type=QuantType.QInt8)
+            os.replace(quantized + ".tmp", quantized)
+        return quantized
+
+    @staticmethod
+    def _open_session(path):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def _encode_onnx(self, texts):
+        inputs = self.tokenizer(texts, return_tensors="np", truncation=True, padding=True,
+                                max_length=self.max_seq_length)
+        mask = inputs["attention_mask"].astype("int64")
+        hidden = self._session.run(["last_hidden_state"], {
+            "input_ids": inputs["input_ids"].astype("int64"),
+            "attention_mask": mask,
+        })[0]
+        # SentenceTransformer'daki mean pooling (padding token'ları hariç)
+        weights = mask[:, :, None].astype("float32")
+        return (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts, batch_size=32):
+        if self._session is None:
+            return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True,
+                                     show_progress_bar=False).astype("float32")
+        parts = [self._encode_onnx(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        if not parts:
+            return np.zeros((0, self.dimension), dtype="float32")
+        return np.vstack(parts).astype("float32")
+
+
+def cosine_similarities(a, b):
+    """Satır satır kosinüs benzerliği."""
+    a = np.asarray(a, dtype="float32")
+    b = np.asarray(b, dtype="float32")
+    na = np.linalg.norm(a, axis=1)
+    nb = np.linalg.norm(b, axis=1)
+    return (a * b).sum(axis=1) / np.clip(na * nb, 1e-12, None)
+
+
+def verify_parity(candidate, reference, texts=CALIBRATION_QUERIES):
+    """Hızlı çalışma zamanının fp32 ile en düşük kosinüs benzerliğini döndürür."""
+    return float(cosine_similarities(candidate.encode(texts), reference.encode(texts)).min())
+
+
+def check_parity(model_name, runtime, local_files_only=False):
+    """
+    Hızlı çalışma zamanını fp32 ile bir kez karşılaştırır ve sonucu modelin
+    yanına yazar (model_store.save_parity). (sonuç, aday, referans) döndürür.
+    """
+    reference = QueryEncoder(model_name, "fp32", local_files_only=local_files_only)
+    candidate = QueryEncoder(model_name, runtime, local_files_only=local_files_only)
+    verdict = {"min_cosine": verify_parity(candidate, reference), "threshold": MIN_COSINE}
+    verdict = model_store.save_parity(model_name, runtime, verdict, artifact=candidate.artifact)
+    return verdict, candidate, reference
+
+
+def load_query_encoder(model_name, runtime="fp32", min_cosine=MIN_COSINE, local_files_only=False):
+    """
+    İstenen çalışma zamanıyla sorgu encoder'ını yükler. fp32 dışındaki çalışma
+    zamanları için kayıtlı karşılaştırma sonucu kullanılır; sonuç yoksa (ilk
+    açılış) bir kez hesaplanır. Benzerlik eşiğin altındaysa fp32'ye dönülür.
+    """
+    if runtime == "fp32":
+        return QueryEncoder(model_name, "fp32", local_files_only=local_files_only)
+
+    candidate = reference = None
+    try:
+        verdict = model_store.load_parity(model_name, runtime)
+        if verdict is None:
+            print(f"🔬 '{runtime}' embedding modeli fp32 ile karşılaştırılıyor (bir kez)...")
+            verdict, candidate, reference = check_parity(model_name, runtime, local_files_only)
+        similarity = verdict["min_cosine"]
+        if similarity >= min_cosine and candidate is None:
+            candidate = QueryEncoder(model_name, runtime, local_files_only=local_files_only)
+    except Exception as e:
+        print(f"⚠️ '{runtime}' embedding modeli yüklenemedi ({e}); fp32 kullanılacak.")
+        return reference or QueryEncoder(model_name, "fp32", local_files_only=local_files_only)
+
+    if similarity < min_cosine:
+        print(f"⚠️ '{runtime}' embedding modeli fp32'den fazla sapıyor (min kosinüs {similarity:.4f}); fp32 kullanılacak.")
+        return reference or QueryEncoder(model_name, "fp32", local_files_only=local_files_only)
+    print(f"✅ '{runtime}' embedding modeli doğrulandı (fp32 ile min kosinüs {similarity:.4f}).")
+    return candidate
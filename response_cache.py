@@ -0,0 +1,134 @@
+# response_cache.py
+#
+# Geçmişsiz (sohbetin ilk mesajı) genel sorular için anlamsal cevap önbelleği.
+# "Depresyon belirtileri nelerdir?" gibi açılış soruları sık tekrar eder; yeni
+# sorgunun embedding'i önbellekteki bir sorguya kosinüs eşiği kadar yakınsa
+# Gemini'ye gidilmeden kayıtlı cevap döndürülür.
+#
+# Cevaplar kullanıcının adına hitap eder; kaydederken ad bir yer tutucuyla
+# değiştirilir, dönerken yeni kullanıcının adı yerine konur. Adın ek aldığı
+# cevaplar ("Ayşe'nin") ünlü uyumu başka bir adla bozulacağı için saklanmaz.
+
+import re
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+NAME_PLACEHOLDER = "\x00NAME\x00"
+
+
+def depersonalize(reply, name):
+    """Addan arındırılmış cevap şablonu; ad ek almışsa None (önbelleğe uygun değil)."""
+    if not name:
+        return reply
+    escaped = re.escape(name)
+    if re.search(r"(?<!\w)" + escaped + r"['’]\w", reply):
+        return None
+    return re.sub(r"(?<!\w)" + escaped + r"(?!\w)", NAME_PLACEHOLDER, reply)
+
+
+def personalize(template, name):
+    return template.replace(NAME_PLACEHOLDER, name or "")
+
+
+class SemanticResponseCache:
+    """
+    Sorgu embedding'i -> (cevap şablonu, kaynaklar). En yakın kayıt kosinüs
+    benzerliğiyle bulunur; boyut (LRU) ve süre (TTL) ile sınırlıdır.
+    """
+
+    def __init__(self, max_size=512, ttl_seconds=6 * 3600, threshold=0.92):
+        self.max_size = max(1, int(max_size))
+        self.ttl = float(ttl_seconds) if ttl_seconds else None
+        self.threshold = float(threshold)
+        self._entries = OrderedDict()  # slot -> {"query", "template", "sources", "k", "stored_at"}
+        self._matrix = None            # (max_size, boyut) birim vektörler; slot = satır
+        self._free = list(range(self.max_size - 1, -1, -1))
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype="float32").reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _release(self, slot):
+        del self._entries[slot]
+        self._matrix[slot] = 0.0
+        self._free.append(slot)
+
+    def get(self, vector, k, name):
+        """Yakın bir sorgu varsa (kişiselleştirilmiş cevap, kaynaklar, benzerlik), yoksa None."""
+        query = self._unit(vector)
+        now = time.time()
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+            slots = np.fromiter(self._entries.keys(), dtype="int64", count=len(self._entries))
+            similarities = self._matrix[slots] @ query
+            for i in np.argsort(-similarities):
+                if similarities[i] < self.threshold:
+                    break
+                slot = int(slots[i])
+                entry = self._entries[slot]
+                if self.ttl is not None and now - entry["stored_at"] > self.ttl:
+                    self._release(slot)
+                    self.expirations += 1
+                    continue
+                if entry["k"] != k:
+                    continue
+                self._entries.move_to_end(slot)
+                self.hits += 1
+                return personalize(entry["template"], name), list(entry["sources"]), float(similarities[i])
+            self.misses += 1
+            return None
+
+    def put(self, vector, query, reply, sources, k, name):
+        template = depersonalize(reply, name)
+        if template is None:
+            return False
+        unit = self._unit(vector)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_size, len(unit)), dtype="float32")
+            if not self._free:
+                oldest = next(iter(self._entries))
+                self._release(oldest)
+                self.evictions += 1
+            slot = self._free.pop()
+            self._matrix[slot] = unit
+            self._entries[slot] = {
+                "query": query,
+                "template": template,
+                "sources": list(sources),
+                "k": k,
+                "stored_at": time.time(),
+            }
+            self.stores += 1
+        return True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,240 @@
+# serve.py
+#
+# Çok worker'lı çalışma (preload + fork). `uvicorn api:app --workers N` her
+# worker'da modelleri ve index'i ayrı ayrı yükler; burada ise:
+# 1. Ana süreç modelleri, FAISS index'ini ve chunk store'u bir kez yükler.
+#    Chunk store salt okunur mmap ile açılır. Index'te sadece mmap ile açılabilen
+#    türler (IVF, faiss >= 1.10'da flat / sq8; bkz. vector_index.py) dosyadan
+#    eşlenir; diğerleri ana sürecin belleğine okunur ve worker'larla aşağıdaki
+#    copy-on-write yoluyla paylaşılır.
+# 2. Torch parametreleri dondurulur (requires_grad=False) ve Python nesneleri
+#    gc.freeze() ile kalıcı nesil'e alınır; böylece worker'lar bu sayfalara
+#    yazmaz ve copy-on-write ile paylaşılmaya devam eder.
+# 3. Dinlenen soket açılır ve N worker fork edilir; her worker aynı soketten
+#    uvicorn çalıştırır. Ana süreç worker'ları izler, düşeni artan bekleme ile
+#    yeniden başlatır (açılışta çöken worker sürekli fork edilmesin; üst üste
+#    --max-restarts kez erken çöken worker bırakılır) ve her worker'ın RSS / USS
+#    değerlerini düzenli olarak yazar.
+#
+# ONNX Runtime çalışma zamanları fork'tan sağ çıkmadığı için ön yüklemede 'int8'e
+# çevrilir; istenen ve kullanılan çalışma zamanı açılışta yazılır, /readyz ve
+# /metrics'te (chatbot_runtime_info) görünür.
+#
+# Kullanım: python serve.py --workers 4 --port 8000
+# Sadece fork destekleyen sistemlerde (Linux, macOS) çalışır.
+
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+
+from memory_stats import format_memory, process_memory
+
+parser = argparse.ArgumentParser(description="API'yi paylaşımlı bellekle çok worker'lı çalıştırır.")
+parser.add_argument("--host", default="0.0.0.0")
+parser.add_argument("--port", type=int, default=8000)
+parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+parser.add_argument("--threads-per-worker", type=int, default=None,
+                    help="Worker başına torch thread sayısı (varsayılan: çekirdek / worker).")
+parser.add_argument("--memory-report-interval", type=float, default=60.0,
+                    help="Worker bellek raporu aralığı (saniye).")
+parser.add_argument("--restart-backoff", type=float, default=1.0,
+                    help="Çöken worker'ı yeniden başlatmadan önceki ilk bekleme (saniye); her çöküşte iki katına çıkar.")
+parser.add_argument("--max-restart-backoff", type=float, default=60.0)
+parser.add_argument("--max-restarts", type=int, default=5,
+                    help="Üst üste bu kadar erken çöken worker yeniden başlatılmaz.")
+parser.add_argument("--stable-after", type=float, default=60.0,
+                    help="Bu kadar saniye çalışan worker'ın çöküş sayacı sıfırlanır.")
+
+
+def use_fork_safe_runtimes():
+    """
+    ONNX Runtime oturumlarının thread havuzu fork'tan sağ çıkmaz; ön yüklemede
+    torch çalışma zamanları (int8 ağırlıklar fp32'nin ~1/4'ü) kullanılır.
+    Değiştirilen ayarları {değişken: istenen çalışma zamanı} olarak döndürür.
+    """
+    overrides = {}
+    for var, default in (("EMBEDDING_RUNTIME", "onnx"), ("CRISIS_RUNTIME", "int8")):
+        runtime = os.environ.get(var, default)
+        if runtime.startswith("onnx"):
+            print(f"⚠️ {var}={runtime} fork ile paylaşılamaz; ön yüklemede 'int8' kullanılacak.")
+            os.environ[var] = "int8"
+            overrides[var] = runtime
+    return overrides
+
+
+def freeze_models(api):
+    modules = []
+    if api.embedding_model is not None and api.embedding_model.model is not None:
+        modules.append(api.embedding_model.model)
+    classifier = api.crisis_detector.classifier
+    if classifier is not None and classifier.model is not None:
+        modules.append(classifier.model)
+    n_params = 0
+    for module in modules:
+        module.eval()
+        for param in module.parameters():
+            param.requires_grad_(False)
+            n_params += param.numel()
+    return n_params
+
+
+def run_worker(api, sock, threads):
+    import torch
+    import uvicorn
+
+    torch.set_num_threads(threads)
+    config = uvicorn.Config(api.app, lifespan="on", log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn_worker(api, sock, threads):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(api, sock, threads)
+        except BaseException as e:
+            print(f"❌ Worker {os.getpid()} hata ile kapandı: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def report_memory(workers):
+    master = process_memory()
+    print(f"📊 ana süreç (pid {os.getpid()}): {format_memory(master)}")
+    total_uss = 0.0
+    for pid, worker_no in sorted(workers.items(), key=lambda item: item[1]):
+        memory = process_memory(pid)
+        if memory is not None:
+            total_uss += memory["uss_mb"]
+        print(f"📊 worker {worker_no} (pid {pid}): {format_memory(memory)}")
+    if master is not None:
+        print(f"📊 toplam USS (ana süreç + {len(workers)} worker): {master['uss_mb'] + total_uss:.0f} MB")
+
+
+def restart_delay(failures, base, limit):
+    """failures'ıncı üst üste çöküşten sonraki bekleme: base, 2*base, 4*base ... (en fazla limit)."""
+    return min(limit, base * 2 ** max(0, failures - 1))
+
+
+def supervise(api, sock, workers, threads, args):
+    """
+    Worker'ları izler. Düşen worker, üst üste erken çöküş sayısına göre artan
+    beklemeyle yeniden başlatılır; --stable-after süresinden uzun çalışmış bir
+    worker'ın sayacı sıfırlanır. Sayaç --max-restarts'ı geçerse worker bırakılır;
+    hiç worker kalmazsa ana süreç hata koduyla çıkar.
+    """
+    interval = args.memory_report_interval
+    stopping = False
+    started = {pid: time.monotonic() for pid in workers}
+    failures = {}    # worker_no -> üst üste erken çöküş sayısı
+    scheduled = {}   # worker_no -> yeniden başlatma zamanı (monotonic)
+    abandoned = 0
+
+    def forward(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+
+    # İlk rapor worker'lar ayağa kalktıktan kısa süre sonra
+    next_report = time.monotonic() + min(5.0, interval)
+    while workers or (scheduled and not stopping):
+        now = time.monotonic()
+        for worker_no, at in list(scheduled.items()):
+            if stopping:
+                scheduled.clear()
+            elif now >= at:
+                del scheduled[worker_no]
+                pid = spawn_worker(api, sock, threads)
+                workers[pid] = worker_no
+                started[pid] = time.monotonic()
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid, status = 0, 0
+        if pid:
+            worker_no = workers.pop(pid)
+            uptime = time.monotonic() - started.pop(pid, now)
+            if stopping:
+                continue
+            failures[worker_no] = 1 if uptime >= args.stable_after else failures.get(worker_no, 0) + 1
+            if failures[worker_no] > args.max_restarts:
+                abandoned += 1
+                print(f"❌ Worker {worker_no} (pid {pid}) üst üste {failures[worker_no]} kez erken kapandı "
+                      f"(durum {status}); yeniden başlatılmayacak.")
+                continue
+            delay = restart_delay(failures[worker_no], args.restart_backoff, args.max_restart_backoff)
+            print(f"⚠️ Worker {worker_no} (pid {pid}) {uptime:.1f} sn sonra kapandı (durum {status}); "
+                  f"{delay:.1f} sn sonra yeniden başlatılacak.")
+            scheduled[worker_no] = time.monotonic() + delay
+            continue
+        if interval > 0 and time.monotonic() >= next_report:
+            report_memory(workers)
+            next_report = time.monotonic() + interval
+        time.sleep(0.5)
+    return abandoned
+
+
+def main():
+    args = parser.parse_args()
+    if not hasattr(os, "fork"):
+        sys.exit("Bu sistemde fork yok; 'uvicorn api:app --workers N' kullanın (bellek paylaşılmaz).")
+
+    overrides = use_fork_safe_runtimes()
+
+    import torch
+    # Ana süreçte OpenMP thread havuzu oluşmasın; fork sonrası çocukta kilitlenmeye yol açar
+    torch.set_num_threads(1)
+
+    import api
+    import database
+
+    # /readyz ve /metrics istenen çalışma zamanını da göstersin
+    api.RUNTIME_OVERRIDES.update(overrides)
+    api.load_resources()
+    if not api.startup_state["ready"]:
+        sys.exit("❌ Açılış başarısız; worker'lar başlatılmadı.")
+
+    n_params = freeze_models(api)
+    print(f"🧊 {n_params / 1e6:.0f}M torch parametresi donduruldu.")
+
+    # SQLite bağlantıları fork'tan sonra paylaşılmamalı; her worker kendi bağlantısını açar
+    database.close_connection()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # Buraya kadar oluşan nesneler GC taramasında dokunulmasın (copy-on-write'ı tetiklemesin)
+    gc.collect()
+    gc.freeze()
+
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+    print(f"🚀 {args.workers} worker başlatılıyor ({args.host}:{args.port}, worker başına {threads} thread)...")
+    workers = {}
+    for worker_no in range(1, args.workers + 1):
+        workers[spawn_worker(api, sock, threads)] = worker_no
+
+    abandoned = supervise(api, sock, workers, threads, args)
+    if abandoned:
+        sys.exit(f"❌ {abandoned} worker sürekli çöktüğü için bırakıldı; tüm worker'lar kapandı.")
+    print("👋 Tüm worker'lar kapandı.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# session_cache.py
+#
+# API tarafında oturum geçmişi. İstemci her turda tüm geçmişi göndermek yerine
+# sadece session_id ve yeni mesajı gönderir; geçmiş psychbot.db'den okunur ve
+# yakın zamanda aktif olan oturumlar bellekte (LRU) tutulur. Yeni mesajlar hem
+# veritabanına yazılır hem de önbellekteki listeye eklenir, böylece bir tur
+# O(1) iş yapar.
+#
+# Oturum başına en fazla max_messages mesaj bellekte kalır; daha eskiler
+# listeden düşer ve sadece veritabanında durur. Önbellekte olmayan oturum da
+# veritabanından en fazla max_messages mesaj okunarak yüklenir. Düşen mesaj sayısı (offset)
+# geçmişle birlikte döner; özet kapsamı (history_compactor) mutlak sırayla
+# hesaplandığı için bu sayı gereklidir. Prompt zaten son turlar + özetten
+# oluştuğu için düşen mesajlar özete çoktan girmiş olur.
+
+import threading
+from collections import OrderedDict
+
+import database as db
+
+
+class SessionHistoryCache:
+    def __init__(self, max_sessions=256, max_messages=200):
+        self.max_sessions = max(1, int(max_sessions))
+        self.max_messages = max(1, int(max_messages))
+        self._sessions = OrderedDict()  # session_id -> {"offset": int, "messages": [{"role", "content"}, ...]}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_id):
+        """
+        (offset, mesajlar): oturumun son mesajları (eskiden yeniye) ve bunlardan
+        önce gelen, listede olmayan mesaj sayısı. Gerekirse veritabanından yükler.
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._sessions.move_to_end(session_id)
+                self.hits += 1
+                return entry["offset"], list(entry["messages"])
+            self.misses += 1
+
+        # Uzun oturumlarda da sadece son max_messages mesaj okunur; daha eskilerin sayısı
+        # (offset) imleçten önceki kayıtlar sayılarak bulunur
+        messages, cursor = db.get_latest_messages(session_id, self.max_messages)
+        offset = db.count_messages_before(session_id, cursor) if cursor else 0
+        with self._lock:
+            # Bu arada başka bir istek yüklediyse onunkini koru
+            entry = self._sessions.setdefault(session_id, {"offset": offset, "messages": messages})
+            self._trim(entry)
+            self._sessions.move_to_end(session_id)
+            self._evict()
+            return entry["offset"], list(entry["messages"])
+
+    def append(self, session_id, messages):
+        """
+        [(role, content), ...] mesajlarını tek transaction'da veritabanına yazar ve
+        (önbellekteyse) oturum listesine ekler. Kullanıcı mesajı ve cevabı birlikte
+        yazılır; yarıda kalan bir tur geçmişte cevapsız mesaj bırakmaz.
+        """
+        db.save_messages(session_id, messages)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                entry["messages"].extend({"role": role, "content": content} for role, content in messages)
+                self._trim(entry)
+                self._sessions.move_to_end(session_id)
+
+    def _trim(self, entry):
+        extra = len(entry["messages"]) - self.max_messages
+        if extra > 0:
+            del entry["messages"][:extra]
+            entry["offset"] += extra
+
+    def _evict(self):
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            cached_messages = sum(len(entry["messages"]) for entry in self._sessions.values())
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "max_messages": self.max_messages,
+            "messages": cached_messages,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+import pytest
+
+# database import edilirken tabloları oluşturur; depodaki psychbot.db'ye dokunulmasın
+os.environ.setdefault("PSYCHBOT_DB", os.path.join(tempfile.mkdtemp(prefix="psychbot-test-"), "import.db"))
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Test başına boş, geçici bir psychbot.db."""
+    previous = database.DB_NAME
+    database.close_connection()
+    database.DB_NAME = str(tmp_path / "test.db")
+    database.init_db()
+    yield database
+    database.close_connection()
+    database.DB_NAME = previous
+
+
+@pytest.fixture
+def session_id(db):
+    db.register_user("test", "parola", "Test", 30, "Belirtilmedi")
+    user_id = db.login_user("test", "parola")[0]
+    return db.create_session(user_id, "Test")
@@ -0,0 +1,35 @@
+import sqlite3
+
+
+def test_migrations_run_once_and_reach_latest_version(db):
+    conn = sqlite3.connect(db.DB_NAME)
+    assert db.migrate(conn) == len(db.MIGRATIONS)
+    assert db.migrate(conn) == len(db.MIGRATIONS)
+    conn.close()
+
+
+def test_messages_keyset_pagination(db, session_id):
+    for i in range(5):
+        db.save_messages(session_id, [("user", f"u{i}"), ("model", f"m{i}")])
+
+    page, cursor = db.get_latest_messages(session_id, 4)
+    assert [m["content"] for m in page] == ["u3", "m3", "u4", "m4"]
+    assert db.count_messages_before(session_id, cursor) == 6
+
+    older, cursor = db.get_messages_before(session_id, cursor, 4)
+    assert [m["content"] for m in older] == ["u1", "m1", "u2", "m2"]
+    oldest, cursor = db.get_messages_before(session_id, cursor, 4)
+    assert [m["content"] for m in oldest] == ["u0", "m0"]
+    assert cursor is None
+
+
+def test_sessions_keyset_pagination(db, session_id):
+    user_id = db.login_user("test", "parola")[0]
+    for i in range(3):
+        db.create_session(user_id, f"Sohbet {i}")
+
+    first, cursor = db.get_user_sessions_page(user_id, limit=2)
+    rest, end = db.get_user_sessions_page(user_id, limit=2, cursor=cursor)
+    titles = [title for _, title in first + rest]
+    assert titles == ["Sohbet 2", "Sohbet 1", "Sohbet 0", "Test"]
+    assert end is None
@@ -0,0 +1,47 @@
+import numpy as np
+
+import embedding_cache
+from embedding_cache import EmbeddingCache
+
+
+def test_queries_are_normalized():
+    cache = EmbeddingCache(max_size=4)
+    cache.put("MERHABA,  nasılsın? ", [1.0, 2.0])
+    assert np.array_equal(cache.get("merhaba, nasılsın?"), np.array([1.0, 2.0], dtype="float32"))
+
+
+def test_least_recently_used_is_evicted():
+    cache = EmbeddingCache(max_size=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")
+    cache.put("c", [3.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.evictions == 1
+
+
+def test_expired_entries_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: now[0])
+    cache = EmbeddingCache(max_size=4, ttl_seconds=10)
+    cache.put("a", [1.0])
+
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "cache.npz")
+    cache = EmbeddingCache(max_size=4, path=path)
+    cache.put("a", [1.0, 2.0])
+    cache.put("b", [3.0, 4.0])
+    assert cache.save() == 2
+    # Geçici dosya kalmaz
+    assert [p.name for p in tmp_path.iterdir()] == ["cache.npz"]
+
+    restored = EmbeddingCache(max_size=4, path=path)
+    assert restored.load() == 2
+    assert np.array_equal(restored.get("b"), np.array([3.0, 4.0], dtype="float32"))
@@ -0,0 +1,110 @@
+import asyncio
+
+from history_compactor import HistoryCompactor
+
+
+def conversation(n_turns, size=40):
+    messages = []
+    for i in range(n_turns):
+        messages.append({"role": "user", "content": f"u{i} " + "x" * size})
+        messages.append({"role": "model", "content": f"m{i} " + "x" * size})
+    return messages
+
+
+class Summaries:
+    """Bellekte session_summaries tablosu ve sahte (async) özetleyici."""
+
+    def __init__(self, delay=0.0):
+        self.rows = {}
+        self.calls = []
+        self.delay = delay
+
+    def load(self, session_id):
+        return self.rows.get(session_id)
+
+    def save(self, session_id, summary, covered_count):
+        self.rows[session_id] = (summary, covered_count)
+
+    async def summarize(self, previous, messages):
+        self.calls.append([m["content"].split()[0] for m in messages])
+        await asyncio.sleep(self.delay)
+        return (previous + " " if previous else "") + "+".join(m["content"].split()[0] for m in messages)
+
+    def compactor(self, keep_last_turns=2):
+        return HistoryCompactor(self.summarize, keep_last_turns, load_summary=self.load, save_summary=self.save)
+
+
+def test_last_turns_are_always_kept_even_over_budget():
+    store = Summaries()
+    messages = conversation(2, size=400)
+    summary, recent = asyncio.run(store.compactor(keep_last_turns=2).build(1, messages, budget_tokens=1))
+    assert (summary, recent) == ("", messages)
+    assert store.calls == []
+
+
+def test_pending_messages_sent_verbatim_when_they_fit():
+    store = Summaries()
+    messages = conversation(4)
+    summary, recent = asyncio.run(store.compactor().build(1, messages, budget_tokens=10_000))
+    assert recent == messages
+    assert store.calls == []
+
+
+def test_pending_messages_are_summarized_before_dropping():
+    store = Summaries()
+    messages = conversation(4)
+    summary, recent = asyncio.run(store.compactor().build(1, messages, budget_tokens=10))
+    assert recent == messages[4:]
+    assert summary == "u0+m0+u1+m1"
+    assert store.rows[1] == (summary, 4)
+
+
+def test_summary_coverage_is_absolute_across_offset():
+    # Oturum önbelleği ilk 4 mesajı düşürmüş; özet ilk 6 mesajı kapsıyor
+    store = Summaries()
+    store.rows[1] = ("eski özet", 6)
+    messages = conversation(5)[4:]  # mutlak 4..9
+    summary, recent = asyncio.run(store.compactor().build(1, messages, budget_tokens=10, offset=4))
+    assert summary == "eski özet"
+    assert recent == messages[2:]
+    assert store.calls == []
+
+
+def test_update_folds_only_new_messages():
+    store = Summaries()
+    compactor = store.compactor()
+    asyncio.run(compactor.update(1, conversation(3)))
+    asyncio.run(compactor.update(1, conversation(4)))
+    assert store.calls == [["u0", "m0"], ["u1", "m1"]]
+    assert store.rows[1] == ("u0+m0 u1+m1", 4)
+
+
+def test_build_does_not_summarize_while_update_in_flight():
+    store = Summaries(delay=0.05)
+    compactor = store.compactor()
+    messages = conversation(4)
+
+    async def race():
+        update = asyncio.ensure_future(compactor.update(1, messages))
+        await asyncio.sleep(0)  # update oturumu sahiplensin
+        built = await compactor.build(1, messages, budget_tokens=10)
+        return built, await update
+
+    (summary, recent), updated = asyncio.run(race())
+    assert updated
+    # Aynı aralık bir kez özetlenir; build sadece son turları gönderir
+    assert store.calls == [["u0", "m0", "u1", "m1"]]
+    assert recent == messages[4:]
+
+
+def test_summarizer_failure_keeps_messages():
+    store = Summaries()
+
+    async def failing(previous, messages):
+        raise RuntimeError("LLM yok")
+
+    compactor = HistoryCompactor(failing, 2, load_summary=store.load, save_summary=store.save)
+    messages = conversation(4)
+    summary, recent = asyncio.run(compactor.build(1, messages, budget_tokens=10))
+    assert recent == messages
+    assert 1 not in store.rows
@@ -0,0 +1,128 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from llm_backend import LLMBackend, LLMClient
+
+
+class ServiceUnavailable(Exception):
+    """google.api_core'daki geçici hata ile aynı ad (isimle tanınır)."""
+
+
+class FakeBackend(LLMBackend):
+    """
+    Her çağrı sıradaki davranışı uygular: saniye (bekle ve cevap ver) ya da
+    fırlatılacak hata. Verilen süre sınırları ve kapatılan akışlar kaydedilir.
+    """
+
+    name = "fake"
+
+    def __init__(self, *behaviours, stream_parts=("a", "b", "c")):
+        self.behaviours = list(behaviours)
+        self.stream_parts = stream_parts
+        self.timeouts = []
+        self.closed = []
+        self._lock = threading.Lock()
+
+    def _next(self, timeout):
+        with self._lock:
+            self.timeouts.append(timeout)
+            behaviour = self.behaviours.pop(0) if self.behaviours else 0.0
+            call = len(self.timeouts)
+        if isinstance(behaviour, Exception):
+            raise behaviour
+        time.sleep(behaviour)
+        return call
+
+    def generate(self, system_instruction, history, message, timeout=None):
+        return f"cevap {self._next(timeout)}"
+
+    def stream(self, system_instruction, history, message, timeout=None):
+        call = self._next(timeout)
+        try:
+            for part in self.stream_parts:
+                yield part
+        finally:
+            self.closed.append(call)
+
+
+def client(backend, **options):
+    options = {"timeout_s": 1.0, "max_retries": 2, "backoff_s": 0.001, "max_backoff_s": 0.001, **options}
+    return LLMClient(backend, **options)
+
+
+def test_transient_errors_are_retried():
+    backend = FakeBackend(ServiceUnavailable(), ConnectionError(), 0.0)
+    llm = client(backend)
+    assert asyncio.run(llm.generate("", [], "soru")) == "cevap 3"
+    assert llm.counters["retries"] == 2
+
+
+def test_other_errors_are_not_retried():
+    backend = FakeBackend(ValueError("geçersiz"), 0.0)
+    llm = client(backend)
+    with pytest.raises(ValueError):
+        asyncio.run(llm.generate("", [], "soru"))
+    assert len(backend.timeouts) == 1
+    assert llm.counters["errors"] == 1
+
+
+def test_one_deadline_covers_all_retries():
+    # Her deneme süre sınırına takılır; tekrarlar süreyi uzatmamalı
+    backend = FakeBackend(0.5, 0.5, 0.5)
+    llm = client(backend, timeout_s=0.3, max_retries=5)
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        asyncio.run(llm.generate("", [], "soru"))
+    assert time.perf_counter() - start < 0.45
+    assert len(backend.timeouts) == 1
+    assert backend.timeouts[0] <= 0.3
+
+
+def test_retry_attempts_get_the_remaining_time():
+    backend = FakeBackend(ServiceUnavailable(), 0.0)
+    llm = client(backend, timeout_s=1.0)
+    asyncio.run(llm.complete("özetle"))
+    first, second = backend.timeouts
+    assert first <= 1.0
+    assert second < first
+
+
+def test_complete_goes_through_retries():
+    backend = FakeBackend(ServiceUnavailable(), 0.0)
+    llm = client(backend)
+    assert asyncio.run(llm.complete("özetle")) == "cevap 2"
+    assert llm.counters["retries"] == 1
+
+
+def test_hedge_wins_and_loser_stream_is_closed():
+    backend = FakeBackend(0.0, 0.4, 0.0)
+    llm = client(backend, hedge=True, hedge_min_samples=1, hedge_max_ratio=1.0)
+
+    async def run():
+        # İlk çağrı hedge için bir gecikme örneği bırakır
+        assert [p async for p in llm.stream("", [], "soru")] == ["a", "b", "c"]
+        parts = [p async for p in llm.stream("", [], "soru")]
+        await asyncio.sleep(0.5)  # yavaş deneme bitsin
+        return parts
+
+    assert asyncio.run(run()) == ["a", "b", "c"]
+    assert llm.counters["hedges"] == 1
+    assert llm.counters["hedge_wins"] == 1
+    # Kazanan okunup kapandı; kaybeden bitince kapatıldı
+    assert sorted(backend.closed) == [1, 2, 3]
+
+
+def test_abandoned_stream_is_closed():
+    backend = FakeBackend(0.0)
+    llm = client(backend)
+
+    async def run():
+        stream = llm.stream("", [], "soru")
+        assert await stream.__anext__() == "a"
+        await stream.aclose()  # istemci koptu
+
+    asyncio.run(run())
+    assert backend.closed == [1]
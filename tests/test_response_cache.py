@@ -0,0 +1,64 @@
+import numpy as np
+
+import response_cache
+from response_cache import SemanticResponseCache, depersonalize, personalize
+
+
+def vec(*values):
+    return np.array(values, dtype="float32")
+
+
+def test_hit_above_threshold_and_miss_below():
+    cache = SemanticResponseCache(max_size=4, threshold=0.9)
+    cache.put(vec(1, 0), "Depresyon nedir?", "Cevap", ["kitap.pdf"], 3, "")
+
+    reply, sources, similarity = cache.get(vec(1, 0.1), 3, "")
+    assert (reply, sources) == ("Cevap", ["kitap.pdf"])
+    assert similarity > 0.9
+    assert cache.get(vec(0, 1), 3, "") is None
+
+
+def test_entries_are_keyed_by_k():
+    cache = SemanticResponseCache(max_size=4, threshold=0.9)
+    cache.put(vec(1, 0), "soru", "Cevap", [], 3, "")
+    assert cache.get(vec(1, 0), 5, "") is None
+    assert cache.get(vec(1, 0), 3, "") is not None
+
+
+def test_reply_is_personalized_for_the_new_user():
+    cache = SemanticResponseCache(max_size=4, threshold=0.9)
+    cache.put(vec(1, 0), "soru", "Merhaba Ayşe, nasılsın?", [], 3, "Ayşe")
+    assert cache.get(vec(1, 0), 3, "Mehmet")[0] == "Merhaba Mehmet, nasılsın?"
+
+
+def test_reply_with_suffixed_name_is_not_stored():
+    cache = SemanticResponseCache(max_size=4, threshold=0.9)
+    assert not cache.put(vec(1, 0), "soru", "Ayşe'nin sorusu güzel.", [], 3, "Ayşe")
+    assert len(cache) == 0
+    assert depersonalize("Ayşe’ye selam", "Ayşe") is None
+    assert personalize(depersonalize("Selam Ayşe", "Ayşe"), "Can") == "Selam Can"
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = SemanticResponseCache(max_size=4, ttl_seconds=60, threshold=0.9)
+    cache.put(vec(1, 0), "soru", "Cevap", [], 3, "")
+
+    now[0] += 59
+    assert cache.get(vec(1, 0), 3, "") is not None
+    now[0] += 2
+    assert cache.get(vec(1, 0), 3, "") is None
+    assert cache.expirations == 1
+    assert len(cache) == 0
+
+
+def test_oldest_entry_is_evicted_when_full():
+    cache = SemanticResponseCache(max_size=2, threshold=0.99)
+    cache.put(vec(1, 0, 0), "a", "A", [], 3, "")
+    cache.put(vec(0, 1, 0), "b", "B", [], 3, "")
+    cache.put(vec(0, 0, 1), "c", "C", [], 3, "")
+
+    assert cache.evictions == 1
+    assert cache.get(vec(1, 0, 0), 3, "") is None
+    assert cache.get(vec(0, 0, 1), 3, "")[0] == "C"
@@ -0,0 +1,42 @@
+from session_cache import SessionHistoryCache
+
+
+def contents(messages):
+    return [m["content"] for m in messages]
+
+
+def test_miss_loads_only_latest_messages_with_offset(db, session_id):
+    for i in range(7):
+        db.save_messages(session_id, [("user", f"u{i}"), ("model", f"m{i}")])
+
+    offset, messages = SessionHistoryCache(max_messages=5).get(session_id)
+    assert offset == 9
+    assert contents(messages) == ["m4", "u5", "m5", "u6", "m6"]
+
+
+def test_short_session_has_no_offset(db, session_id):
+    db.save_messages(session_id, [("user", "u0"), ("model", "m0")])
+    assert SessionHistoryCache(max_messages=5).get(session_id) == (
+        0, [{"role": "user", "content": "u0"}, {"role": "model", "content": "m0"}])
+
+
+def test_append_writes_pair_and_trims(db, session_id):
+    cache = SessionHistoryCache(max_messages=3)
+    cache.get(session_id)
+    cache.append(session_id, [("user", "u0"), ("model", "m0")])
+    cache.append(session_id, [("user", "u1"), ("model", "m1")])
+
+    offset, messages = cache.get(session_id)
+    assert (offset, contents(messages)) == (1, ["m0", "u1", "m1"])
+    # Veritabanında hepsi sırayla durur
+    assert contents(db.get_session_messages(session_id)) == ["u0", "m0", "u1", "m1"]
+    assert cache.stats()["messages"] == 3
+
+
+def test_least_recent_session_is_evicted(db, session_id):
+    other = db.create_session(1, "Diğer")
+    cache = SessionHistoryCache(max_sessions=1)
+    cache.get(session_id)
+    cache.get(other)
+    cache.get(session_id)
+    assert (cache.hits, cache.misses, cache.evictions) == (0, 3, 2)
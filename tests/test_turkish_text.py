@@ -0,0 +1,37 @@
+import pytest
+
+from turkish_text import lexical_terms, strip_suffixes
+
+
+@pytest.mark.parametrize("word, stem", [
+    ("çarpıtmaların", "çarpıtma"),
+    ("çarpıtma", "çarpıtma"),
+    ("düşünce", "düşünce"),
+    ("düşünceler", "düşünce"),
+    ("düşüncelerimizi", "düşünce"),
+    ("depresyonda", "depresyon"),
+    ("kaygılarımız", "kaygı"),
+    ("kaygısına", "kaygı"),
+    ("hastalarda", "hasta"),
+    ("durumum", "durum"),
+    # Kökün parçası olan sonlar kırpılmaz
+    ("kadın", "kadın"),
+    ("kadınlar", "kadın"),
+    ("evde", "evde"),
+    ("hasta", "hasta"),
+    ("durum", "durum"),
+    ("anne", "anne"),
+])
+def test_strip_suffixes(word, stem):
+    assert strip_suffixes(word) == stem
+
+
+@pytest.mark.parametrize("word", ["çarpıtmaların", "düşüncelerimizi", "kaygılarımız", "anksiyeteden"])
+def test_strip_suffixes_is_fixed_point(word):
+    stem = strip_suffixes(word)
+    assert strip_suffixes(stem) == stem
+
+
+def test_lexical_terms_matches_inflected_forms():
+    assert lexical_terms("Düşüncelerimizi") == lexical_terms("düşünceler")
+    assert lexical_terms("Bilişsel çarpıtmaların nedir?") == ["bilişsel", "çarpıtma"]
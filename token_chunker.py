@@ -0,0 +1,143 @@
+# token_chunker.py
+#
+# Embedding modelinin kendi tokenizer'ı ile token sayarak chunk'lama.
+# paraphrase-multilingual-mpnet-base-v2 girdiyi 128 word-piece'te keser; kelime
+# sayısıyla kesilen 450 kelimelik chunk'ların büyük kısmı embed edilirken atılır.
+# Burada pencere ve örtüşme token cinsindendir, chunk'lar cümle sınırında biter
+# ve tokenizer cümleleri toplu (batch) olarak sayar.
+
+import re
+
+EMBEDDING_MODEL_NAME = 'paraphrase-multilingual-mpnet-base-v2'
+
+# SentenceTransformer'ın max_seq_length'i; [CLS] ve [SEP] de bu sınıra dahil
+MODEL_MAX_SEQ_LENGTH = 128
+SPECIAL_TOKENS = 2
+DEFAULT_WINDOW_TOKENS = MODEL_MAX_SEQ_LENGTH - SPECIAL_TOKENS
+DEFAULT_OVERLAP_TOKENS = 16
+TOKENIZE_BATCH_SIZE = 256
+
+# Cümle sonu: . ! ? … (ardından gelebilecek tırnak/parantez ile)
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'”’»)\]]*$")
+
+
+def load_tokenizer(model_name=EMBEDDING_MODEL_NAME):
+    """SentenceTransformer modelinin tokenizer'ını, modeli yüklemeden getirir."""
+    from transformers import AutoTokenizer
+
+    repo = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    return AutoTokenizer.from_pretrained(repo)
+
+
+def count_tokens(tokenizer, texts, batch_size=TOKENIZE_BATCH_SIZE):
+    """Her metnin özel token'lar hariç token sayısı (toplu tokenizasyon)."""
+    counts = []
+    for start in range(0, len(texts), batch_size):
+        encoded = tokenizer(texts[start:start + batch_size], add_special_tokens=False,
+                            return_attention_mask=False, return_token_type_ids=False)
+        counts.extend(len(ids) for ids in encoded["input_ids"])
+    return counts
+
+
+def truncation_report(tokenizer, texts, max_seq_length=MODEL_MAX_SEQ_LENGTH, batch_size=TOKENIZE_BATCH_SIZE):
+    """Embedding sırasında kesilecek token'ları sayar; metin başına sayılar 'counts' altında döner."""
+    limit = max_seq_length - SPECIAL_TOKENS
+    counts = count_tokens(tokenizer, texts, batch_size)
+    overflow = [n - limit for n in counts if n > limit]
+    total = sum(counts)
+    return {
+        "chunks": len(counts),
+        "truncated_chunks": len(overflow),
+        "total_tokens": total,
+        "truncated_tokens": sum(overflow),
+        "truncated_ratio": sum(overflow) / total if total else 0.0,
+        "max_tokens": max(counts) if counts else 0,
+        "counts": counts,
+    }
+
+
+def iter_sentences(words):
+    """Kelime akışını cümlelere böler (sayfa sınırları cümleyi bölmez)."""
+    sentence = []
+    for word in words:
+        sentence.append(word)
+        if _SENTENCE_END.search(word):
+            yield " ".join(sentence)
+            sentence = []
+    if sentence:
+        yield " ".join(sentence)
+
+
+class TokenChunker:
+    """
+    Cümleleri, token sayısı `window_tokens`'ı aşmayacak şekilde chunk'lara toplar.
+    Her yeni chunk, bir öncekinin son cümlelerinden en fazla `overlap_tokens`
+    kadarıyla başlar. Tek başına pencereden uzun cümleler kelime sınırından bölünür.
+    """
+
+    def __init__(self, tokenizer, window_tokens=DEFAULT_WINDOW_TOKENS,
+                 overlap_tokens=DEFAULT_OVERLAP_TOKENS, batch_size=TOKENIZE_BATCH_SIZE):
+        if overlap_tokens >= window_tokens:
+            raise ValueError("overlap_tokens, window_tokens'tan küçük olmalı.")
+        self.tokenizer = tokenizer
+        self.window_tokens = window_tokens
+        self.overlap_tokens = overlap_tokens
+        self.batch_size = batch_size
+
+    def _counted(self, sentences):
+        batch = []
+        for sentence in sentences:
+            batch.append(sentence)
+            if len(batch) == self.batch_size:
+                yield from zip(batch, count_tokens(self.tokenizer, batch, self.batch_size))
+                batch = []
+        if batch:
+            yield from zip(batch, count_tokens(self.tokenizer, batch, self.batch_size))
+
+    def _split_long(self, sentence):
+        # Kelimeler tek tek sayılır; sentencepiece'te kelime sayıları toplanabilir
+        words = sentence.split()
+        piece, size = [], 0
+        for word, n in zip(words, count_tokens(self.tokenizer, words, self.batch_size)):
+            if piece and size + n > self.window_tokens:
+                yield " ".join(piece), size
+                piece, size = [], 0
+            piece.append(word)
+            size += n
+        if piece:
+            yield " ".join(piece), size
+
+    def _pieces(self, sentences):
+        for sentence, n in self._counted(sentences):
+            if n > self.window_tokens:
+                yield from self._split_long(sentence)
+            else:
+                yield sentence, n
+
+    def chunks(self, sentences):
+        window = []     # [(cümle, token sayısı)]
+        size = 0
+        fresh = False   # pencerede örtüşme dışında yeni cümle var mı
+        for sentence, n in self._pieces(sentences):
+            if window and size + n > self.window_tokens:
+                yield " ".join(s for s, _ in window)
+                window, size = self._overlap(window)
+                # Örtüşme + yeni cümle sığmıyorsa örtüşmeyi baştan kırp
+                while window and size + n > self.window_tokens:
+                    size -= window.pop(0)[1]
+                fresh = False
+            window.append((sentence, n))
+            size += n
+            fresh = True
+        if window and fresh:
+            yield " ".join(s for s, _ in window)
+
+    def _overlap(self, window):
+        tail, size = [], 0
+        for sentence, n in reversed(window):
+            if size + n > self.overlap_tokens:
+                break
+            tail.append((sentence, n))
+            size += n
+        tail.reverse()
+        return tail, size
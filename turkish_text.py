@@ -0,0 +1,95 @@
+# turkish_text.py
+#
+# Türkçe metin normalizasyonu için küçük yardımcılar.
+
+import re
+from functools import lru_cache
+
+# Python'un lower() fonksiyonu 'I' -> 'i' ve 'İ' -> 'i̇' yapar; Türkçe'de doğrusu 'ı' ve 'i'.
+_TR_UPPER_MAP = str.maketrans({"I": "ı", "İ": "i"})
+
+
+def tr_lower(text):
+    """Türkçe kurallarına uygun küçük harf: 'İSTANBUL IŞIK' -> 'istanbul ışık'"""
+    return text.translate(_TR_UPPER_MAP).lower()
+
+
+def fold_whitespace(text):
+    return " ".join(text.split())
+
+
+# --- Sözcüksel arama (BM25) için normalizasyon ---
+
+# Şapkalı harfler: 'hâlâ' -> 'hala'
+_CIRCUMFLEX_MAP = str.maketrans({"â": "a", "î": "i", "û": "u"})
+
+_WORD = re.compile(r"\w+")
+
+# Aramada anlam taşımayan sık kelimeler (soru kalıpları dahil)
+STOPWORDS = frozenset("""
+acaba ama ancak bazı ben beni bana ben bir biraz bu bunu bunun çok da daha de diye en gibi hem her
+için ile ise kadar ki mi mı mu mü nasıl ne neden nedir nelerdir hangi hangileri hangileridir
+o olan olarak ona onu sen seni sana şey şu ve veya ya yani
+""".split())
+
+# Hafif ek temizleyici: yaygın çekim ekleri (çoğul, hal, iyelik, bildirme).
+# Uzun ekler önce denenir ve kelime artık değişmeyene kadar kırpılır; böylece
+# 'düşünceler' ile 'düşüncelerimizi' aynı terime ('düşünce') düşer. Amaç
+# dilbilgisel doğruluk değil, aynı kelimenin çekimli biçimlerinin aynı terime
+# düşmesi. 'n' ile başlayan kaynaştırmalı ekler (-nda, -nın) 'n' ile biten
+# kökleri bozduğu için listede yok.
+SUFFIXES = sorted(set("""
+lar ler ları leri ların lerin lara lere larda lerde lardan lerden larla lerle
+ımız imiz umuz ümüz ınız iniz unuz ünüz
+ın in un ün
+sın sin sun sün
+dan den tan ten
+da de ta te
+ya ye
+yı yi yu yü
+yla yle la le
+sı si su sü
+ım im um üm
+dır dir dur dür tır tir tur tür
+""".split()), key=len, reverse=True)
+# Tek ünlü hal ekleri (-ı, -a) sadece başka bir ekten sonra kırpılır
+# ('düşüncelerimizi' -> 'düşüncelerimiz'); tek başına kelime sonundaki ünlü çoğu
+# zaman kökün parçasıdır ('düşünce', 'anne').
+CASE_VOWELS = frozenset("ıiuüae")
+MIN_STEM = 3
+# Ek kırpma kuralları değişince artırılır; eski terimlerle kurulmuş BM25 index'i
+# yeniden kurulur (lexical_index.py).
+LEXICAL_TERMS_VERSION = 2
+# İki harfli ekler kısa köklerin sonuna da benzer ('kadın', 'durum', 'hasta');
+# bunlarda kök en az bu uzunlukta kalmalı.
+MIN_STEM_SHORT_SUFFIX = 4
+
+
+def _strip_one(word):
+    """Tek bir eki kırpar; kırpılacak ek yoksa kelimeyi aynen döndürür."""
+    for suffix in SUFFIXES:
+        min_stem = MIN_STEM_SHORT_SUFFIX if len(suffix) <= 2 else MIN_STEM
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_stem:
+            return word[:-len(suffix)]
+    if len(word) > MIN_STEM and word[-1] in CASE_VOWELS:
+        rest = word[:-1]
+        if rest[-1] not in CASE_VOWELS and _strip_one(rest) != rest:
+            return rest
+    return word
+
+
+# Kelime dağarcığı sınırlı; aynı kelime için ek taraması tekrarlanmaz
+@lru_cache(maxsize=65536)
+def strip_suffixes(word):
+    """'çarpıtmaların' -> 'çarpıtma', 'düşüncelerimizi' -> 'düşünce', 'kadın' -> 'kadın'"""
+    while True:
+        stem = _strip_one(word)
+        if stem == word:
+            return word
+        word = stem
+
+
+def lexical_terms(text):
+    """Metni BM25 terimlerine çevirir: Türkçe küçük harf, şapka ve durak kelime temizliği, ek kırpma."""
+    text = tr_lower(text).translate(_CIRCUMFLEX_MAP)
+    return [strip_suffixes(w) for w in _WORD.findall(text) if w not in STOPWORDS and not w.isdigit()]
@@ -0,0 +1,190 @@
+# vector_index.py
+#
+# FAISS index türlerini (Flat, IVF-Flat, HNSW, IVF-PQ, SQ8) oluşturma, kaydetme
+# ve yükleme işlemleri. Build script'i ile API aynı fonksiyonları kullanır.
+# Eğitim ve arama parametreleri index'in yanına (index_config.json) yazılır.
+#
+# mmap ile yükleme (bkz. load_index) hangi verinin paylaşıldığına dikkat:
+# - IO_FLAG_MMAP sadece IVF türlerinin (ivf_flat, ivf_pq) ters listelerini
+#   dosyadan eşler; flat / hnsw / sq8 kodları yine her sürecin kendi belleğine okunur.
+# - IO_FLAG_MMAP_IFC (faiss >= 1.10) flat ve sq8 kodlarını da dosyadan eşler;
+#   hnsw'de vektörler eşlenir ama graf her süreçte ayrı kalır.
+# Eski faiss sürümlerinde bellek paylaşımı önemliyse ivf_flat seçin.
+
+import os
+import json
+import math
+import time
+
+import numpy as np
+import faiss
+
+# --- AYARLAR ---
+INDEX_FILE = "vector_store.index"
+CONFIG_FILE = "index_config.json"
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq", "sq8")
+
+# nlist None ise vektör sayısına göre otomatik seçilir
+DEFAULT_PARAMS = {
+    "nlist": None,
+    "nprobe": 8,
+    "pq_m": 16,
+    "pq_nbits": 8,
+    "hnsw_m": 32,
+    "ef_construction": 80,
+    "ef_search": 64,
+}
+
+# HNSW grafından tek tek vektör silinemez; bu türde silme/değişiklik tam yeniden kurulum ister.
+REMOVABLE_TYPES = ("flat", "ivf_flat", "ivf_pq", "sq8")
+
+# IO_FLAG_MMAP ile ters listeleri dosyadan eşlenen türler
+IVF_TYPES = ("ivf_flat", "ivf_pq")
+
+
+def auto_nlist(n):
+    # Yaygın kural: ~4*sqrt(n) küme, ama her küme için en az ~39 eğitim vektörü olsun
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def resolve_params(index_type, n_train, params=None):
+    """Varsayılanlarla birleştirilmiş, veri boyutuna uyarlanmış parametreleri döndürür."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Bilinmeyen index türü: {index_type} (seçenekler: {', '.join(INDEX_TYPES)})")
+    p = dict(DEFAULT_PARAMS)
+    p.update({k: v for k, v in (params or {}).items() if v is not None})
+    if index_type in ("ivf_flat", "ivf_pq"):
+        p["nlist"] = min(p["nlist"] or auto_nlist(n_train), max(1, n_train))
+        p["nprobe"] = min(p["nprobe"], p["nlist"])
+    if index_type == "ivf_pq":
+        # PQ kod kitabı 2^nbits merkez ister; küçük korpuslarda nbits düşürülür
+        p["pq_nbits"] = max(1, min(p["pq_nbits"], int(math.log2(max(2, n_train)))))
+    return p
+
+
+def create_index(index_type, d, p):
+    """Boş (henüz eğitilmemiş) index'i IndexIDMap2 sarmalayıcısıyla oluşturur."""
+    if index_type == "flat":
+        inner = faiss.IndexFlatL2(d)
+    elif index_type == "ivf_flat":
+        inner = faiss.IndexIVFFlat(faiss.IndexFlatL2(d), d, p["nlist"], faiss.METRIC_L2)
+    elif index_type == "ivf_pq":
+        if d % p["pq_m"] != 0:
+            raise ValueError(f"pq_m ({p['pq_m']}) vektör boyutunu ({d}) tam bölmeli.")
+        inner = faiss.IndexIVFPQ(faiss.IndexFlatL2(d), d, p["nlist"], p["pq_m"], p["pq_nbits"])
+    elif index_type == "hnsw":
+        inner = faiss.IndexHNSWFlat(d, p["hnsw_m"])
+        inner.hnsw.efConstruction = p["ef_construction"]
+    elif index_type == "sq8":
+        inner = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    else:
+        raise ValueError(f"Bilinmeyen index türü: {index_type}")
+
+    # Her vektör chunk store'daki sabit id'siyle saklanır
+    return faiss.IndexIDMap2(inner)
+
+
+def search_param_string(index_type, p):
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return f"nprobe={p['nprobe']}"
+    if index_type == "hnsw":
+        return f"efSearch={p['ef_search']}"
+    return ""
+
+
+def apply_search_params(index, param_string):
+    """'nprobe=8' / 'efSearch=64' gibi arama parametrelerini index'e uygular."""
+    if param_string:
+        faiss.ParameterSpace().set_index_parameters(index, param_string)
+
+
+def build_index(index_type, vectors, ids, params=None):
+    """Vektörlerden index kurar (gerekiyorsa eğitir). (index, params, süre) döndürür."""
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    p = resolve_params(index_type, len(vectors), params)
+    start = time.time()
+    index = create_index(index_type, vectors.shape[1], p)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add_with_ids(vectors, np.asarray(ids, dtype='int64'))
+    apply_search_params(index, search_param_string(index_type, p))
+    return index, p, time.time() - start
+
+
+def recall_at_k(index, exact_index, queries, k=5):
+    """ANN index'inin, tam (exact) aramanın ilk k sonucunu ne oranda bulduğunu ölçer."""
+    queries = np.ascontiguousarray(queries, dtype='float32')
+    k = min(k, exact_index.ntotal)
+
+    t0 = time.perf_counter()
+    _, exact_ids = exact_index.search(queries, k)
+    t1 = time.perf_counter()
+    _, ann_ids = index.search(queries, k)
+    t2 = time.perf_counter()
+
+    hits = sum(len(set(a[a >= 0]) & set(e[e >= 0])) for a, e in zip(ann_ids, exact_ids))
+    return {
+        "k": k,
+        "queries": len(queries),
+        "recall": round(hits / (len(queries) * k), 4) if len(queries) else 1.0,
+        "exact_ms_per_query": round((t1 - t0) * 1000 / max(1, len(queries)), 4),
+        "ann_ms_per_query": round((t2 - t1) * 1000 / max(1, len(queries)), 4),
+    }
+
+
+# --- KAYDETME / YÜKLEME ---
+def save_index(index, store_dir, config):
+    """Index'i ve yapılandırmasını geçici dosya + os.replace ile atomik olarak yazar."""
+    index_path = os.path.join(store_dir, INDEX_FILE)
+    config_path = os.path.join(store_dir, CONFIG_FILE)
+
+    faiss.write_index(index, index_path + ".tmp")
+    with open(config_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+    os.replace(index_path + ".tmp", index_path)
+    os.replace(config_path + ".tmp", config_path)
+    return os.path.getsize(index_path)
+
+
+def load_config(store_dir):
+    config_path = os.path.join(store_dir, CONFIG_FILE)
+    if not os.path.exists(config_path):
+        # Eski build'ler: yapılandırma dosyası yok, düz Flat index
+        return {"type": "flat", "params": {}, "search": ""}
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_index(store_dir, mmap=True, search_override=None):
+    """
+    Index'i yükler ve kayıtlı arama parametrelerini uygular.
+    mmap=True iken IVF türleri IO_FLAG_MMAP ile, diğerleri (faiss destekliyorsa)
+    IO_FLAG_MMAP_IFC ile açılır; eşlenen veri aynı makinedeki süreçler arasında
+    işletim sisteminin sayfa önbelleği üzerinden paylaşılır. Eşlenemeyen türler
+    her süreçte ayrı kopya olarak belleğe okunur.
+    """
+    config = load_config(store_dir)
+    path = os.path.join(store_dir, INDEX_FILE)
+    index_type = config.get("type", "flat")
+
+    index = None
+    if mmap:
+        if index_type in IVF_TYPES:
+            flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        else:
+            flags = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+            if flags is None:
+                print(f"⚠️ Bu faiss sürümü '{index_type}' index'ini mmap ile açamıyor; her süreç kendi "
+                      "kopyasını belleğe okur. Paylaşım için faiss >= 1.10 ya da --index-type ivf_flat kullanın.")
+        if flags is not None:
+            try:
+                index = faiss.read_index(path, flags)
+            except RuntimeError as e:
+                print(f"⚠️ Index mmap ile açılamadı, belleğe okunuyor: {e}")
+    if index is None:
+        index = faiss.read_index(path)
+
+    apply_search_params(index, search_override or config.get("search", ""))
+    return index, config